@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置读取与请求中间件微基准测试
+1. 对比逐级查找（原 read_config 实现）与预编译快照的 read_config / 属性访问耗时
+2. 测量 handle_before_request 中间件处理一个请求的额外耗时（处理函数直接返回）
+
+用法（在项目根目录执行）:
+    python benchmark/bench_config.py [循环次数]
+"""
+
+import os
+import sys
+import time
+import asyncio
+from unittest import mock
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+os.chdir(project_root)
+
+from aiohttp.test_utils import make_mocked_request
+from aiohttp.web import Response
+from common import config, variable
+import main
+
+# 一次 /url 请求在中间件与 handle 中读取的配置项
+HOT_KEYS = [
+    'common.reverse_proxy.allow_proxy',
+    'security.banlist.enable',
+    'security.rate_limit.global',
+    'security.rate_limit.ip',
+    'security.allowed_host.enable',
+    'security.key.enable',
+    'security.check_lxm.enable',
+    'module.kg.enable',
+    'common.webdav_cache.enable',
+    'common.remote_cache.enable',
+]
+
+
+def walk_read_config(key):
+    # 原 read_config 的逐级查找实现（去掉了缺失时写回配置文件的分支）
+    try:
+        value = variable.config
+        keys = key.split(".")
+        for k in keys:
+            if isinstance(value, dict):
+                if k not in value and keys.index(k) != len(keys) - 1:
+                    value[k] = {}
+                elif k not in value and keys.index(k) == len(keys) - 1:
+                    value = None
+                value = value[k]
+            else:
+                value = None
+                break
+        return value
+    except Exception:
+        return None
+
+
+def bench(name, func, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f'{name:<28} {elapsed / loops * 1e6:8.2f} us/op')
+
+
+def hot_walk():
+    for k in HOT_KEYS:
+        walk_read_config(k)
+
+
+def hot_snapshot():
+    for k in HOT_KEYS:
+        config.read_config(k)
+
+
+def hot_attribute():
+    s = config.settings
+    s.common.reverse_proxy.allow_proxy
+    s.security.banlist.enable
+    s.security.rate_limit['global']
+    s.security.rate_limit.ip
+    s.security.allowed_host.enable
+    s.security.key.enable
+    config.read_config('security.check_lxm.enable')
+    s.module.kg.enable
+    s.common.webdav_cache.enable
+    s.common.remote_cache.enable
+
+
+async def bench_middleware(loops):
+    async def handler(request):
+        return Response(text='ok')
+
+    middleware = await main.handle_before_request(main.app, handler)
+    transport = mock.Mock()
+    transport.get_extra_info.side_effect = lambda name, default=None: ('127.0.0.1', 50000) if name == 'peername' else default
+    request = make_mocked_request('GET', '/url/kg/test/128k', headers={'Host': 'localhost'}, transport=transport)
+    # 关闭访问日志输出，避免终端输出影响结果
+    main.aiologger.info = lambda *args, **kwargs: None
+    for _ in range(1000):
+        await middleware(request)
+    start = time.perf_counter()
+    for _ in range(loops):
+        await middleware(request)
+    elapsed = time.perf_counter() - start
+    print(f'{"handle_before_request":<28} {elapsed / loops * 1e6:8.2f} us/op')
+
+
+if __name__ == '__main__':
+    loops = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f'{len(HOT_KEYS)} keys per op, loops={loops}')
+    bench('read_config (walk)', hot_walk, loops)
+    bench('read_config (snapshot)', hot_snapshot, loops)
+    bench('settings attribute access', hot_attribute, loops)
+    asyncio.run(bench_middleware(loops))
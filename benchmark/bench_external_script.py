@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+external script 兜底调用基准测试
+对比每次调用都启动 node 子进程 (_run_node_script) 与常驻工作进程池 (NodeWorkerPool) 的耗时
+
+用法（在项目根目录执行）:
+    python benchmark/bench_external_script.py [调用次数] [并发数]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from modules import external_script
+
+# 模拟一个加载较重的 LX 源脚本：require 时做一段同步计算，请求时直接返回链接
+FAKE_SCRIPT = r"""
+const { EVENT_NAMES, on } = globalThis.lx;
+let x = 0;
+for (let i = 0; i < 3e7; i++) x += i % 7;
+on(EVENT_NAMES.request, async ({ source, info }) => {
+  return `https://example.com/${source}/${info.musicInfo.songmid}/${info.type}.mp3`;
+});
+"""
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0
+    k = min(len(values) - 1, int(round((len(values) - 1) * p)))
+    return values[k]
+
+
+async def run_case(name, call, total, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    ok = 0
+
+    async def one(i):
+        nonlocal ok
+        async with sem:
+            t = time.perf_counter()
+            res = await call(i)
+            latencies.append((time.perf_counter() - t) * 1000)
+            if res and res.get('code') == 0:
+                ok += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(total)])
+    elapsed = time.perf_counter() - start
+    print(f'{name:<8} total={total} ok={ok} elapsed={elapsed:.2f}s '
+          f'rps={total / elapsed:.1f} p50={percentile(latencies, 0.5):.1f}ms '
+          f'p95={percentile(latencies, 0.95):.1f}ms')
+
+
+async def main(total, concurrency):
+    with tempfile.TemporaryDirectory() as tmp:
+        script_path = os.path.join(tmp, 'fake_source.js')
+        with open(script_path, 'w', encoding='utf-8') as f:
+            f.write(FAKE_SCRIPT)
+
+        async def spawn_call(i):
+            return await external_script._run_node_script(script_path, 'kw', str(i), '128k', None)
+
+        pool = external_script.NodeWorkerPool(
+            external_script._locate_run_worker_js(), size=2, max_concurrency=concurrency)
+
+        async def pool_call(i):
+            return await pool.run(script_path, 'kw', str(i), '128k', None)
+
+        await run_case('spawn', spawn_call, total, concurrency)
+        # 预热：让每个工作进程加载一次脚本，模拟稳定运行状态
+        await pool.health_check()
+        await asyncio.gather(*[pool_call(-1) for _ in range(pool.size * 2)])
+        await run_case('pool', pool_call, total, concurrency)
+        await pool.close()
+
+
+if __name__ == '__main__':
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    asyncio.run(main(total, concurrency))
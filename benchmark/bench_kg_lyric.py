@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+酷狗歌词解码与解析基准测试
+使用 test/fixtures/kg 下的 KRC 文件，对比原实现与当前实现每首歌词的解码（异或 + 解压）与解析耗时
+
+用法（在项目根目录执行）:
+    python benchmark/bench_kg_lyric.py [循环次数]
+"""
+
+import os
+import sys
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'test'))
+
+from test_kg_lyric import kg_lyric, load_fixtures, reference_krc_decode, ReferenceParseTools
+
+
+def bench(name, func, corpus, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        for item in corpus:
+            func(item)
+    elapsed = time.perf_counter() - start
+    sys.__stdout__.write(f'{name:<20} {elapsed / loops / len(corpus) * 1e6:10.1f} us/首\n')
+
+
+if __name__ == '__main__':
+    loops = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    corpus = list(load_fixtures().values())
+    texts = [reference_krc_decode(data) for data in corpus]
+    sys.__stdout__.write(f'{len(corpus)} 个 KRC 文件，共 {sum(len(d) for d in corpus)} 字节\n')
+    bench('decode (reference)', reference_krc_decode, corpus, loops)
+    bench('decode', kg_lyric.krcDecode, corpus, loops)
+    bench('parse (reference)', lambda text: ReferenceParseTools().parse(text), texts, loops)
+    bench('parse', kg_lyric.global_parser.parse, texts, loops)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线负载测试
+启动模拟上游（test/mock_upstream.py）与一个指向它的服务器实例，分别压测 /url 接口的四种场景:
+    cache-miss  每个请求都是新的歌曲，轮流请求各平台，经过模拟上游解析
+    cache-hit   链接缓存命中
+    local       本地音频缓存（cache_audio）命中
+    webdav      WebDAV 缓存索引命中（模拟上游同时充当 WebDAV 服务器）
+输出每个场景的 RPS 与 p50/p95/p99 延迟，不需要任何平台账号或外网。
+
+用法（在项目根目录执行）:
+    python benchmark/bench_load.py [--duration 10] [--concurrency 32] [--latency 0.02] [--error-rate 0]
+
+在 CI 中检查性能回退（任一场景不满足时以非零状态码退出，--json 保存结果）:
+    python benchmark/bench_load.py --duration 5 --min-rps 100 --max-p99 500 --json load.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import itertools
+import tempfile
+
+import aiohttp
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'test'))
+
+from mock_upstream import MockUpstream, AUDIO
+from test_peer_cache import free_port, start, wait_ready
+from bench_workers import percentile
+
+SCENARIOS = ('cache-miss', 'cache-hit', 'local', 'webdav')
+# 各场景使用的歌曲数量
+SONGS = 100
+
+
+def miss_songs():
+    '''每次返回一首新的歌曲，轮流使用各平台'''
+    for i in itertools.count():
+        yield ('tx', f'miss{i:010d}')
+        yield ('kg', f'{i:032x}')
+        yield ('kw', str(10 ** 8 + i))
+        yield ('wy', str(10 ** 9 + i))
+        yield ('mg', str(10 ** 10 + i))
+
+
+def write_config(workdir, port, mock):
+    os.makedirs(os.path.join(workdir, 'config'))
+    with open(os.path.join(workdir, 'config', 'config.yml'), 'w', encoding='utf-8') as f:
+        f.write(f"""\
+common:
+  hosts:
+    - 127.0.0.1
+  ports:
+    - {port}
+  log_file: false
+  upstream_override: {json.dumps(mock.overrides())}
+  remote_cache:
+    enable: false
+    path: ./cache_audio
+  webdav_cache:
+    enable: true
+    url: "{mock.base}/dav"
+    index_on_startup: true
+module:
+  tx:
+    cdnaddr: "{mock.base}/"
+""")
+    # local 场景的本地音频缓存，启动时建立索引
+    os.makedirs(os.path.join(workdir, 'cache_audio'))
+    for i in range(SONGS):
+        with open(os.path.join(workdir, 'cache_audio', f'tx_local{i}_128k.mp3'), 'wb') as f:
+            f.write(AUDIO)
+
+
+async def load(session, urls, duration, concurrency):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            t = time.perf_counter()
+            try:
+                async with session.get(next(urls)) as resp:
+                    body = await resp.json(content_type=None)
+                    if resp.status != 200 or body.get('code') != 0:
+                        errors += 1
+                        continue
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - t) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50': round(percentile(latencies, 0.5), 2),
+        'p95': round(percentile(latencies, 0.95), 2),
+        'p99': round(percentile(latencies, 0.99), 2),
+    }
+
+
+def scenario_urls(name, base):
+    if name == 'cache-miss':
+        return (f'{base}/url/{source}/{song_id}/128k' for source, song_id in miss_songs())
+    if name == 'cache-hit':
+        return itertools.cycle([f'{base}/url/kw/{10 ** 7 + i}/128k' for i in range(SONGS)])
+    if name == 'local':
+        return itertools.cycle([f'{base}/url/tx/local{i}/128k' for i in range(SONGS)])
+    return itertools.cycle([f'{base}/url/tx/webdav{i}/128k' for i in range(SONGS)])
+
+
+async def run(args):
+    dav_files = {'cache_audio': [f'tx_webdav{i}_128k.mp3' for i in range(SONGS)]}
+    mock = await MockUpstream(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                              dav_files=dav_files).start()
+    workdir = tempfile.mkdtemp()
+    port = free_port()
+    write_config(workdir, port, mock)
+    server = start(workdir)
+    results = {}
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, wait_ready, port)
+        base = f'http://127.0.0.1:{port}'
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            # 预热链接缓存
+            for url in itertools.islice(scenario_urls('cache-hit', base), SONGS):
+                async with session.get(url) as resp:
+                    await resp.read()
+            for name in args.scenarios:
+                results[name] = await load(session, scenario_urls(name, base), args.duration, args.concurrency)
+                r = results[name]
+                print(f'{name:<10} requests={r["requests"]} errors={r["errors"]} rps={r["rps"]:.1f} '
+                      f'p50={r["p50"]:.1f}ms p95={r["p95"]:.1f}ms p99={r["p99"]:.1f}ms')
+    finally:
+        server.terminate()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, server.wait, 10)
+        except Exception:
+            server.kill()
+        await mock.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def check(results, args):
+    '''返回不满足阈值的说明列表'''
+    failures = []
+    for name, r in results.items():
+        total = r['requests'] + r['errors']
+        if args.min_rps and r['rps'] < args.min_rps:
+            failures.append(f'{name}: rps {r["rps"]} < {args.min_rps}')
+        if args.max_p99 and r['p99'] > args.max_p99:
+            failures.append(f'{name}: p99 {r["p99"]}ms > {args.max_p99}ms')
+        if total and r['errors'] / total > args.max_error_rate:
+            failures.append(f'{name}: error rate {r["errors"] / total:.3f} > {args.max_error_rate}')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线负载测试')
+    parser.add_argument('--duration', type=float, default=10, help='每个场景的压测时间（秒）')
+    parser.add_argument('--concurrency', type=int, default=32, help='并发请求数')
+    parser.add_argument('--latency', type=float, default=0.02, help='模拟上游的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.01, help='模拟上游额外的随机延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟上游返回错误的概率')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='要运行的场景，逗号分隔')
+    parser.add_argument('--min-rps', type=float, default=0, help='每个场景的最低 RPS，0 为不检查')
+    parser.add_argument('--max-p99', type=float, default=0, help='每个场景的 p99 上限（毫秒），0 为不检查')
+    parser.add_argument('--max-error-rate', type=float, default=None,
+                        help='每个场景允许的失败比例，默认为模拟上游的错误率')
+    parser.add_argument('--json', help='将结果保存为 JSON 文件')
+    args = parser.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'未知的场景: {", ".join(sorted(unknown))}')
+    if args.max_error_rate is None:
+        args.max_error_rate = args.error_rate
+
+    print(f'cpu={os.cpu_count()} concurrency={args.concurrency} duration={args.duration}s '
+          f'upstream latency={args.latency}s+{args.jitter}s error_rate={args.error_rate}')
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': {k: v for k, v in vars(args).items() if k != 'json'}, 'results': results},
+                      f, indent=2)
+    failures = check(results, args)
+    for failure in failures:
+        print('FAILED ' + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志调用耗时基准测试
+对比同步写入与后台线程批量写入时，调用方（事件循环）执行一次 info 日志的耗时，
+以及未开启 DEBUG 等级时一次带参数的 debug 日志的耗时
+
+用法（在项目根目录执行）:
+    python benchmark/bench_log.py [循环次数]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from common import log, variable
+
+# 控制台输出重定向到空设备，日志文件写入临时目录下的 logs
+sys.stderr = open(os.devnull, 'w', encoding='utf-8')
+out = sys.__stdout__
+tmpdir = tempfile.mkdtemp()
+os.makedirs(os.path.join(tmpdir, 'logs'))
+os.chdir(tmpdir)
+
+
+def bench(name, logger, loops, func):
+    start = time.perf_counter()
+    for i in range(loops):
+        func(logger, i)
+    elapsed = time.perf_counter() - start
+    log.shutdown()
+    total = time.perf_counter() - start
+    out.write(f'{name:<24} caller {elapsed / loops * 1e6:8.2f} us/op   total {total / loops * 1e6:8.2f} us/op\n')
+
+
+def info(logger, i):
+    logger.info(f'127.0.0.1 - GET "/url/kg/{i}/320k", 200')
+
+
+def debug(logger, i):
+    logger.debug('使用缓存的%s_%s_%s数据，URL：%s', 'kg', i, '320k', {'url': 'http://example.com/' + 'x' * 100})
+
+
+if __name__ == '__main__':
+    loops = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    variable.debug_mode = False
+    for mode in ('sync', 'async'):
+        variable.log_config = {'async': mode == 'async', 'max_size': 0}
+        log.configure()
+        logger = log.log(f'bench_{mode}')
+        bench(f'info ({mode})', logger, loops, info)
+    bench('debug (level disabled)', logger, loops, debug)
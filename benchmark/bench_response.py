@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应路径基准测试
+对比默认配置（asyncio 事件循环 + ujson 格式化输出）与性能选项（uvloop + orjson 紧凑输出）下
+缓存命中的 /url 接口每秒请求数
+
+用法（在项目根目录执行）:
+    python benchmark/bench_response.py [每轮秒数] [每个客户端进程的并发数] [客户端进程数]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import multiprocessing
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+os.chdir(project_root)
+
+from bench_workers import seed_cache, client_process, percentile, wait_ready, SOURCE, SONG_ID, QUALITY
+
+PORT = 19763
+
+
+def server_process(use_uvloop, use_orjson, pretty):
+    import main
+    from common import serialize, variable
+    serialize.configure(use_orjson)
+    variable.debug_mode = pretty
+    loop = None
+    if use_uvloop:
+        try:
+            import uvloop
+            loop = uvloop.new_event_loop()
+        except ImportError:
+            pass
+    if loop is None:
+        loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def run():
+        from aiohttp import web
+        runner = web.AppRunner(main.app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', PORT).start()
+        await asyncio.Event().wait()
+
+    loop.run_until_complete(run())
+
+
+def run_case(name, duration, concurrency, clients, **options):
+    server = multiprocessing.Process(target=server_process, kwargs=options, daemon=True)
+    server.start()
+    try:
+        if not wait_ready(f'http://127.0.0.1:{PORT}'):
+            print(f'{name} 服务器启动失败')
+            return None
+        url = f'http://127.0.0.1:{PORT}/url/{SOURCE}/{SONG_ID}/{QUALITY}'
+        queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=client_process, args=(url, duration, concurrency, queue))
+                 for _ in range(clients)]
+        for p in procs:
+            p.start()
+        results = [queue.get() for _ in procs]
+        for p in procs:
+            p.join()
+        latencies = [l for r in results for l in r[0]]
+        errors = sum(r[1] for r in results)
+        rps = len(latencies) / duration
+        print(f'{name:<10} requests={len(latencies)} errors={errors} rps={rps:.1f} '
+              f'p50={percentile(latencies, 0.5):.1f}ms p95={percentile(latencies, 0.95):.1f}ms')
+        return rps
+    finally:
+        server.terminate()
+        server.join()
+        time.sleep(1)
+
+
+def main(duration, concurrency, clients):
+    seed_cache()
+    try:
+        import uvloop  # noqa: F401
+        has_uvloop = True
+    except ImportError:
+        has_uvloop = False
+    try:
+        import orjson  # noqa: F401
+        has_orjson = True
+    except ImportError:
+        has_orjson = False
+    print(f'uvloop={has_uvloop} orjson={has_orjson} clients={clients} concurrency/client={concurrency} duration={duration}s')
+    before = run_case('before', duration, concurrency, clients, use_uvloop=False, use_orjson=False, pretty=True)
+    after = run_case('after', duration, concurrency, clients, use_uvloop=True, use_orjson=True, pretty=False)
+    if before and after:
+        print(f'speedup={after / before:.2f}x')
+
+
+if __name__ == '__main__':
+    duration = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    clients = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    main(duration, concurrency, clients)
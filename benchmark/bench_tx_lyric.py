@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+QQ 音乐歌词解析基准测试
+对比原实现与当前实现解析 QRC 歌词（含逐字时间）并对齐翻译、罗马音时间标签的耗时
+
+用法（在项目根目录执行）:
+    python benchmark/bench_tx_lyric.py [循环次数] [每首歌词行数]
+"""
+
+import os
+import sys
+import time
+import random
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'test'))
+
+from test_tx_lyric import tx_lyric, make_song, ReferenceParseTools
+
+
+def bench(name, parser, songs, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        for l, t, r in songs:
+            parser.parse(l, t, r)
+    elapsed = time.perf_counter() - start
+    sys.__stdout__.write(f'{name:<12} {elapsed / loops / len(songs) * 1e6:10.1f} us/首\n')
+
+
+if __name__ == '__main__':
+    loops = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 80
+    rng = random.Random(1)
+    songs = [make_song(rng, lines) for _ in range(10)]
+    sys.__stdout__.write(f'{len(songs)} 首歌词，每首 {lines} 行\n')
+    bench('reference', ReferenceParseTools(), songs, loops)
+    bench('current', tx_lyric.global_parser, songs, loops)
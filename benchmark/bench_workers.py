@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程模式负载测试
+分别以 1 / 2 / 4 个 worker 启动服务器，使用多个客户端进程压测缓存命中的 /url 接口，对比吞吐量
+
+用法（在项目根目录执行，服务器使用配置文件中的第一个端口）:
+    python benchmark/bench_workers.py [每轮秒数] [每个客户端进程的并发数] [worker数量列表，逗号分隔]
+
+注意：worker 数量超过空闲核心数后吞吐量不会继续提高，客户端进程也会占用 CPU，
+建议在核心数不少于 worker 数量两倍的机器上运行。输出中的 speedup 为相对 1 个 worker 的吞吐量倍数，
+efficiency 为 speedup / worker 数量。
+已测得的结果：单核环境下 2 个 worker 为 1.39x（efficiency 0.70），多核机器上的扩展情况尚未测量。
+"""
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import subprocess
+import multiprocessing
+import urllib.request
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+os.chdir(project_root)
+
+from common import config
+
+SOURCE = 'kg'
+SONG_ID = 'benchmark_workers'
+QUALITY = '128k'
+
+
+def seed_cache():
+    # 预先写入链接、信息与歌词缓存，使请求全部命中缓存，不访问上游
+    key = f'{SOURCE}_{SONG_ID}'
+    config.updateCache('urls', f'{key}_{QUALITY}', {'expire': False, 'time': 0, 'url': 'https://example.com/a.mp3'})
+    config.updateCache('info', key, {'expire': False, 'time': 0, 'data': {'name': 'benchmark', 'singer': 'benchmark'}})
+    config.updateCache('lyric', key, {'expire': False, 'time': 0, 'data': {'lyric': ''}})
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0
+    k = min(len(values) - 1, int(round((len(values) - 1) * p)))
+    return values[k]
+
+
+def client_process(url, duration, concurrency, queue):
+    import aiohttp
+
+    async def run():
+        latencies = []
+        errors = 0
+        deadline = time.perf_counter() + duration
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+            async def worker():
+                nonlocal errors
+                while time.perf_counter() < deadline:
+                    t = time.perf_counter()
+                    try:
+                        async with session.get(url) as resp:
+                            await resp.read()
+                            if resp.status != 200:
+                                errors += 1
+                                continue
+                    except Exception:
+                        errors += 1
+                        continue
+                    latencies.append((time.perf_counter() - t) * 1000)
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return latencies, errors
+
+    queue.put(asyncio.run(run()))
+
+
+def wait_ready(base, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base + '/', timeout=1)
+            return True
+        except Exception:
+            time.sleep(0.5)
+    return False
+
+
+def run_case(workers, duration, concurrency, clients, base):
+    server = subprocess.Popen([sys.executable, 'main.py', '--workers', str(workers)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(base):
+            print(f'workers={workers} 服务器启动失败')
+            return None
+        # 等待所有 worker 完成监听
+        time.sleep(2 + workers)
+        url = f'{base}/url/{SOURCE}/{SONG_ID}/{QUALITY}'
+        queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=client_process, args=(url, duration, concurrency, queue))
+                 for _ in range(clients)]
+        for p in procs:
+            p.start()
+        results = [queue.get() for _ in procs]
+        for p in procs:
+            p.join()
+        latencies = [l for r in results for l in r[0]]
+        errors = sum(r[1] for r in results)
+        rps = len(latencies) / duration
+        print(f'workers={workers:<2} requests={len(latencies)} errors={errors} rps={rps:.1f} '
+              f'p50={percentile(latencies, 0.5):.1f}ms p95={percentile(latencies, 0.95):.1f}ms '
+              f'p99={percentile(latencies, 0.99):.1f}ms')
+        return rps
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(20)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main(duration, concurrency, worker_list):
+    seed_cache()
+    base = f'http://127.0.0.1:{int(config.read_config("common.ports")[0])}'
+    clients = max(2, max(worker_list))
+    print(f'cpu={os.cpu_count()} clients={clients} concurrency/client={concurrency} duration={duration}s')
+    baseline = None
+    for workers in worker_list:
+        rps = run_case(workers, duration, concurrency, clients, base)
+        if rps and baseline is None:
+            baseline = rps
+        elif rps and baseline:
+            speedup = rps / baseline
+            note = ' (workers > cpu)' if workers > (os.cpu_count() or 1) else ''
+            print(f'          speedup={speedup:.2f}x efficiency={speedup / workers:.2f}{note}')
+
+
+if __name__ == '__main__':
+    duration = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    worker_list = [int(w) for w in sys.argv[3].split(',')] if len(sys.argv) > 3 else [1, 2, 4]
+    main(duration, concurrency, worker_list)
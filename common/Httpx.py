@@ -16,10 +16,13 @@ import ujson as json
 import re
 import time
 import pickle
+from urllib.parse import urlsplit
 from . import log
 from . import config
 from . import utils
 from . import variable
+from . import circuit_breaker
+from .exceptions import FailedException
 
 
 def is_valid_utf8(text) -> bool:
@@ -78,6 +81,22 @@ ua_list = [
 logger = log.log("http_utils")
 
 
+def override_upstream(url, headers):
+    """
+    按 common.upstream_override 将上游主机替换为其他地址（如本地的模拟上游），
+    替换时在请求头 X-Upstream-Host 中保留原来的主机
+    """
+    overrides = config.read_config("common.upstream_override")
+    if not overrides:
+        return url
+    parts = urlsplit(url)
+    base = overrides.get(parts.hostname)
+    if not base:
+        return url
+    headers["X-Upstream-Host"] = parts.netloc
+    return base.rstrip("/") + (parts.path or "/") + ("?" + parts.query if parts.query else "")
+
+
 def request(url: str, options={}) -> requests.Response:
     """
     Http请求主函数, 用于发送网络请求
@@ -104,7 +123,7 @@ def request(url: str, options={}) -> requests.Response:
     if options.get("cache") and options["cache"] != "no-cache":
         cache = config.getCache("httpx", cache_key)
         if cache:
-            logger.debug(f"请求 {url} 有可用缓存")
+            logger.debug("请求 %s 有可用缓存", url)
             return pickle.loads(utils.createBase64Decode(cache["data"]))
     if "cache" in list(options.keys()):
         cache_info = options.get("cache")
@@ -137,7 +156,7 @@ def request(url: str, options={}) -> requests.Response:
     except AttributeError:
         raise AttributeError("Unsupported method: " + method)
     # 请求前记录
-    logger.debug(f"HTTP Request: {url}\noptions: {options}")
+    logger.debug("HTTP Request: %s\noptions: %s", url, options)
     # 转换body/form参数为原生的data参数，并为form请求追加Content-Type头
     if (method == "POST") or (method == "PUT"):
         if options.get("body"):
@@ -151,13 +170,13 @@ def request(url: str, options={}) -> requests.Response:
             options["data"] = json.dumps(options["data"])
     # 进行请求
     try:
-        logger.info("-----start----- " + url)
-        req = reqattr(url, **options)
+        logger.debug("-----start----- %s", url)
+        req = reqattr(override_upstream(url, options["headers"]), **options)
     except Exception as e:
         logger.error(f"HTTP Request runs into an Error: {log.highlight_error(traceback.format_exc())}")
         raise e
     # 请求后记录
-    logger.debug(f"Request to {url} succeed with code {req.status_code}")
+    logger.debug("Request to %s succeed with code %s", url, req.status_code)
     # 精简响应体日志：仅在 debug_mode=true 且体积<=4KB 时输出
     if variable.debug_mode and len(req.content) <= 4096:
         try:
@@ -181,7 +200,7 @@ def request(url: str, options={}) -> requests.Response:
             {"expire": True, "time": expire_at, "data": utils.createBase64Encode(cache_data)},
             expire_time,
         )
-        logger.debug("缓存已更新: " + url)
+        logger.debug("缓存已更新: %s", url)
 
     def _json():
         return json.loads(req.content)
@@ -269,9 +288,9 @@ async def AsyncRequest(url, options={}) -> ClientResponse:
         options.pop("cache-ignore")
     cache_key = utils.createMD5(cache_key)
     if options.get("cache") and options["cache"] != "no-cache":
-        cache = config.getCache("httpx_async", cache_key)
+        cache = await config.getCacheAsync("httpx_async", cache_key)
         if cache:
-            logger.debug(f"请求 {url} 有可用缓存")
+            logger.debug("请求 %s 有可用缓存", url)
             c = pickle.loads(utils.createBase64Decode(cache["data"]))
             return c
     if "cache" in list(options.keys()):
@@ -305,7 +324,7 @@ async def AsyncRequest(url, options={}) -> ClientResponse:
     except AttributeError:
         raise AttributeError("Unsupported method: " + method)
     # 请求前记录
-    logger.debug(f"HTTP Request: {url}\noptions: {options}")
+    logger.debug("HTTP Request: %s\noptions: %s", url, options)
     # 转换body/form参数为原生的data参数，并为form请求追加Content-Type头
     if (method == "POST") or (method == "PUT"):
         if options.get("body") is not None:
@@ -317,18 +336,34 @@ async def AsyncRequest(url, options={}) -> ClientResponse:
             options["headers"]["Content-Type"] = "application/x-www-form-urlencoded"
         if isinstance(options.get("data"), dict):
             options["data"] = json.dumps(options["data"])
+    # 上游已熔断时直接失败
+    breaker = circuit_breaker.get_breaker(url)
+    if breaker and not breaker.allow():
+        raise FailedException(f"上游 {breaker.name} 暂时不可用，请稍后再试", reason="circuit_open")
     # 进行请求
     try:
-        logger.info("-----start----- " + url)
-        req_ = await reqattr(url, **options)
+        logger.debug("-----start----- %s", url)
+        req_ = await reqattr(override_upstream(url, options["headers"]), **options)
+        # 为懒人提供的不用改代码移植的方法
+        # 才不是梓澄呢
+        req = await convert_to_requests_response(req_)
     except Exception as e:
         logger.error(f"HTTP Request runs into an Error: {log.highlight_error(traceback.format_exc())}")
+        if breaker:
+            breaker.record_failure()
         raise e
+    except BaseException:
+        # 被取消（如竞速中落败）的请求不计入成功或失败，但需要归还探测名额
+        if breaker:
+            breaker.release()
+        raise
     # 请求后记录
-    logger.debug(f"Request to {url} succeed with code {req_.status}")
-    # 为懒人提供的不用改代码移植的方法
-    # 才不是梓澄呢
-    req = await convert_to_requests_response(req_)
+    logger.debug("Request to %s succeed with code %s", url, req_.status)
+    if breaker:
+        if req.status >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
     # 精简响应体日志：仅在 debug_mode=true 且体积<=4KB 时输出
     if variable.debug_mode and len(req.content) <= 4096:
         try:
@@ -346,12 +381,12 @@ async def AsyncRequest(url, options={}) -> ClientResponse:
         cache_data = pickle.dumps(req)
         expire_time = cache_info if isinstance(cache_info, int) else 3600
         expire_at = int((time.time()) + expire_time)
-        config.updateCache(
+        await config.updateCacheAsync(
             "httpx_async",
             cache_key,
             {"expire": True, "time": expire_at, "data": utils.createBase64Encode(cache_data)},
             expire_time,
         )
-        logger.debug("缓存已更新: " + url)
+        logger.debug("缓存已更新: %s", url)
     # 返回请求
     return req
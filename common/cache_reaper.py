@@ -0,0 +1,173 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: cache_reaper.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# sql 缓存适配器的过期缓存清理任务
+# getCache 只会忽略过期的行而不会删除，此任务定期分批删除 expire_at 已过的行，
+# 每批单独提交事务，避免长时间占用数据库写锁；可选地按模块限制行数并回收空闲页
+# 清理在线程池中使用独立的数据库连接执行，不阻塞事件循环
+
+import time
+import sqlite3
+import asyncio
+from . import log
+from . import config
+from . import metrics
+from . import scheduler
+
+logger = log.log('cache_reaper')
+
+DB_PATH = './cache.db'
+
+# 最近一次执行的统计信息
+_last_run = {}
+
+
+def _db_size(conn):
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return page_size * page_count, page_size * freelist
+
+
+def _delete_batches(conn, select_sql, params, batch_size, pause, limit=None):
+    """反复选出一批行并删除，最多删除 limit 行，返回 (行数, 字节数)"""
+    rows_total = 0
+    bytes_total = 0
+    while limit is None or rows_total < limit:
+        size = batch_size if limit is None else min(batch_size, limit - rows_total)
+        rows = conn.execute(select_sql, params + (size,)).fetchall()
+        if not rows:
+            break
+        conn.executemany('DELETE FROM cache WHERE id = ?', [(row[0],) for row in rows])
+        conn.commit()
+        rows_total += len(rows)
+        bytes_total += sum(row[1] or 0 for row in rows)
+        if len(rows) < size:
+            break
+        if pause > 0:
+            time.sleep(pause)
+    return rows_total, bytes_total
+
+
+def _backfill(conn, batch_size, pause):
+    """为旧版本写入的行补齐 expire_at，过期信息保存在 data 的 expire / time 字段中"""
+    total = 0
+    while True:
+        cursor = conn.execute(
+            '''UPDATE cache SET expire_at = CASE
+                WHEN json_valid(data) AND json_extract(data, '$.expire')
+                THEN CAST(json_extract(data, '$.time') AS INTEGER) ELSE 0 END
+            WHERE id IN (SELECT id FROM cache WHERE expire_at IS NULL LIMIT ?)''',
+            (batch_size,),
+        )
+        conn.commit()
+        total += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            break
+        if pause > 0:
+            time.sleep(pause)
+    return total
+
+
+def _vacuum(conn, pages):
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        # 切换到增量模式需要执行一次完整的 VACUUM 才会生效
+        logger.info('cache.db 尚未启用增量回收，正在执行一次完整的 VACUUM，数据库较大时可能需要一些时间')
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        return
+    if pages > 0:
+        conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+    else:
+        conn.execute('PRAGMA incremental_vacuum').fetchall()
+
+
+def reap_sync(now=None):
+    """执行一次清理，返回统计信息"""
+    options = config.read_config('common.cache.reaper') or {}
+    batch_size = max(1, int(options.get('batch_size') or 500))
+    pause = float(options.get('batch_pause') or 0)
+    now = int(time.time()) if now is None else int(now)
+    start = time.time()
+    stats = {
+        'backfilled': 0,
+        'expired_rows': 0,
+        'expired_bytes': 0,
+        'capped_rows': 0,
+        'capped_bytes': 0,
+        'file_bytes_reclaimed': 0,
+    }
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        size_before, _ = _db_size(conn)
+        stats['backfilled'] = _backfill(conn, batch_size, pause)
+
+        stats['expired_rows'], stats['expired_bytes'] = _delete_batches(
+            conn,
+            '''SELECT id, length(key) + length(data) FROM cache
+            WHERE expire_at > 0 AND expire_at <= ? LIMIT ?''',
+            (now,), batch_size, pause,
+        )
+
+        for module, limit in (options.get('max_rows') or {}).items():
+            count = conn.execute('SELECT COUNT(*) FROM cache WHERE module = ?', (module,)).fetchone()[0]
+            excess = count - int(limit)
+            if excess <= 0:
+                continue
+            # 永不过期的行（expire_at = 0）排在最后，其余按过期时间从早到晚删除
+            rows, size = _delete_batches(
+                conn,
+                '''SELECT id, length(key) + length(data) FROM cache WHERE module = ?
+                ORDER BY expire_at = 0, expire_at, id LIMIT ?''',
+                (module,), batch_size, pause, limit=excess,
+            )
+            metrics.inc('cache_reaper_rows_total', rows, reason='max_rows', module=module)
+            stats['capped_rows'] += rows
+            stats['capped_bytes'] += size
+
+        if options.get('incremental_vacuum'):
+            _vacuum(conn, int(options.get('vacuum_pages') or 0))
+        size_after, free_bytes = _db_size(conn)
+        stats['file_bytes_reclaimed'] = max(0, size_before - size_after)
+        stats['db_bytes'] = size_after
+        stats['free_bytes'] = free_bytes
+    finally:
+        conn.close()
+    stats['duration'] = round(time.time() - start, 3)
+    stats['time'] = int(start)
+    return stats
+
+
+async def reap():
+    loop = asyncio.get_event_loop()
+    stats = await loop.run_in_executor(None, reap_sync)
+    _last_run.clear()
+    _last_run.update(stats)
+    metrics.inc('cache_reaper_rows_total', stats['expired_rows'], reason='expired')
+    metrics.inc('cache_reaper_bytes_total', stats['expired_bytes'] + stats['capped_bytes'])
+    metrics.inc('cache_reaper_file_bytes_reclaimed_total', stats['file_bytes_reclaimed'])
+    if stats['expired_rows'] or stats['capped_rows'] or stats['file_bytes_reclaimed']:
+        logger.info(
+            f"已清理过期缓存 {stats['expired_rows']} 行，超出数量限制的缓存 {stats['capped_rows']} 行，"
+            f"共 {stats['expired_bytes'] + stats['capped_bytes']} 字节，"
+            f"数据库文件缩小 {stats['file_bytes_reclaimed']} 字节，耗时 {stats['duration']}s"
+        )
+
+
+def register():
+    """sql 缓存适配器下注册定时清理任务"""
+    if config.read_config('common.cache.adapter') == 'redis':
+        return
+    if not config.read_config('common.cache.reaper.enable'):
+        return
+    interval = int(config.read_config('common.cache.reaper.interval') or 3600)
+    scheduler.append('cache_reaper', reap, interval)
+
+
+metrics.register_collector('cache_reaper', lambda: dict(_last_run))
@@ -0,0 +1,125 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: circuit_breaker.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 按上游（请求的主机名）划分的熔断器
+# closed: 正常放行，连续失败达到阈值后进入 open
+# open: 直接失败，经过 recovery_time 后进入 half_open
+# half_open: 只放行少量探测请求，成功则恢复 closed，失败则重新 open
+
+import time
+from urllib.parse import urlparse
+from . import log
+from . import config
+from . import metrics
+
+logger = log.log('circuit_breaker')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, recovery_time=30, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.half_open_calls = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+
+    def allow(self):
+        if self.state == OPEN:
+            if time.time() - self.opened_at < self.recovery_time:
+                self.total_rejected += 1
+                metrics.inc('circuit_breaker_rejected_total', upstream=self.name)
+                return False
+            self._set_state(HALF_OPEN)
+            self.half_open_calls = 0
+        if self.state == HALF_OPEN:
+            if self.half_open_calls >= self.half_open_max_calls:
+                self.total_rejected += 1
+                metrics.inc('circuit_breaker_rejected_total', upstream=self.name)
+                return False
+            self.half_open_calls += 1
+        return True
+
+    def release(self):
+        """请求被取消、没有结果时归还 allow() 占用的探测名额"""
+        if self.state == HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self.total_failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.time()
+            self._set_state(OPEN)
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        if state == OPEN:
+            logger.warning(f'上游 {self.name} 连续失败 {self.failures} 次，已熔断 {self.recovery_time} 秒')
+        elif state == CLOSED:
+            logger.info(f'上游 {self.name} 已恢复')
+        self.state = state
+        metrics.inc('circuit_breaker_transitions_total', upstream=self.name, state=state)
+
+    def to_dict(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'total_failures': self.total_failures,
+            'total_rejected': self.total_rejected,
+            'opened_at': int(self.opened_at) if self.opened_at else None,
+        }
+
+
+_breakers = {}
+
+
+def get_breaker(url):
+    """根据请求 URL 获取对应上游的熔断器，未启用时返回 None"""
+    if not config.read_config('common.circuit_breaker.enable'):
+        return None
+    host = urlparse(url).hostname
+    if not host:
+        return None
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker_config = config.read_config('common.circuit_breaker')
+        breaker = _breakers[host] = CircuitBreaker(
+            host,
+            failure_threshold=int(breaker_config.get('failure_threshold', 5)),
+            recovery_time=float(breaker_config.get('recovery_time', 30)),
+            half_open_max_calls=int(breaker_config.get('half_open_max_calls', 1)),
+        )
+    return breaker
+
+
+@config.subscribe
+def _reload_config():
+    breaker_config = config.read_config('common.circuit_breaker')
+    for breaker in _breakers.values():
+        breaker.failure_threshold = int(breaker_config.get('failure_threshold', 5))
+        breaker.recovery_time = float(breaker_config.get('recovery_time', 30))
+        breaker.half_open_max_calls = int(breaker_config.get('half_open_max_calls', 1))
+
+
+metrics.register_collector('circuit_breaker', lambda: {name: b.to_dict() for name, b in _breakers.items()})
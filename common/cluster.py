@@ -0,0 +1,373 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: cluster.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 集群模式：多个实例（节点）通过 common.cache.redis 配置的 redis 协作
+# 1. 分布式锁：同一首歌的链接解析、同一个音频文件的下载在整个集群中只进行一次，
+#    其他节点等待锁释放后读取共享的缓存
+# 2. 发布订阅：节点之间同步内存中的缓存层（如失败结果缓存）
+# 3. 音频文件位置：记录每个节点缓存了哪些音频文件，本地没有时可以把请求重定向到持有文件的节点
+# 节点内的多个 worker 使用相同的节点标识，共享同一个音频缓存目录
+
+import time
+import uuid
+import socket
+import asyncio
+import traceback
+import ujson as json
+import redis.asyncio as aioredis
+from . import log
+from . import config
+from . import metrics
+from . import variable
+
+logger = log.log('cluster')
+
+_client = None
+_started = False
+_node_id = None
+# 存活的节点: _nodes[node_id] = public_url
+_nodes = {}
+# 等待锁释放的任务: _waiters[name] = asyncio.Event
+_waiters = {}
+# 事件处理函数: _handlers[event] = [func, ...]
+_handlers = {}
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def enabled():
+    return bool(config.read_config('common.cluster.enable'))
+
+
+def node_id():
+    global _node_id
+    if _node_id is None:
+        _node_id = config.read_config('common.cluster.node_id') or \
+            f"{socket.gethostname()}:{(config.read_config('common.ports') or [9763])[0]}"
+    return _node_id
+
+
+def public_url():
+    return (config.read_config('common.cluster.public_url') or '').rstrip('/')
+
+
+def _key(*parts):
+    return ':'.join([config.read_config('common.cache.redis.key_prefix'), 'cluster'] + [str(p) for p in parts])
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = aioredis.Redis(
+            host=config.read_config('common.cache.redis.host'),
+            port=config.read_config('common.cache.redis.port'),
+            username=config.read_config('common.cache.redis.user') or None,
+            password=config.read_config('common.cache.redis.password') or None,
+            db=config.read_config('common.cache.redis.db'),
+        )
+    return _client
+
+
+# —— 事件 ——
+
+def on(event):
+    """注册其他节点发布的事件的处理函数，可作为装饰器使用"""
+    def decorator(func):
+        _handlers.setdefault(event, []).append(func)
+        return func
+    return decorator
+
+
+async def publish(event, **data):
+    if not _started:
+        return
+    data.update({'event': event, 'node': node_id()})
+    try:
+        await _get_client().publish(_key('events'), json.dumps(data))
+        metrics.inc('cluster_events_published_total', event=event)
+    except Exception as e:
+        logger.warning(f'发布集群事件 {event} 失败: {e}')
+
+
+def publish_nowait(event, **data):
+    if _started:
+        asyncio.ensure_future(publish(event, **data))
+
+
+def _dispatch(message):
+    data = json.loads(message)
+    event = data.pop('event', None)
+    if event == 'lock_released':
+        waiter = _waiters.get(data.get('name'))
+        if waiter is not None:
+            waiter.set()
+        return
+    if data.pop('node', None) == node_id():
+        return
+    metrics.inc('cluster_events_received_total', event=event)
+    for func in _handlers.get(event, []):
+        try:
+            func(**data)
+        except Exception:
+            logger.error(f'处理集群事件 {event} 失败\n' + traceback.format_exc())
+
+
+async def _listen():
+    retry = 1
+    while variable.running:
+        pubsub = _get_client().pubsub()
+        try:
+            await pubsub.subscribe(_key('events'))
+            retry = 1
+            while variable.running:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1)
+                if message and message.get('type') == 'message':
+                    _dispatch(message['data'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f'集群事件订阅连接断开，{retry}s 后重试: {e}')
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+        await asyncio.sleep(retry)
+        retry = min(retry * 2, 60)
+
+
+# —— 节点心跳 ——
+
+async def _heartbeat():
+    ttl = float(config.read_config('common.cluster.node_ttl') or 30)
+    client = _get_client()
+    now = time.time()
+    await client.hset(_key('nodes'), node_id(), json.dumps({'url': public_url(), 'time': now}))
+    nodes = {}
+    stale = []
+    for k, v in (await client.hgetall(_key('nodes'))).items():
+        k = k.decode('utf-8')
+        info = json.loads(v)
+        if now - info['time'] <= ttl:
+            nodes[k] = info['url']
+        elif now - info['time'] > ttl * 10:
+            stale.append(k)
+    if stale:
+        await client.hdel(_key('nodes'), *stale)
+    _nodes.clear()
+    _nodes.update(nodes)
+
+
+async def _heartbeat_loop():
+    while variable.running:
+        try:
+            await _heartbeat()
+        except Exception as e:
+            logger.warning(f'集群心跳失败: {e}')
+        await asyncio.sleep(max(1, float(config.read_config('common.cluster.node_ttl') or 30) / 3))
+
+
+async def start(audio_index=None):
+    """
+    连接 redis 并启动心跳与事件订阅，audio_index 返回本节点已有的音频文件 [(source, song_id, quality, filename), ...]，
+    启动时登记一次，之后每 audio_ttl / 2 秒重新登记以延长有效期
+    """
+    global _started
+    if _started or not enabled():
+        return
+    try:
+        await _heartbeat()
+    except Exception as e:
+        logger.error(f'集群模式启动失败，无法连接 redis: {e}')
+        return
+    _started = True
+    asyncio.create_task(_heartbeat_loop())
+    asyncio.create_task(_listen())
+    logger.info(f'集群模式已启动，节点: {node_id()}，当前存活节点数量: {len(_nodes)}')
+    if audio_index and public_url():
+        await _register_audio(audio_index())
+        asyncio.create_task(_audio_refresh_loop(audio_index))
+
+
+# —— 分布式锁 ——
+
+class Lock:
+    def __init__(self, name, token, ttl):
+        self.name = name
+        self.key = _key('lock', name)
+        self.token = token
+        self.ttl = ttl
+        self._renew_task = asyncio.ensure_future(self._renew())
+
+    async def _renew(self):
+        # 持有期间定期续期，避免耗时较长的下载超过有效期
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                if not await _get_client().eval(_RENEW_SCRIPT, 1, self.key, self.token, int(self.ttl * 1000)):
+                    logger.warning(f'集群锁 {self.name} 已失效')
+                    return
+            except Exception as e:
+                logger.warning(f'集群锁 {self.name} 续期失败: {e}')
+
+    async def release(self):
+        self._renew_task.cancel()
+        try:
+            await _get_client().eval(_RELEASE_SCRIPT, 1, self.key, self.token)
+            await publish('lock_released', name=self.name)
+        except Exception as e:
+            logger.warning(f'释放集群锁 {self.name} 失败: {e}')
+
+
+async def acquire(name):
+    """尝试获取锁，成功返回 Lock，已被其他节点持有时返回 None；集群不可用时返回 None 且不阻止调用方继续执行"""
+    if not _started:
+        return None
+    ttl = float(config.read_config('common.cluster.lock_ttl') or 30)
+    token = f'{node_id()}:{uuid.uuid4().hex}'
+    try:
+        if await _get_client().set(_key('lock', name), token, nx=True, px=int(ttl * 1000)):
+            metrics.inc('cluster_lock_total', result='acquired')
+            return Lock(name, token, ttl)
+    except Exception as e:
+        logger.warning(f'获取集群锁 {name} 失败: {e}')
+        return None
+    metrics.inc('cluster_lock_total', result='busy')
+    return None
+
+
+async def is_locked(name):
+    if not _started:
+        return False
+    try:
+        return bool(await _get_client().exists(_key('lock', name)))
+    except Exception:
+        return False
+
+
+async def wait(name, timeout=None):
+    """等待其他节点释放锁，返回锁是否已释放（超时返回 False）"""
+    if not _started:
+        return True
+    timeout = float(timeout or config.read_config('common.cluster.lock_wait') or 15)
+    deadline = time.monotonic() + timeout
+    event = _waiters.setdefault(name, asyncio.Event())
+    try:
+        while time.monotonic() < deadline:
+            if not await is_locked(name):
+                return True
+            try:
+                # 正常情况下由释放事件唤醒，同时定期检查，防止持有者崩溃后一直等待到锁过期
+                await asyncio.wait_for(event.wait(), min(1, max(0, deadline - time.monotonic())))
+            except asyncio.TimeoutError:
+                pass
+        return False
+    finally:
+        if _waiters.get(name) is event:
+            _waiters.pop(name, None)
+
+
+# —— 音频文件位置 ——
+# cluster:audio:{source}_{song_id} 哈希中每个字段为 {quality}|{node} = 文件名，
+# 每次登记时刷新整个哈希的有效期（audio_ttl），持有文件的节点定期重新登记，
+# 节点下线或文件被删除后，对应的字段最多在 audio_ttl 后随哈希过期
+
+def _audio_ttl():
+    return int(config.read_config('common.cluster.audio_ttl') or 86400)
+
+
+async def _register_audio(entries):
+    ttl = _audio_ttl()
+    pipe = _get_client().pipeline(transaction=False)
+    for source, song_id, quality, filename in entries:
+        key = _key('audio', f'{source}_{song_id}')
+        pipe.hset(key, f'{quality}|{node_id()}', filename)
+        pipe.expire(key, ttl)
+    await pipe.execute()
+
+
+async def _audio_refresh_loop(audio_index):
+    while variable.running:
+        await asyncio.sleep(max(60, _audio_ttl() / 2))
+        try:
+            await _register_audio(audio_index())
+        except Exception as e:
+            logger.warning(f'刷新音频文件位置失败: {e}')
+
+
+def put_audio(source, song_id, quality, filename):
+    """记录本节点持有的音频文件，需要配置 public_url 才能被其他节点使用"""
+    if not _started or not public_url():
+        return
+
+    async def _put():
+        try:
+            await _register_audio([(source, song_id, quality, filename)])
+        except Exception as e:
+            logger.warning(f'记录音频文件位置失败: {e}')
+
+    asyncio.ensure_future(_put())
+
+
+def remove_audio(source, song_id, quality):
+    """本节点的音频文件被删除后移除登记，其他节点不再重定向到本节点"""
+    if not _started:
+        return
+
+    async def _remove():
+        try:
+            await _get_client().hdel(_key('audio', f'{source}_{song_id}'), f'{quality}|{node_id()}')
+        except Exception as e:
+            logger.warning(f'移除音频文件位置失败: {e}')
+
+    asyncio.ensure_future(_remove())
+
+
+async def find_audio(source, song_id, quality):
+    """
+    查找持有该音频文件的其他存活节点，优先匹配音质，返回 (节点, 文件地址, 文件的音质) 或 None
+    """
+    if not _started:
+        return None
+    try:
+        entries = await _get_client().hgetall(_key('audio', f'{source}_{song_id}'))
+    except Exception as e:
+        logger.warning(f'查询音频文件位置失败: {e}')
+        return None
+    exact = []
+    other = []
+    for field, filename in entries.items():
+        q, _, node = field.decode('utf-8').partition('|')
+        if node == node_id() or not _nodes.get(node):
+            continue
+        item = (node, f'{_nodes[node]}/cache/{filename.decode("utf-8")}', q)
+        (exact if q == quality else other).append(item)
+    candidates = exact or other
+    if not candidates:
+        return None
+    return candidates[0]
+
+
+metrics.register_collector('cluster', lambda: {
+    'enabled': _started,
+    'node': node_id() if _started else None,
+    'nodes': dict(_nodes),
+})
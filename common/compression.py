@@ -0,0 +1,126 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: compression.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 响应压缩
+# 按请求头 Accept-Encoding 协商使用 brotli（需要 pip install brotli）或 gzip，
+# 只压缩达到 min_size 的普通响应，音频、文件与流式响应原样返回；
+# 歌词与歌曲信息的响应内容经常重复，压缩结果按内容摘要缓存，相同内容只压缩一次
+
+import gzip
+import hashlib
+import collections
+from aiohttp.web import Response
+from . import config
+from . import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 压缩结果可以缓存的接口（/{method}/...）
+CACHED_METHODS = ('lyric', 'info')
+# 不压缩的内容类型（已压缩的音频、图片等）
+SKIP_CONTENT_TYPES = ('audio/', 'video/', 'image/', 'application/octet-stream', 'application/zip')
+
+# (编码, 等级, 内容摘要) -> 压缩后的内容
+_cache = collections.OrderedDict()
+
+
+def parse_accept_encoding(header):
+    """返回客户端接受的编码集合，q=0 的编码视为不接受"""
+    accepted = set()
+    for item in (header or '').lower().split(','):
+        coding, _, params = item.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding.strip())
+    return accepted
+
+
+def negotiate(header, settings):
+    accepted = parse_accept_encoding(header)
+    if brotli is not None and settings.get('brotli', True) and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding, settings):
+    if encoding == 'br':
+        return brotli.compress(body, quality=int(settings.get('brotli_level', 5)))
+    return gzip.compress(body, compresslevel=int(settings.get('gzip_level', 6)), mtime=0)
+
+
+def compress_cached(body, encoding, settings):
+    size = int(settings.get('cache_size', 256) or 0)
+    if size <= 0:
+        return compress(body, encoding, settings)
+    level = settings.get('brotli_level') if encoding == 'br' else settings.get('gzip_level')
+    key = (encoding, level, hashlib.blake2b(body, digest_size=16).digest())
+    compressed = _cache.get(key)
+    if compressed is not None:
+        _cache.move_to_end(key)
+        metrics.inc('compression_cache_hits_total')
+        return compressed
+    compressed = _cache[key] = compress(body, encoding, settings)
+    while len(_cache) > size:
+        _cache.popitem(last=False)
+    return compressed
+
+
+def _compressible(resp, settings):
+    if not isinstance(resp, Response) or not isinstance(resp.body, bytes) or resp.status in (204, 304):
+        return False
+    if 'Content-Encoding' in resp.headers:
+        return False
+    if resp.content_type.startswith(SKIP_CONTENT_TYPES):
+        return False
+    return len(resp.body) >= int(settings.get('min_size', 1024))
+
+
+async def handle_compression(app, handler):
+    async def handle_request(request):
+        resp = await handler(request)
+        settings = config.read_config('common.compression') or {}
+        if not settings.get('enable') or request.method == 'HEAD' or not _compressible(resp, settings):
+            return resp
+        resp.headers.add('Vary', 'Accept-Encoding')
+        encoding = negotiate(request.headers.get('Accept-Encoding'), settings)
+        if encoding is None:
+            return resp
+        body = resp.body
+        if request.match_info.get('method') in CACHED_METHODS:
+            compressed = compress_cached(body, encoding, settings)
+        else:
+            compressed = compress(body, encoding, settings)
+        if len(compressed) >= len(body):
+            return resp
+        resp.body = compressed
+        resp.headers['Content-Encoding'] = encoding
+        metrics.inc('compression_bytes_total', len(body), encoding=encoding, kind='raw')
+        metrics.inc('compression_bytes_total', len(compressed), encoding=encoding, kind='compressed')
+        return resp
+    return handle_request
+
+
+metrics.register_collector('compression', lambda: {
+    'brotli_available': brotli is not None,
+    'cache_size': len(_cache),
+})
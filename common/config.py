@@ -16,8 +16,10 @@ import sqlite3
 import shutil
 import ruamel.yaml as yaml_
 from . import variable
-from .log import log
+from .log import log, configure as configure_log
 from . import default_config
+from . import shared_state
+from . import serialize
 import threading
 import redis
 
@@ -138,7 +140,7 @@ def getCache(module, key):
             key = handleBuildRedisKey(module, key)
             result = redis.get(key)
             if result:
-                cache_data = json.loads(result)
+                cache_data = serialize.loads(result)
                 return cache_data
         else:
             # 连接到数据库（如果数据库不存在，则会自动创建）
@@ -151,12 +153,7 @@ def getCache(module, key):
 
             result = cursor.fetchone()
             if result:
-                cache_data = json.loads(result[0])
-                cache_data["time"] = int(cache_data["time"])
-                if not cache_data["expire"]:
-                    return cache_data
-                if int(time.time()) < int(cache_data["time"]):
-                    return cache_data
+                return _check_expire(serialize.loads(result[0]))
     except:
         pass
         # traceback.print_exc()
@@ -168,7 +165,7 @@ def updateCache(module, key, data, expire=None):
         if read_config("common.cache.adapter") == "redis":
             redis = get_redis_connection()
             key = handleBuildRedisKey(module, key)
-            redis.set(key, json.dumps(data), ex=expire if expire and expire > 0 else None)
+            redis.set(key, serialize.dumps(data), ex=expire if expire and expire > 0 else None)
         else:
             # 连接到数据库（如果数据库不存在，则会自动创建）
             conn = get_cache_connection()
@@ -176,15 +173,20 @@ def updateCache(module, key, data, expire=None):
             # 创建一个游标对象
             cursor = conn.cursor()
 
+            # expire_at 供过期缓存清理任务使用，0 为永不过期
+            expire_at = int(data.get("time") or 0) if data.get("expire") else 0
+
             cursor.execute("SELECT data FROM cache WHERE module=? AND key=?", (module, key))
             result = cursor.fetchone()
             if result:
                 cursor.execute(
-                    "UPDATE cache SET data = ? WHERE module = ? AND key = ?", (json.dumps(data), module, key)
+                    "UPDATE cache SET data = ?, expire_at = ? WHERE module = ? AND key = ?",
+                    (serialize.dumps(data), expire_at, module, key),
                 )
             else:
                 cursor.execute(
-                    "INSERT INTO cache (module, key, data) VALUES (?, ?, ?)", (module, key, json.dumps(data))
+                    "INSERT INTO cache (module, key, data, expire_at) VALUES (?, ?, ?, ?)",
+                    (module, key, serialize.dumps(data), expire_at),
                 )
             conn.commit()
     except:
@@ -192,16 +194,56 @@ def updateCache(module, key, data, expire=None):
         logger.error(traceback.format_exc())
 
 
-def resetRequestTime(ip):
-    variable.request_time[ip] = 0
+def _check_expire(cache_data):
+    cache_data["time"] = int(cache_data["time"])
+    if not cache_data["expire"] or int(time.time()) < cache_data["time"]:
+        return cache_data
+    return None
+
+
+async def getCacheAsync(module, key):
+    """getCache 的异步版本，redis 适配器下不会阻塞事件循环，并与同一周期内的其他读写合并为一个 pipeline"""
+    if read_config("common.cache.adapter") != "redis":
+        return getCache(module, key)
+    from . import redis_cache
+
+    try:
+        result = await redis_cache.get_adapter().get(module, key)
+        if result:
+            return serialize.loads(result)
+    except:
+        logger.debug(f"读取 redis 缓存失败: {module}:{key}\n" + traceback.format_exc())
+    return None
+
+
+async def getCacheMany(items):
+    """
+    批量读取缓存，items 为 [(module, key), ...]
+    返回与 items 顺序一致的列表，不存在或已过期的项为 None；redis 适配器下使用一次 MGET
+    """
+    if read_config("common.cache.adapter") != "redis":
+        return [getCache(module, key) for module, key in items]
+    from . import redis_cache
 
+    try:
+        results = await redis_cache.get_adapter().get_many(items)
+    except:
+        logger.debug("批量读取 redis 缓存失败\n" + traceback.format_exc())
+        return [None] * len(items)
+    return [serialize.loads(result) if result else None for result in results]
 
-def updateRequestTime(ip):
-    variable.request_time[ip] = time.time()
 
+async def updateCacheAsync(module, key, data, expire=None):
+    """updateCache 的异步版本"""
+    if read_config("common.cache.adapter") != "redis":
+        return updateCache(module, key, data, expire)
+    from . import redis_cache
 
-def getRequestTime(ip):
-    return variable.request_time.get(ip, 0)
+    try:
+        await redis_cache.get_adapter().set(module, key, serialize.dumps(data), expire)
+    except:
+        logger.error("缓存写入遇到错误…")
+        logger.error(traceback.format_exc())
 
 
 def read_data(key):
@@ -252,24 +294,37 @@ def push_to_list(key, obj):
 
 
 def write_config(key, value):
-    config = None
-    with open("./config/config.yml", "r", encoding="utf-8") as f:
-        config = yaml_.YAML().load(f)
+    write_configs({key: value})
 
-    keys = key.split(".")
-    current = config
-    current_cache = variable.config
-    for k in keys[:-1]:
-        if k not in current:
-            current[k] = {}
-        current = current[k]
-        if k not in current_cache:
-            current_cache[k] = {}
-        current_cache = current_cache[k]
 
-    current[keys[-1]] = value
-    # 更新配置缓存
-    current_cache[keys[-1]] = value
+def write_configs(items, save=True):
+    """一次写入多个配置项（{"a.b.c": value}），只读写一次配置文件；save 为 False 时只更新内存中的配置"""
+    config = None
+    if save:
+        with open("./config/config.yml", "r", encoding="utf-8") as f:
+            config = yaml_.YAML().load(f)
+
+    for key, value in items.items():
+        keys = key.split(".")
+        current = config
+        current_cache = variable.config
+        for k in keys[:-1]:
+            if save:
+                if k not in current:
+                    current[k] = {}
+                current = current[k]
+            if k not in current_cache:
+                current_cache[k] = {}
+            current_cache = current_cache[k]
+
+        value = _to_plain(value)
+        if save:
+            current[keys[-1]] = value
+        # 更新配置缓存
+        current_cache[keys[-1]] = value
+    rebuild_snapshot()
+    if not save:
+        return
 
     # 设置保留注释和空行的参数
     y = yaml_.YAML()
@@ -279,6 +334,8 @@ def write_config(key, value):
     # 写入配置并保留注释和空行
     with open("./config/config.yml", "w", encoding="utf-8") as f:
         y.dump(config, f)
+    # 自身写入的修改不需要触发热重载
+    _remember_config_stat()
 
 
 def read_default_config(key):
@@ -323,7 +380,225 @@ def _read_config(key):
         return None
 
 
+class ConfigNode(dict):
+    """
+    只读配置快照中的一个节点，支持属性访问：config.settings.common.batch.concurrency
+    配置项同时写入实例属性，因此与 dict 方法重名的配置项（如 security.key.values）同样返回配置值
+    """
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.__dict__.update((k, v) for k, v in self.items() if isinstance(k, str))
+
+    def __getattr__(self, name):
+        raise AttributeError(f"配置项 {name} 不存在")
+
+
+def _to_node(value):
+    if isinstance(value, dict):
+        return ConfigNode((k, _to_node(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_to_node(v) for v in value]
+    return value
+
+
+def _to_plain(value):
+    if isinstance(value, dict):
+        return {k: _to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_plain(v) for v in value]
+    return value
+
+
+class ConfigSnapshot:
+    """
+    配置文件的预编译快照：root 为属性访问的配置树，flat 为 "a.b.c" -> 值 的索引，read_config 直接查表
+    """
+    __slots__ = ("root", "flat")
+
+    def __init__(self, config_data):
+        self.root = _to_node(config_data if isinstance(config_data, dict) else {})
+        self.flat = {}
+        self._index(self.root, "")
+
+    def _index(self, node, prefix):
+        for k, v in node.items():
+            path = prefix + str(k)
+            self.flat[path] = v
+            if isinstance(v, ConfigNode):
+                self._index(v, path + ".")
+
+
+_snapshot = ConfigSnapshot({})
+settings = _snapshot.root
+
+
+def rebuild_snapshot():
+    """根据 variable.config 重新生成快照，新快照构建完成后一次性替换"""
+    global _snapshot, settings
+    snapshot = ConfigSnapshot(variable.config)
+    _snapshot = snapshot
+    settings = snapshot.root
+
+
+def _collect_missing_defaults(default_node, user_node, prefix="", missing=None):
+    # 收集默认配置中存在、配置文件中缺失的项: {"a.b.c": 默认值}
+    missing = {} if missing is None else missing
+    for k, v in default_node.items():
+        path = prefix + str(k)
+        if not isinstance(user_node, dict) or k not in user_node:
+            missing[path] = v
+        elif isinstance(v, dict) and isinstance(user_node[k], dict):
+            _collect_missing_defaults(v, user_node[k], path + ".", missing)
+    return missing
+
+
+def _fill_missing_defaults(default_node, user_node):
+    # 将缺失的默认配置补全，保证快照的属性访问总能取到值；
+    # 所有缺失项一次写入配置文件，多进程模式下只由主 worker 写入，其他 worker 只补全内存中的配置
+    from . import workers
+    missing = _collect_missing_defaults(default_node, user_node)
+    if not missing:
+        return
+    primary = workers.is_primary()
+    write_configs(missing, save=primary)
+    if primary:
+        for path in missing:
+            logger.info(f"配置文件{path}不存在，已创建")
+
+
+# —— 配置热重载 ——
+# 模块在导入时从配置派生的常量（如 wy.PROTO、kg/tx 的 tools）通过 subscribe 注册回调，
+# 配置重新加载后依次调用，由各模块自行重新计算
+
+_subscribers = []
+_config_stat = None
+
+
+def subscribe(func):
+    """注册配置重新加载后的回调，回调不接收参数，直接从 config 读取新值；可作为装饰器使用"""
+    _subscribers.append(func)
+    return func
+
+
+def _stat_config_file():
+    try:
+        st = os.stat("./config/config.yml")
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def _remember_config_stat():
+    global _config_stat
+    _config_stat = _stat_config_file()
+
+
+def _type_name(value):
+    # 字符串/数字/布尔之间在读取时本来就会被宽松处理，这里只检查结构（常见于缩进错误）
+    if isinstance(value, (bool, int, float, str)):
+        return "scalar"
+    if isinstance(value, (list, tuple)):
+        return "list"
+    if isinstance(value, dict):
+        return "dict"
+    return None
+
+
+def validate_config(new_config, default_node=None, prefix=""):
+    """以默认配置为准检查配置项结构，返回错误信息列表；默认配置中没有或值为空的项不检查"""
+    if default_node is None:
+        default_node = default
+        if not isinstance(new_config, dict):
+            return ["配置文件并不是一个有效的字典"]
+    errors = []
+    for k, v in default_node.items():
+        if k not in new_config:
+            continue
+        path = prefix + str(k)
+        expected, actual = _type_name(v), _type_name(new_config[k])
+        if expected is None or new_config[k] is None:
+            continue
+        if expected != actual:
+            errors.append(f"{path}: 应为 {expected}，实际为 {actual}")
+        elif expected == "dict":
+            errors.extend(validate_config(new_config[k], v, path + "."))
+    return errors
+
+
+def _apply_derived_settings():
+    variable.log_length_limit = read_config("common.log_length_limit")
+    variable.debug_mode = read_config("common.debug_mode")
+    variable.use_cookie_pool = bool(read_config("common.cookiepool"))
+    variable.log_config = dict(read_config("common.logging") or {})
+    configure_log()
+    serialize.configure(read_config("common.performance.orjson"))
+
+
+def reload_config():
+    """
+    重新读取配置文件，校验通过后替换配置快照并通知订阅者
+    返回 (是否成功, 错误信息列表)，失败时保持原配置不变
+    """
+    _remember_config_stat()
+    try:
+        with open("./config/config.yml", "r", encoding="utf-8") as f:
+            new_config = yaml.load(f.read())
+    except Exception:
+        logger.error("重新加载配置文件失败，请检查是否遵循YAML语法规范\n" + traceback.format_exc())
+        return False, ["配置文件不符合YAML语法规范"]
+    errors = validate_config(new_config)
+    if errors:
+        logger.error("重新加载配置文件失败，配置项结构错误：\n" + "\n".join(errors))
+        return False, errors
+
+    variable.config = new_config
+    _fill_missing_defaults(default, variable.config)
+    rebuild_snapshot()
+    _apply_derived_settings()
+    for func in _subscribers:
+        try:
+            func()
+        except Exception:
+            logger.error(f"配置重新加载回调 {getattr(func, '__qualname__', func)} 执行失败\n" + traceback.format_exc())
+    logger.info("配置文件已重新加载")
+    return True, []
+
+
+async def watch_config():
+    """轮询配置文件的修改时间与大小，发生变化时自动重新加载"""
+    import asyncio
+    _remember_config_stat()
+    while variable.running:
+        await asyncio.sleep(max(1, float(read_config("common.hot_reload.interval") or 3)))
+        if not read_config("common.hot_reload.enable"):
+            continue
+        stat = _stat_config_file()
+        if stat is None or stat == _config_stat:
+            continue
+        logger.info("检测到配置文件变化，正在重新加载...")
+        reload_config()
+
+
 def read_config(key):
+    flat = _snapshot.flat
+    try:
+        return flat[key]
+    except KeyError:
+        pass
+    # 路径中间的值不是字典时（如 security.check_lxm.enable），与逐级查找的结果一致返回 None
+    parent = key.rpartition(".")[0]
+    while parent:
+        if parent in flat:
+            if not isinstance(flat[parent], dict):
+                return None
+            break
+        parent = parent.rpartition(".")[0]
+    return _read_config_slow(key)
+
+
+def _read_config_slow(key):
+    # 快照中不存在的配置项：从默认配置补全并写入配置文件
     try:
         config = variable.config
         keys = key.split(".")
@@ -402,10 +677,15 @@ def init_config():
                     variable.config = handle_default_config()
     except FileNotFoundError:
         variable.config = handle_default_config()
+    _fill_missing_defaults(default, variable.config)
+    rebuild_snapshot()
     # print(variable.config)
     variable.log_length_limit = read_config("common.log_length_limit")
     variable.debug_mode = read_config("common.debug_mode")
+    variable.log_config = dict(read_config("common.logging") or {})
+    configure_log()
     logger.debug("配置文件加载成功")
+    serialize.configure(read_config("common.performance.orjson"))
 
     # 尝试连接数据库
     handle_connect_db()
@@ -423,6 +703,13 @@ module TEXT NOT NULL,
 key TEXT NOT NULL,
 data TEXT NOT NULL)"""
     )
+    # 旧版本创建的表没有 expire_at 列，新增后为 NULL，由过期缓存清理任务分批补齐
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(cache)").fetchall()]
+    if "expire_at" not in columns:
+        cursor.execute("ALTER TABLE cache ADD COLUMN expire_at INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS cache_module_key ON cache (module, key)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS cache_expire_at ON cache (expire_at)")
+    conn.commit()
 
     conn.close()
 
@@ -506,6 +793,8 @@ def ban_ip(ip_addr, ban_time=-1):
         }
         variable.ban_list[ip_addr] = ban_info
         variable.ban_list_raw.add(ip_addr)
+        if shared_state.enabled():
+            shared_state.submit(shared_state.put_ban, ban_info)
         # TODO: Add a background task to persist the ban list to the database
     else:
         if variable.banList_suggest < 10:
@@ -543,6 +832,15 @@ def check_ip_banned(ip_addr):
         return False
 
 
+async def sync_ban_list():
+    """
+    多进程模式下从共享状态同步其他 worker 新增的封禁
+    """
+    bans = await shared_state.run(shared_state.load_bans)
+    variable.ban_list = {b["ip"]: b for b in bans}
+    variable.ban_list_raw = set(variable.ban_list)
+
+
 async def persist_ban_list():
     """
     Persist the in-memory ban list to the database.
@@ -0,0 +1,207 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: cookie_pool.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# cookie 池账号选择
+# 记录每个账号的成功率、耗时与最近一次错误，按健康程度加权随机选择账号；
+# 连续失败的账号暂停使用，暂停时间按指数退避增长，成功一次后恢复；
+# 可以限制单个账号每秒的使用次数，所有账号都不可用时仍会选出一个，避免直接拒绝请求
+
+import time
+import random
+import hashlib
+from . import log
+from . import config
+from . import metrics
+from . import variable
+
+logger = log.log('cookie_pool')
+
+# 用于区分账号的字段
+ID_FIELDS = {
+    'kg': 'userid',
+    'tx': 'uin',
+    'wy': 'cookie',
+    'mg': 'by',
+    'kw': 'uid',
+}
+# 与账号无关的失败原因，不计入账号的失败次数
+NEUTRAL_REASONS = ('no_copyright', 'quality_mismatch', 'circuit_open', 'song_unavailable')
+# 成功率与耗时的指数移动平均系数
+EWMA_ALPHA = 0.2
+
+_accounts = {}
+
+
+def account_id(source, user_info):
+    value = str(user_info.get(ID_FIELDS.get(source, ''), ''))
+    if (source == 'wy'):
+        # cookie 不直接出现在指标中
+        return 'cookie_' + hashlib.md5(value.encode('utf-8')).hexdigest()[:8]
+    return value
+
+
+class AccountState:
+    def __init__(self, source, account):
+        self.source = source
+        self.account = account
+        self.success_rate = 1.0
+        self.latency = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.quarantine_level = 0
+        self.quarantined_until = 0
+        self.last_error = None
+        self.last_error_time = None
+        self.last_used = 0
+        self.tokens = None
+        self.tokens_updated = 0
+
+    def quarantined(self, now):
+        return self.quarantined_until > now
+
+    def weight(self):
+        # 成功率越高、耗时越短的账号越容易被选中，成功率很低的账号仍保留少量流量用于恢复
+        return max(self.success_rate, 0.05) ** 2 / (1 + self.latency)
+
+    def has_budget(self, now, qps):
+        if (qps <= 0):
+            return True
+        if (self.tokens is None):
+            self.tokens = qps
+        else:
+            self.tokens = min(qps, self.tokens + (now - self.tokens_updated) * qps)
+        self.tokens_updated = now
+        return self.tokens >= 1
+
+    def take(self, now, qps):
+        self.last_used = now
+        if (qps > 0 and self.tokens is not None):
+            self.tokens -= 1
+
+    def record(self, success, latency, error=None):
+        policy = config.read_config('common.cookiepool_policy') or {}
+        now = time.time()
+        self.success_rate += EWMA_ALPHA * ((1.0 if success else 0.0) - self.success_rate)
+        if (latency is not None):
+            self.latency = latency if (not self.successes and not self.failures) else self.latency + EWMA_ALPHA * (latency - self.latency)
+        if (success):
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.quarantine_level = 0
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+        self.last_error_time = now
+        threshold = max(1, int(policy.get('failure_threshold', 3)))
+        if (self.consecutive_failures >= threshold):
+            self.quarantine_level += 1
+            duration = min(float(policy.get('quarantine_time', 60)) * 2 ** (self.quarantine_level - 1),
+                           float(policy.get('max_quarantine_time', 3600)))
+            self.quarantined_until = now + duration
+            # 恢复后再失败一次即重新暂停，暂停时间翻倍
+            self.consecutive_failures = threshold - 1
+            metrics.inc('cookie_pool_quarantine_total', source=self.source)
+            logger.warning(f'{self.source} 账号 {self.account} 连续请求失败，暂停使用 {int(duration)} 秒，最近错误: {error}')
+
+    def to_dict(self):
+        now = time.time()
+        return {
+            'success_rate': round(self.success_rate, 4),
+            'latency': round(self.latency, 4),
+            'successes': self.successes,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'quarantined': self.quarantined(now),
+            'quarantine_remaining': max(0, round(self.quarantined_until - now, 1)),
+            'last_error': self.last_error,
+            'last_error_time': self.last_error_time,
+            'weight': round(self.weight(), 4),
+        }
+
+
+def _state(source, user_info):
+    key = (source, account_id(source, user_info))
+    state = _accounts.get(key)
+    if (state is None):
+        state = _accounts[key] = AccountState(source, key[1])
+    return state
+
+
+def choose(source):
+    '''从 module.cookiepool.<source> 中选择一个账号'''
+    pool = config.read_config(f'module.cookiepool.{source}')
+    if (len(pool) == 1):
+        _state(source, pool[0]).take(time.time(), 0)
+        return pool[0]
+    qps = float((config.read_config('common.cookiepool_policy') or {}).get('qps', 0) or 0)
+    now = time.time()
+    states = [_state(source, u) for u in pool]
+    available = [i for i, s in enumerate(states) if (not s.quarantined(now))]
+    candidates = [i for i in available if states[i].has_budget(now, qps)]
+    if (not candidates):
+        metrics.inc('cookie_pool_exhausted_total', source=source)
+        if (available):
+            # 都超出了每秒使用次数，选择最久没有使用的账号
+            candidates = [min(available, key=lambda i: states[i].last_used)]
+        else:
+            # 都在暂停中，选择最早恢复的账号
+            candidates = [min(range(len(states)), key=lambda i: states[i].quarantined_until)]
+    index = random.choices(candidates, weights=[states[i].weight() for i in candidates])[0]
+    states[index].take(now, qps)
+    return pool[index]
+
+
+def report(source, user_info, success, latency=None, error=None):
+    _state(source, user_info).record(success, latency, error)
+    metrics.inc('cookie_pool_requests_total', source=source, result='success' if success else 'failed')
+
+
+class use:
+    '''
+    选择账号并在退出时记录结果:
+        async with cookie_pool.use('kg') as user_info:
+            ...
+    未开启 cookie 池时返回 module.<source>.user，不做记录
+    '''
+    def __init__(self, source):
+        self.source = source
+        self.user_info = None
+        self.start = 0
+
+    async def __aenter__(self):
+        if (not variable.use_cookie_pool):
+            self.user_info = config.read_config(f'module.{self.source}.user')
+            return self.user_info
+        self.user_info = choose(self.source)
+        self.start = time.time()
+        return self.user_info
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if (not variable.use_cookie_pool or self.user_info is None):
+            return False
+        if (exc is not None and getattr(exc, 'reason', None) in NEUTRAL_REASONS):
+            return False
+        if (exc_type is not None and not issubclass(exc_type, Exception)):
+            # 请求被取消等情况不代表账号有问题
+            return False
+        error = None if (exc is None) else (str(exc) or exc_type.__name__)
+        report(self.source, self.user_info, exc is None, time.time() - self.start, error)
+        return False
+
+
+def stats():
+    result = {}
+    for (source, account), state in _accounts.items():
+        result.setdefault(source, {})[account] = state.to_dict()
+    return result
+
+
+metrics.register_collector('cookie_pool', stats)
@@ -5,6 +5,10 @@ common:
   # - '::' # 取消这一行的注释，启用 ipv6 监听
   ports: # 服务器启动时所使用的端口
     - 9763
+  workers: 1 # 服务进程数量，大于 1 时启用多进程模式（仅支持 SO_REUSEPORT 的系统，如 Linux），也可以通过启动参数 --workers 指定
+  performance: # 性能选项（可选依赖，未安装时自动回退）
+    uvloop: false # 使用 uvloop 事件循环，需要 pip install uvloop，不支持 Windows
+    orjson: false # 使用 orjson 序列化接口响应与缓存数据，需要 pip install orjson
   ssl_info: # 服务器https配置
     # 这个服务器是否是https服务器，如果你使用了反向代理来转发这个服务器，如果它使用了https，也请将它设置为true
     is_https: false
@@ -19,7 +23,7 @@ common:
     allow_public_ip: false # 允许来自公网的转发
     allow_proxy: true # 是否允许反代
     real_ip_header: X-Real-IP # 反代来源ip的来源头，不懂请保持默认
-  debug_mode: false # 是否开启调试模式
+  debug_mode: false # 是否开启调试模式（开启后接口响应会格式化输出，便于阅读）
   log_length_limit: 500 # 单条日志长度限制
   fakeip: 1.0.1.114 # 服务器在海外时的IP伪装值
   proxy: # 代理配置，HTTP与HTTPS协议需分开配置
@@ -27,7 +31,18 @@ common:
     http_value: http://127.0.0.1:7890
     https_value: http://127.0.0.1:7890
   log_file: true # 是否存储日志文件
+  logging: # 日志输出配置
+    async: true # 是否由后台线程批量写入日志，关闭后在调用处直接写入
+    format: text # 日志文件格式，text 为纯文本，json 为每行一个 JSON 对象（JSON Lines）
+    max_size: 10 # 单个日志文件的最大大小（MB），超过后轮转，0 为不限制
+    backup_count: 3 # 轮转时保留的旧日志文件数量
+    levels: {} # 按模块设置日志等级，例如 {http_utils: WARNING, aiohttp_web: WARNING}，未设置的模块在调试模式下为 DEBUG，否则为 INFO
   cookiepool: false # 是否开启cookie池，这将允许用户配置多个cookie并在请求时随机使用一个，启用后请在module.cookiepool中配置cookie，在user处配置的cookie会被忽略，cookiepool中格式统一为列表嵌套user处的cookie的字典
+  cookiepool_policy: # cookie池的账号选择策略，仅在开启cookiepool时生效，按账号的成功率与耗时加权随机选择，账号状态可在 /admin/metrics 中查看
+    failure_threshold: 3 # 账号连续失败多少次后暂停使用
+    quarantine_time: 60 # 首次暂停使用的时间（秒），恢复后再次失败时暂停时间翻倍
+    max_quarantine_time: 3600 # 暂停使用时间的上限（秒）
+    qps: 0 # 单个账号每秒最多使用的次数，所有账号都超出时选择最久没有使用的账号，0 为不限制
   allow_download_script: true # 是否允许直接从服务端下载脚本，开启后可以直接访问 /script?key=你的请求key 下载脚本
   download_config: # 源脚本的相关配置
     name: 修改为你的源脚本名称
@@ -74,6 +89,122 @@ common:
     # URL 生成配置
     direct_url: false                # 是否生成直接访问 URL（包含认证信息）
     proxy_auth: true                 # 是否通过服务器代理认证请求
+  # 外部 LX 源脚本配置，本地源获取失败时会尝试调用这些脚本获取链接
+  external_scripts:
+    urls: [] # 脚本下载地址列表
+    worker_pool: # 常驻 Node.js 工作进程池，脚本只加载一次，避免每次兜底都重新启动 node
+      enable: true
+      size: 2 # 工作进程数量
+      max_concurrency: 8 # 同时执行的脚本调用上限
+      max_requests: 500 # 单个工作进程处理多少次调用后回收重启，防止脚本内存泄漏
+      timeout: 15 # 单次调用超时时间（秒）
+      health_check_interval: 60 # 健康检查间隔（秒）
+    race: # 多脚本竞速：先启动历史表现最好的脚本，超过对冲延迟仍未返回时再启动下一个，取最先成功的结果
+      enable: true
+      hedge_delay: 1.5 # 对冲延迟（秒）
+      timeout: 20 # 整体超时时间（秒）
+      window: 50 # 每个(脚本, 平台)保留最近多少次调用记录用于排序
+  # 失败结果缓存：上游与外部脚本都获取失败的歌曲在短时间内直接返回失败，避免反复请求上游
+  negative_cache:
+    enable: true
+    max_size: 10000 # 最多缓存的失败记录数量
+    ttl: # 各失败原因的缓存时间（秒），0为不缓存
+      no_copyright: 3600 # 平台无版权
+      quality_mismatch: 600 # 平台返回的音质与请求不一致
+      circuit_open: 0 # 上游已熔断
+      song_unavailable: 60 # 账号正常但平台没有返回该歌曲的链接
+      failed: 60 # 其他失败
+  # 上游熔断：某个上游（按域名区分）连续失败达到阈值后，一段时间内直接失败，避免请求堆积
+  circuit_breaker:
+    enable: true
+    failure_threshold: 5 # 连续失败多少次后熔断
+    recovery_time: 30 # 熔断持续时间（秒），之后放行少量请求探测是否恢复
+    half_open_max_calls: 1 # 探测阶段同时放行的请求数量
+  # 跨平台兜底：某个平台获取失败时，按歌名/歌手/时长在其他已启用且支持搜索的平台上查找同一首歌
+  cross_source:
+    enable: false
+    sources: # 参与查找的平台，按顺序尝试
+      - kg
+      - tx
+      - wy
+      - kw
+      - mg
+    duration_tolerance: 3 # 时长允许的误差（秒）
+    mapping_expire: 86400 # 匹配结果的缓存时间（秒），期间直接使用匹配到的平台
+  upstream_override: {} # 将上游主机替换为其他地址，如本地的模拟上游（python test/mock_upstream.py），格式 {u.y.qq.com: "http://127.0.0.1:9800"}，留空不替换
+  # 配置热重载：修改配置文件后自动生效，无需重启；也可以通过管理接口 POST /admin/reload 手动触发
+  hot_reload:
+    enable: true
+    interval: 3 # 检查配置文件变化的间隔（秒）
+  # 响应压缩：按请求头 Accept-Encoding 使用 brotli（需要 pip install brotli）或 gzip 压缩接口响应，音频与文件不压缩
+  compression:
+    enable: true
+    min_size: 1024 # 小于该大小（字节）的响应不压缩
+    gzip_level: 6 # gzip 压缩等级（1-9）
+    brotli: true # 客户端支持且已安装 brotli 时优先使用
+    brotli_level: 5 # brotli 压缩等级（0-11）
+    cache_size: 256 # 缓存的歌词与歌曲信息压缩结果数量，相同内容只压缩一次，0 为不缓存
+  # 批量取链接口 POST /batch/url，按完成顺序以 NDJSON 逐行返回结果
+  batch:
+    enable: true
+    max_items: 200 # 单次请求最多包含的歌曲数量
+    concurrency: 8 # 单次请求内同时处理的歌曲数量
+  # 定时任务调度（登录刷新、签到、缓存清理等）
+  scheduler:
+    max_concurrency: 4 # 同时执行的定时任务数量上限
+    timeout: 600 # 单个任务单次执行的超时时间（秒），0 为不限制
+    jitter: 30 # 每次执行随机推迟的最长时间（秒），不超过任务执行间隔的 10%，避免多个任务同时触发
+    persist: true # 将任务的最近执行时间保存到数据库，重启后按原来的周期继续执行
+  # 预取接口 POST /prefetch，客户端提交接下来要播放的歌曲（格式与批量接口相同），服务端在后台预先获取链接
+  prefetch:
+    enable: false
+    download: false # 预取时同时下载音频到本地缓存（需开启 remote_cache），关闭时在客户端真正请求该歌曲时再下载
+    max_items: 10 # 单次请求最多预取的歌曲数量
+    max_pending: 100 # 等待预取的歌曲数量上限，超出的直接丢弃
+    concurrency: 2 # 同时进行的预取数量
+    budget: 60 # 每分钟最多向上游预取的歌曲数量，已缓存的歌曲不计入，0 为不限制
+    busy_threshold: 4 # 正在处理的请求达到该数量时暂停预取，优先处理客户端请求
+    learn: # 根据请求记录学习同一客户端连续播放的顺序，请求某首歌时预取最可能的下一首
+      enable: true
+      window: 600 # 同一客户端两次请求间隔在该时间（秒）内才视为连续播放
+      min_count: 2 # 某首歌之后播放另一首的次数达到该值才会预取
+      top: 1 # 每次预取最可能的几首
+      max_songs: 10000 # 记录的歌曲与客户端数量上限
+  # 性能分析：管理接口 GET /admin/profile?seconds=10 采样指定时间内的调用栈，以折叠格式返回（可用 flamegraph.pl 或 speedscope 生成火焰图），
+  # 加上 threads=all 时采样所有线程；慢请求与事件循环阻塞记录可在 GET /admin/profile/slow 查看
+  profiler:
+    max_seconds: 60 # 单次采样的最长时间（秒）
+    interval: 0.005 # 采样间隔（秒）
+    keep: 20 # 保留最近的慢请求与事件循环阻塞记录条数
+    slow_request: # 请求处理时间超过阈值时记录并输出其当时的调用栈
+      enable: true
+      threshold: 5 # 阈值（秒）
+      exclude: # 不检查的路径前缀（流式返回的接口与采样接口本身耗时较长）
+        - /admin/profile
+        - /webdav
+        - /peer/cache/
+        - /cache/
+        - /batch/url
+    loop_lag: # 事件循环阻塞监控，某个回调阻塞事件循环超过阈值时输出事件循环线程当时的调用栈
+      enable: true
+      threshold: 200 # 阈值（毫秒）
+      interval: 0.1 # 检查间隔（秒）
+  cluster: # 集群模式，多个实例通过 common.cache.redis 配置的 redis 协作，建议同时将 cache.adapter 设置为 redis 以共享链接缓存
+    enable: false
+    node_id: "" # 节点标识，留空时使用 主机名:第一个端口，同一节点的多个 worker 使用相同的标识
+    public_url: "" # 其他节点与客户端访问本节点的地址，如 http://10.0.0.2:9763，留空时本节点的音频缓存不会共享给其他节点
+    redirect: true # 本节点没有缓存而其他节点有时，返回指向该节点的音频地址，同一个音频文件在集群中只下载一次
+    lock_ttl: 30 # 解析/下载锁的有效期（秒），持有期间会自动续期，节点崩溃后最多在此时间后释放
+    lock_wait: 15 # 等待其他节点完成同一首歌解析的最长时间（秒），超时后自行解析
+    node_ttl: 30 # 节点心跳超时时间（秒），超时的节点不会被重定向
+    audio_ttl: 86400 # 音频文件位置登记的有效期（秒），持有文件的节点每半个周期重新登记，下线节点或已删除文件的登记最多在此时间后过期
+  peer_cache: # 节点间共享音频缓存，不依赖 redis，本地没有的音频先向其他节点查询，命中时由本节点转发并同时缓存到本地
+    enable: false
+    key: "" # 节点间验证使用的共享密钥，所有节点需要相同，留空时不启用
+    peers: [] # 其他节点的地址，如 http://10.0.0.2:9763
+    hedge_timeout: 0.3 # 同时查询所有节点的最长等待时间（秒），超时后直接请求上游
+    miss_ttl: 30 # 所有节点都没有的文件名在这段时间（秒）内不再向节点查询，避免对不存在的文件反复查询所有节点
+    timeout: 60 # 从节点下载音频文件的超时时间（秒）
   # 缓存配置
   cache:
     # 适配器 [redis,sql]
@@ -86,11 +217,42 @@ common:
       user: ""
       password: ""
       key_prefix: "LXAPISERVER"
+      max_connections: 32 # 异步连接池的最大连接数
+      pipeline_max_size: 64 # 同一事件循环周期内合并到一个 pipeline 中的最大命令数
+      client_cache: # 客户端缓存，通过 CLIENT TRACKING 接收失效通知，需要 redis 6.0 及以上
+        enable: false
+        modules: [info, lyric] # 在本地保存副本的缓存模块
+        max_size: 10000 # 本地最多保存的键数量
+        ttl: 300 # 本地副本的最长保存时间（秒）
+    # sql 适配器的过期缓存清理任务，定期分批删除 cache.db 中已过期的缓存
+    reaper:
+      enable: true
+      interval: 3600 # 执行间隔（秒）
+      batch_size: 500 # 每批删除的行数，批次之间会提交事务释放数据库锁
+      batch_pause: 0.05 # 批次之间的间隔（秒）
+      incremental_vacuum: false # 是否在清理后回收空闲页以缩小 cache.db，首次开启时会执行一次完整的 VACUUM
+      vacuum_pages: 1000 # 每次最多回收的页数，0 为回收全部空闲页
+      max_rows: {} # 按模块限制缓存行数，超出时优先删除最早过期的行，例如 {httpx: 50000, urls: 100000}
 
 security:
-  rate_limit: # 请求速率限制  填入的值为至少间隔多久才能进行一次请求，单位：秒，不限制请填为0
-    global: 0 # 全局
-    ip: 0 # 单个IP
+  rate_limit: # 请求速率限制（令牌桶）
+    global: 0 # 旧配置：全局至少间隔多久才能进行一次请求，单位：秒，buckets.global 未设置时生效，不限制请填为0
+    ip: 0 # 旧配置：单个IP至少间隔多久才能进行一次请求，buckets.ip 未设置时生效
+    backend: memory # 令牌存储 [memory, redis]，memory 为每个进程独立存储，redis 使用 common.cache.redis 的连接配置，多进程模式下共享
+    max_keys: 100000 # memory 后端最多记录的桶数量，超出时淘汰最久未访问的
+    buckets: # rate 为每秒补充的令牌数（即平均每秒允许的请求数），burst 为最多积攒的令牌数（允许的突发请求数），rate 为0时不限制
+      global: # 全局
+        rate: 0
+        burst: 0
+      ip: # 单个IP
+        rate: 0
+        burst: 0
+      key: # 单个请求key（X-Request-Key）
+        rate: 0
+        burst: 0
+      ip_source: # 单个IP请求单个平台
+        rate: 0
+        burst: 0
   key:
     enable: false # 是否开启请求key，开启后只有请求头中包含key，且值一样时可以访问API
     ban: true
@@ -116,6 +278,9 @@ security:
     expire: # 是否启用黑名单IP过期（关闭后其他地方的配置会失效）
       enable: true
       length: 604800
+  admin: # 管理接口（/admin/...，如指标查看）的访问控制
+    enable: true
+    key: "" # 请求头 X-Admin-Key 需与此值一致；留空时仅允许本机/内网IP访问
 
 module:
   kg: # 酷狗音乐相关配置
@@ -161,6 +326,10 @@ module:
         enable: false
         interval: 86000
     cdnaddr: http://ws.stream.qqmusic.qq.com/
+    vkey_batch: # 合并同一时间窗口内的多个取链请求，使用一次 UrlGetVkey 批量获取
+      enable: true
+      window: 0.02 # 等待合并的时间窗口（秒）
+      max_size: 20 # 单次批量请求最多包含的歌曲数量
 
   wy: # 网易云音乐相关配置, proto支持值: ['offcial', 'ncmapi']
     enable: true # 是否开启本平台服务
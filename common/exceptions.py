@@ -9,4 +9,7 @@
 
 class FailedException(Exception):
     # 此错误用于处理代理API请求失败的情况
-    pass
\ No newline at end of file
+    # reason 用于区分失败原因（如 no_copyright / quality_mismatch / circuit_open / song_unavailable），供失败结果缓存与 cookie 池使用
+    def __init__(self, *args, reason='failed'):
+        super().__init__(*args)
+        self.reason = reason
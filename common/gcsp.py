@@ -14,6 +14,7 @@ import ujson as json
 import modules
 from .utils import createMD5 as hashMd5
 from . import config
+from . import serialize
 from aiohttp.web import Response, Request
 
 PACKAGE = config.read_config("module.gcsp.package_md5") # pkg md5
@@ -21,6 +22,14 @@ SALT_1 = config.read_config("module.gcsp.salt_1") # salt 1
 SALT_2 = config.read_config("module.gcsp.salt_2") # salt 2
 NEED_VERIFY = config.read_config("module.gcsp.enable_verify") # need verify
 
+@config.subscribe
+def _reload_config():
+    global PACKAGE, SALT_1, SALT_2, NEED_VERIFY
+    PACKAGE = config.read_config("module.gcsp.package_md5")
+    SALT_1 = config.read_config("module.gcsp.salt_1")
+    SALT_2 = config.read_config("module.gcsp.salt_2")
+    NEED_VERIFY = config.read_config("module.gcsp.enable_verify")
+
 qm = {
     'mp3': '128k',
     'hq': '320k',
@@ -61,16 +70,16 @@ async def handleGcspBody(body):
     data = decode(body)
     result = verify(data)
     if (result != "success"):
-        return zlib.compress(json.dumps({"code": "403", "error_msg": internal_trans[result], "data": None}, ensure_ascii = False).encode("utf-8"))
+        return zlib.compress(serialize.dumps_bytes({"code": "403", "error_msg": internal_trans[result], "data": None}))
 
     data["te"] = json.loads(data["text_1"])
 
     body = await modules.url(pm[data["te"]["platform"]], data["te"]["t1"], qm[data["te"]["t2"]])
 
     if (body["code"] == 0):
-        return zlib.compress(json.dumps({"code": "200", "error_msg": "success", "data": body["data"] if (pm[data["te"]["platform"]] != "kw") else {"bitrate": "123", "url": body["data"]}}, ensure_ascii = False).encode("utf-8"))
+        return zlib.compress(serialize.dumps_bytes({"code": "200", "error_msg": "success", "data": body["data"] if (pm[data["te"]["platform"]] != "kw") else {"bitrate": "123", "url": body["data"]}}))
     else:
-        return zlib.compress(json.dumps({"code": "403", "error_msg": "内部系统错误，请稍后再试", "data": None}, ensure_ascii = False).encode("utf-8"))
+        return zlib.compress(serialize.dumps_bytes({"code": "403", "error_msg": "内部系统错误，请稍后再试", "data": None}))
 
 async def handle_request(request: Request):
     if (request.method == "POST"):
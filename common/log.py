@@ -8,18 +8,23 @@
 # This file is part of the "lx-music-api-server" project.
 
 import logging
+import logging.handlers
 import colorlog
 import os
 import sys
 import re
-import io
+import queue
+import atexit
+import threading
 import traceback
 import time
+import ujson
 from pygments import highlight
 from pygments.lexers import PythonLexer
 from pygments.formatters import TerminalFormatter
 from .utils import filterFileName, setGlobal, require
-from .variable import debug_mode, log_length_limit, log_file, log_files
+from . import variable
+from .variable import log_file
 from colorama import Fore, Style
 from colorama import init as clinit
 
@@ -195,29 +200,106 @@ class LogHelper(logging.Handler):
         log_message = self.format(record)
         self.custom_logger.info(log_message)
 
-class fileWriter(logging.Handler):
-    def __init__(self, f: io.TextIOWrapper, f2: logging.Formatter):
-        self.file = f
-        self.formatter = f2
+# 日志管线：各模块的 logger 只通过 QueueHandler 把日志记录放入队列（等级检查在调用处完成），
+# 由后台写入线程批量取出后统一完成格式化、控制台输出与文件写入，避免在事件循环中进行阻塞的文件 I/O
+# common.logging.async 为 false 时在调用处直接写入
 
-    def emit(self, record: logging.LogRecord):
-        self.file.write(self.format(record) + '\n')
-        self.file.flush()
+BATCH_SIZE = 512
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
 
-class log:
-    # 主类
-    def __init__(self, module_name='Not named logger', output_level='INFO', filename=''):
-        self.name = module_name
-        self._logger = logging.getLogger(module_name)
-        if not output_level.upper() in dir(logging):
-            raise NameError('Unknown loglevel: '+output_level)
-        if not debug_mode:
-            self._logger.setLevel(getattr(logging, output_level.upper()))
+_STOP = object()
+
+
+class _TimeCache:
+    # 同一秒内的日志共用一次 strftime 的结果
+    def __init__(self):
+        self.second = None
+        self.text = ''
+
+    def format(self, created):
+        second = int(created)
+        if second != self.second:
+            self.second = second
+            self.text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return self.text
+
+
+_time_cache = _TimeCache()
+
+
+class ConsoleFormatter(colorlog.ColoredFormatter):
+    def formatTime(self, record, datefmt=None):
+        return _time_cache.format(record.created)
+
+
+class LogFile:
+    """
+    按大小轮转的日志文件，只在写入线程中使用
+    多进程模式下其他 worker 轮转了文件时会自动重新打开
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.stream = None
+        self.inode = None
+
+    def _open(self):
+        if self.stream:
+            self.stream.close()
+        self.stream = open(self.path, 'a', encoding='utf-8')
+        self.inode = os.fstat(self.stream.fileno()).st_ino
+
+    def _rotate(self, backup_count):
+        self.stream.close()
+        self.stream = None
+        if backup_count > 0:
+            for i in range(backup_count - 1, 0, -1):
+                src = f'{self.path}.{i}'
+                if os.path.exists(src):
+                    os.replace(src, f'{self.path}.{i + 1}')
+            os.replace(self.path, self.path + '.1')
         else:
-            self._logger.setLevel(logging.DEBUG)
-        formatter = colorlog.ColoredFormatter(
+            open(self.path, 'w').close()
+        self._open()
+
+    def write(self, lines, max_bytes=0, backup_count=0):
+        try:
+            if self.stream is None or os.stat(self.path).st_ino != self.inode:
+                self._open()
+        except FileNotFoundError:
+            self._open()
+        size = self.stream.tell()
+        chunk = []
+        for line in lines:
+            # 按字符数近似估计大小，超出时先写入已有内容再轮转
+            if max_bytes > 0 and size > 0 and size + len(line) + 1 > max_bytes:
+                if chunk:
+                    self.stream.write('\n'.join(chunk) + '\n')
+                    chunk = []
+                self._rotate(backup_count)
+                size = 0
+            chunk.append(line)
+            size += len(line) + 1
+        if chunk:
+            self.stream.write('\n'.join(chunk) + '\n')
+        self.stream.flush()
+
+    def close(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+
+class LogWriter:
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.files = {}
+        # logger 名称 -> 日志文件路径
+        self.paths = {}
+        self.console = ConsoleFormatter(
             '%(log_color)s%(asctime)s|[%(name)s/%(levelname)s]|%(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S',
             log_colors={
                 'DEBUG': 'cyan',
                 'INFO': 'white',
@@ -225,70 +307,196 @@ class log:
                 'ERROR': 'red',
                 'CRITICAL': 'red,bg_white',
             })
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='log_writer', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=5):
+        thread = self.thread
+        if thread is not None:
+            self.queue.put(_STOP)
+            thread.join(timeout)
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+            self.files.clear()
+
+    def _after_fork(self):
+        # fork 出的子进程中没有写入线程，重新初始化队列与锁
+        running = self.thread is not None
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.files = {}
+        if running:
+            self.start()
+
+    def put_nowait(self, record):
+        if self.thread is not None:
+            self.queue.put(record)
+        else:
+            with self.lock:
+                self._write([record])
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < BATCH_SIZE:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            stop = _STOP in batch
+            if stop:
+                batch = [r for r in batch if r is not _STOP]
+            try:
+                with self.lock:
+                    self._write(batch)
+            except Exception:
+                sys.stderr.write("日志模块出错，本次日志可能无法记录，请报告给开发者: \n" + traceback.format_exc())
+            if stop:
+                self.thread = None
+                return
+
+    def _format_console(self, record):
+        message = record.msg
+        if getattr(record, 'traceback', False):
+            message = '\n' + highlight_error(message)
+        elif getattr(record, 'allow_hidden', False) and len(message) > variable.log_length_limit:
+            message = message[:variable.log_length_limit] + ' ...'
+        if message is record.msg:
+            return self.console.format(record)
+        full, record.msg = record.msg, message
+        try:
+            return self.console.format(record)
+        finally:
+            record.msg = full
+
+    def _format_file(self, record, json_lines):
+        if json_lines:
+            return ujson.dumps({
+                'time': _time_cache.format(record.created),
+                'ts': record.created,
+                'name': record.name,
+                'level': record.levelname,
+                'pid': record.process,
+                'msg': record.msg,
+            }, ensure_ascii=False)
+        return f'{_time_cache.format(record.created)}|[{record.name}/{record.levelname}]{record.msg}'
+
+    def _write(self, batch):
+        options = variable.log_config
+        json_lines = options.get('format') == 'json'
+        console = []
+        files = {}
+        for record in batch:
+            console.append(self._format_console(record))
+            path = self.paths.get(record.name)
+            if path:
+                files.setdefault(path, []).append(self._format_file(record, json_lines))
+        if console:
+            sys.stderr.write('\n'.join(console) + '\n')
+            sys.stderr.flush()
+        if not files:
+            return
+        max_bytes = int(float(options.get('max_size') or 0) * 1024 * 1024)
+        backup_count = int(options.get('backup_count') or 0)
+        for path, lines in files.items():
+            f = self.files.get(path)
+            if f is None:
+                f = self.files[path] = LogFile(path)
+            try:
+                f.write(lines, max_bytes, backup_count)
+            except Exception:
+                sys.stderr.write(f"写入日志文件 {path} 失败: \n" + traceback.format_exc())
+
+
+_writer = LogWriter()
+_handler = logging.handlers.QueueHandler(_writer)
+# logger 名称 -> log 实例，用于重新加载配置时更新等级
+_loggers = {}
+
+
+def _resolve_level(name, output_level):
+    levels = variable.log_config.get('levels') or {}
+    level = levels.get(name)
+    if isinstance(level, str) and level.upper() in LEVELS:
+        return getattr(logging, level.upper())
+    if variable.debug_mode:
+        return logging.DEBUG
+    return getattr(logging, output_level.upper())
+
+
+def configure():
+    """根据 variable.log_config 切换同步/异步写入并更新各模块的日志等级，配置重新加载后调用"""
+    if variable.log_config.get('async', True):
+        _writer.start()
+    elif _writer.thread is not None:
+        _writer.stop()
+    for logger in _loggers.values():
+        logger._logger.setLevel(_resolve_level(logger.name, logger.output_level))
+
+
+def shutdown():
+    """写入队列中剩余的日志并关闭日志文件"""
+    _writer.stop()
+
+
+atexit.register(shutdown)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_writer._after_fork)
+
+
+class log:
+    # 主类
+    def __init__(self, module_name='Not named logger', output_level='INFO', filename=''):
+        self.name = module_name
+        self.module_name = module_name
+        self._logger = logging.getLogger(module_name)
+        if not output_level.upper() in dir(logging):
+            raise NameError('Unknown loglevel: '+output_level)
+        self.output_level = output_level
+        self._logger.setLevel(_resolve_level(module_name, output_level))
+        self._logger.propagate = False
         if log_file:
             if filename:
                 filename = filterFileName(filename)
             else:
                 filename = './logs/' + module_name + '.log'
-            self.file = open(filename, 'a+', encoding='utf-8')
-            log_files.append(self.file)
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        self.module_name = module_name
-        self._logger.addHandler(console_handler)
-        debug_handler = logging.StreamHandler()
-        debug_handler.setFormatter(formatter)
-
-    def debug(self, message, allow_hidden=True):
-        if (log_file):
-            self.file.write('{time}|[{name}/DEBUG]{msg}'.format(time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()), name = self.module_name, msg = message) + '\n')
+            _writer.paths[module_name] = filename
+        if _handler not in self._logger.handlers:
+            self._logger.addHandler(_handler)
+        _loggers[module_name] = self
 
-        if len(str(message)) > log_length_limit and allow_hidden:
-            message = str(message)[:log_length_limit] + " ..."
-        self._logger.debug(message)
+    # 调试日志支持 logger.debug("xxx: %s", value) 的延迟格式化，未开启 DEBUG 等级时不会格式化参数
 
-    def log(self, message, allow_hidden=True):
-        if (log_file):
-            self.file.write('{time}|[{name}/INFO]{msg}'.format(time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()), name = self.module_name, msg = message) + '\n')
+    def debug(self, message, *args, allow_hidden=True):
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(message, *args, extra={'allow_hidden': allow_hidden})
 
-        if len(str(message)) > log_length_limit and allow_hidden:
-            message = str(message)[:log_length_limit] + " ..."
-        self._logger.info(message)
+    def log(self, message, *args, allow_hidden=True):
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info(message, *args, extra={'allow_hidden': allow_hidden})
 
-    def info(self, message, allow_hidden=True):
-        if (log_file):
-            self.file.write('{time}|[{name}/INFO]{msg}'.format(time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()), name = self.module_name, msg = message) + '\n')
+    def info(self, message, *args, allow_hidden=True):
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info(message, *args, extra={'allow_hidden': allow_hidden})
 
-        if len(str(message)) > log_length_limit and allow_hidden:
-            message = str(message)[:log_length_limit] + "..."
-        self._logger.info(message)
+    def _log_error(self, level, message, args):
+        if self._logger.isEnabledFor(level):
+            is_traceback = isinstance(message, str) and message.strip().startswith('Traceback')
+            self._logger.log(level, message, *args, extra={'traceback': is_traceback})
 
-    def warning(self, message):
-        if (log_file):
-            self.file.write('{time}|[{name}/WARNING]{msg}'.format(time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()), name = self.module_name, msg = message) + '\n')
-
-        if (message.strip().startswith('Traceback')):
-            self._logger.warning('\n' + highlight_error(message))
-        else:
-            self._logger.warning(message)
+    def warning(self, message, *args):
+        self._log_error(logging.WARNING, message, args)
 
-    def error(self, message):
-        if (log_file):
-            self.file.write('{time}|[{name}/ERROR]{msg}'.format(time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()), name = self.module_name, msg = message) + '\n')
+    def error(self, message, *args):
+        self._log_error(logging.ERROR, message, args)
 
-        if (message.startswith('Traceback')):
-            self._logger.error('\n' + highlight_error(message))
-        else:
-            self._logger.error(message)
-
-    def critical(self, message):
-        if (log_file):
-            self.file.write('{time}|[{name}/CRITICAL]{msg}'.format(time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()), name = self.module_name, msg = message) + '\n')
-
-        if (message.startswith('Traceback')):
-            self._logger.critical('\n' + highlight_error(message))
-        else:
-            self._logger.critical(message)
+    def critical(self, message, *args):
+        self._log_error(logging.CRITICAL, message, args)
 
     def set_level(self, loglevel):
         loglevel_upper = loglevel.upper()
@@ -304,6 +512,7 @@ class log:
 
 
 printlogger = log('print')
+configure()
 
 
 def logprint(*args, sep=' ', end='', file=None, flush=None):
@@ -9,9 +9,12 @@
 
 from . import config
 from . import scheduler
+from . import compression
 from .log import log
 from aiohttp.web import Response
 import ujson as json
+import collections
+import gzip
 import re
 import os
 import sys
@@ -29,6 +32,19 @@ def get_resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+# 模板内容缓存，文件的修改时间或大小变化时重新读取
+# _template = {'version': (路径, 修改时间, 大小), 'content': 模板内容}
+_template = {'version': None, 'content': None}
+
+
+def _stat_template(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (path, st.st_mtime_ns, st.st_size)
+
+
 def get_script_content():
     """
     获取脚本模板内容
@@ -38,27 +54,24 @@ def get_script_content():
     """
     local_script_path = './lx-music-source.js.template'
     embedded_script_path = get_resource_path('lx-music-source.js.template')
-    
-    # 优先读取同目录下的模板文件
-    if os.path.exists(local_script_path):
-        try:
-            with open(local_script_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                logger.info('使用本地模板脚本文件')
-                return content
-        except Exception as e:
-            logger.warning(f'读取本地模板脚本失败: {e}')
-    
-    # 如果本地文件不存在或读取失败，使用内嵌资源
-    if os.path.exists(embedded_script_path):
+
+    for path, name, log_failure in ((local_script_path, '本地', logger.warning), (embedded_script_path, '内嵌', logger.error)):
+        version = _stat_template(path)
+        if version is None:
+            continue
+        if version == _template['version']:
+            return _template['content']
         try:
-            with open(embedded_script_path, 'r', encoding='utf-8') as f:
+            with open(path, 'r', encoding='utf-8') as f:
                 content = f.read()
-                logger.info('使用内嵌模板脚本文件')
-                return content
         except Exception as e:
-            logger.error(f'读取内嵌模板脚本失败: {e}')
-    
+            log_failure(f'读取{name}模板脚本失败: {e}')
+            continue
+        logger.info(f'使用{name}模板脚本文件')
+        _template['version'] = version
+        _template['content'] = content
+        return content
+
     logger.error('无法找到模板脚本文件')
     return None
 
@@ -67,66 +80,147 @@ async def get_script():
     logger.info('脚本模板现已使用本地文件，无需远程更新')
     pass
 
-async def generate_script_response(request):
-    if (request.query.get('key') not in config.read_config('security.key.values') and config.read_config('security.key.enable')):
-        return {'code': 6, 'msg': 'key验证失败', 'data': None}, 403
-    
-    # 使用新的脚本内容获取方法
-    script_template = get_script_content()
-    if script_template is None:
-        return {'code': 4, 'msg': '无法获取源脚本模板', 'data': None}, 400
-    
-    # 准备模板变量
+
+class _RenderedScript:
+    """一个 (host, scheme, key) 组合生成的脚本，gzip 压缩结果在第一次需要时生成"""
+
+    def __init__(self, text, md5, filename):
+        self.body = text.encode('utf-8')
+        self.md5 = md5
+        self.etag = f'"{createMD5(self.body)}"'
+        # 同一内容的 gzip 响应使用不同的强 ETag，避免缓存把两种编码的响应体当作同一份
+        self.gzip_etag = self.etag[:-1] + '-gz"'
+        self.filename = filename
+        self._gzip = None
+
+    @property
+    def gzip_body(self):
+        if self._gzip is None:
+            self._gzip = gzip.compress(self.body, 6)
+        return self._gzip
+
+
+# 替换了配置项的模板: _base[(模板版本, 配置项)] = 脚本
+_base = {}
+# 生成的脚本: _rendered[(模板版本, 配置项, scheme, host, key)] = _RenderedScript
+_rendered = collections.OrderedDict()
+_rendered_max_size = 64
+
+
+def _config_vars():
+    return (
+        config.read_config("common.download_config.name"),
+        config.read_config("common.download_config.intro"),
+        str(config.read_config("common.download_config.version")),
+        config.read_config("common.download_config.author"),
+        str(config.read_config("common.download_config.dev")).lower(),
+        str(config.read_config("common.download_config.update")).lower(),
+        json.dumps(config.read_config('common.download_config.quality') or {}),
+        bool(config.read_config("common.download_config.update")),
+        config.read_config("common.download_config.filename"),
+    )
+
+
+def _render_base(script_template, config_vars):
+    name, intro, version, author, dev, update, quality = config_vars[:7]
     template_vars = {
-        'MUSIC_SOURCE_NAME': config.read_config("common.download_config.name"),
-        'MUSIC_SOURCE_DESCRIPTION': config.read_config("common.download_config.intro"), 
-        'MUSIC_SOURCE_VERSION': str(config.read_config("common.download_config.version")),
-        'MUSIC_SOURCE_AUTHOR': config.read_config("common.download_config.author"),
-        'DEV_ENABLE': str(config.read_config("common.download_config.dev")).lower(),
-        'UPDATE_ENABLE': str(config.read_config("common.download_config.update")).lower(),
-        'API_URL': f"{'https' if config.read_config('common.ssl_info.is_https') else 'http'}://{request.host}",
-        'API_KEY': request.query.get("key") if request.query.get("key") else '',
-        'MUSIC_QUALITY': json.dumps(config.read_config('common.download_config.quality') or {}),
+        'MUSIC_SOURCE_NAME': name,
+        'MUSIC_SOURCE_DESCRIPTION': intro,
+        'MUSIC_SOURCE_VERSION': version,
+        'MUSIC_SOURCE_AUTHOR': author,
+        'DEV_ENABLE': dev,
+        'UPDATE_ENABLE': update,
+        'MUSIC_QUALITY': quality,
         'INFO_PAYLOAD_INJECTION': 'const infoPayload = utils.buffer.bufToString(utils.buffer.from(JSON.stringify(musicInfo)), \'base64\').replace(/\\+/g,\'-\').replace(/\\//g,\'_\').replace(/=+$/, \'\')',
         'URL_QUERY_PARAMS': '?info=${infoPayload}',
         'RETURN_URL_PROCESSING': 'body.data.startsWith(\'http\') ? body.data : `${API_URL}${body.data}`',
-        'SCRIPT_MD5': ''  # 将在后面计算
     }
-    
-    # 使用模板替换
+
+    # 使用模板替换，API_URL 与 API_KEY 在生成每个组合时替换，MD5 值稍后单独处理
     r = script_template
     for key, value in template_vars.items():
-        if key != 'SCRIPT_MD5':  # MD5值稍后单独处理
-            r = r.replace(f'{{{{{key}}}}}', str(value))
-    
+        r = r.replace(f'{{{{{key}}}}}', str(value))
+
     # —— 移除模板中对 `server_` 前缀的强制要求 ——
     # 这些在模板中已经处理，无需再进行正则替换
     r = re.sub(r"if \(!musicInfo\.songmid\.startsWith\('server_'\)\) throw new Error\('[^']*'\);?", "", r)
-    # 去掉对 songmid 的 replace('server_', '') 调用  
+    # 去掉对 songmid 的 replace('server_', '') 调用
     r = re.sub(r"songId\.replace\('server_', ''\)", "songId", r)
-    
+    return r
+
+
+def _get_rendered(host, key):
+    script_template = get_script_content()
+    if script_template is None:
+        return None
+    scheme = 'https' if config.read_config('common.ssl_info.is_https') else 'http'
+    config_vars = _config_vars()
+    cache_key = (_template['version'], config_vars, scheme, host, key)
+    rendered = _rendered.get(cache_key)
+    if rendered is not None:
+        _rendered.move_to_end(cache_key)
+        return rendered
+
+    base_key = (_template['version'], config_vars)
+    base = _base.get(base_key)
+    if base is None:
+        if len(_base) >= 4:
+            _base.clear()
+        base = _base[base_key] = _render_base(script_template, config_vars)
+
+    r = base.replace('{{API_URL}}', f'{scheme}://{host}').replace('{{API_KEY}}', key)
     # 用于检查更新
-    if (config.read_config("common.download_config.update")):
+    md5 = None
+    if config_vars[7]:
         md5 = createMD5(r)
         r = r.replace('{{SCRIPT_MD5}}', md5)
-        if (request.query.get('checkUpdate')):
-            if (request.query.get('checkUpdate') == md5):
-                return {'code': 0, 'msg': 'success', 'data': None}, 200
-            url = f"{'https' if config.read_config('common.ssl_info.is_https') else 'http'}://{request.host}/script"
-            updateUrl = f"{url}{('?key=' + request.query.get('key')) if request.query.get('key') else ''}"
-            updateMsg = config.read_config('common.download_config.updateMsg').format(updateUrl = updateUrl, url = url, key = request.query.get('key')).replace('\\n', '\n')
-            return {'code': 0, 'msg': 'success', 'data': {'updateMsg': updateMsg, 'updateUrl': updateUrl}}, 200
     else:
         # 如果不启用更新检查，清空MD5占位符
         r = r.replace('{{SCRIPT_MD5}}', '')
-    
-    return Response(text = r, content_type = 'text/javascript',
-                    headers = {
-                        'Content-Disposition': f'''attachment; filename={
-                            config.read_config("common.download_config.filename")
-                            if config.read_config("common.download_config.filename").endswith(".js")
-                            else (config.read_config("common.download_config.filename") + ".js")}'''
-                    })
+    filename = config_vars[8]
+    rendered = _RenderedScript(r, md5, filename if filename.endswith('.js') else filename + '.js')
+    _rendered[cache_key] = rendered
+    while len(_rendered) > _rendered_max_size:
+        _rendered.popitem(last=False)
+    return rendered
+
+
+async def generate_script_response(request):
+    if (request.query.get('key') not in config.read_config('security.key.values') and config.read_config('security.key.enable')):
+        return {'code': 6, 'msg': 'key验证失败', 'data': None}, 403
+
+    key = request.query.get("key") if request.query.get("key") else ''
+    rendered = _get_rendered(request.host, key)
+    if rendered is None:
+        return {'code': 4, 'msg': '无法获取源脚本模板', 'data': None}, 400
+
+    if (rendered.md5 is not None and request.query.get('checkUpdate')):
+        if (request.query.get('checkUpdate') == rendered.md5):
+            return {'code': 0, 'msg': 'success', 'data': None}, 200
+        url = f"{'https' if config.read_config('common.ssl_info.is_https') else 'http'}://{request.host}/script"
+        updateUrl = f"{url}{('?key=' + request.query.get('key')) if request.query.get('key') else ''}"
+        updateMsg = config.read_config('common.download_config.updateMsg').format(updateUrl = updateUrl, url = url, key = request.query.get('key')).replace('\\n', '\n')
+        return {'code': 0, 'msg': 'success', 'data': {'updateMsg': updateMsg, 'updateUrl': updateUrl}}, 200
+
+    request_headers = getattr(request, 'headers', None) or {}
+    use_gzip = 'gzip' in compression.parse_accept_encoding(request_headers.get('Accept-Encoding'))
+    headers = {
+        'ETag': rendered.gzip_etag if use_gzip else rendered.etag,
+        'Vary': 'Accept-Encoding',
+    }
+    # If-None-Match 使用弱比较：忽略 W/ 前缀（反代压缩时可能改为弱 ETag），两种编码的 ETag 都视为同一内容
+    if_none_match = request_headers.get('If-None-Match')
+    if if_none_match:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        if '*' in tags or rendered.etag in tags or rendered.gzip_etag in tags:
+            return Response(status = 304, headers = headers)
+
+    headers['Content-Disposition'] = f'attachment; filename={rendered.filename}'
+    body = rendered.body
+    if use_gzip:
+        body = rendered.gzip_body
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body = body, content_type = 'text/javascript', charset = 'utf-8', headers = headers)
 
 # 脚本模板现已使用本地文件，无需远程更新任务
 # if (config.read_config('common.allow_download_script')):
@@ -8,8 +8,10 @@
 # This file is part of the "lx-music-api-server" project.
 
 from . import utils
+from . import config
 import ujson as json
 import binascii
+import hmac
 import re
 
 def checklxmheader(lxm, url):
@@ -32,3 +34,18 @@ def checklxmheader(lxm, url):
         return True
     except:
         return False
+
+def _is_local(ip):
+    return bool(ip) and (ip in ('127.0.0.1', '::1') or utils.is_local_ip(ip))
+
+def check_admin(request):
+    # 管理接口（/admin/...）验证：配置了 security.admin.key 时比对 X-Admin-Key 请求头，未配置时仅允许内网/本机访问
+    if (not config.read_config('security.admin.enable')):
+        return False
+    key = config.read_config('security.admin.key')
+    if (key):
+        return hmac.compare_digest(request.headers.get('X-Admin-Key', ''), str(key))
+    # 以实际连接的地址为准，反代请求头可以由客户端伪造；
+    # 经过本机/内网反代时连接地址总是内网地址，因此还需要反代转发的真实IP同样是内网地址
+    remote_addr = getattr(request, 'remote_addr', None)
+    return _is_local(request.remote) and (remote_addr is None or _is_local(remote_addr))
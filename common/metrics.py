@@ -0,0 +1,83 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: metrics.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 一个简单的进程内指标收集器，数据通过 /admin/metrics 接口以 JSON 输出
+
+import time
+import collections
+import traceback
+from . import log
+from . import lxsecurity
+
+logger = log.log('metrics')
+
+_start_time = time.time()
+# 计数器: _counters[name][labels] = value
+_counters = collections.defaultdict(lambda: collections.defaultdict(int))
+# 统计摘要: _summaries[name][labels] = [count, sum, max]
+_summaries = collections.defaultdict(dict)
+# 采集函数: 在输出时调用，返回任意可序列化的数据
+_collectors = {}
+
+
+def _labels_key(labels: dict) -> str:
+    if not labels:
+        return ''
+    return ','.join(f'{k}={v}' for k, v in sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """计数器自增"""
+    _counters[name][_labels_key(labels)] += value
+
+
+def observe(name, value, **labels):
+    """记录一次观测值（如耗时），输出 count/sum/avg/max"""
+    key = _labels_key(labels)
+    s = _summaries[name].get(key)
+    if s is None:
+        _summaries[name][key] = [1, value, value]
+    else:
+        s[0] += 1
+        s[1] += value
+        if value > s[2]:
+            s[2] = value
+
+
+def register_collector(name, func):
+    """注册一个在输出指标时调用的采集函数，用于导出模块内部状态"""
+    _collectors[name] = func
+
+
+def snapshot() -> dict:
+    collectors = {}
+    for name, func in list(_collectors.items()):
+        try:
+            collectors[name] = func()
+        except Exception:
+            logger.debug(f'指标采集函数 {name} 执行失败\n' + traceback.format_exc())
+            collectors[name] = None
+    return {
+        'uptime': int(time.time() - _start_time),
+        'counters': {name: dict(values) for name, values in _counters.items()},
+        'summaries': {
+            name: {
+                key: {'count': s[0], 'sum': round(s[1], 3), 'avg': round(s[1] / s[0], 3), 'max': round(s[2], 3)}
+                for key, s in values.items()
+            }
+            for name, values in _summaries.items()
+        },
+        'collectors': collectors,
+    }
+
+
+async def handle_request(request):
+    if not lxsecurity.check_admin(request):
+        return {'code': 1, 'msg': '管理接口验证失败', 'data': None}, 403
+    return {'code': 0, 'msg': 'success', 'data': snapshot()}
@@ -0,0 +1,73 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: negative_cache.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 失败结果的短期缓存：上游与 external script 都获取失败的歌曲，在短时间内直接返回失败，
+# 避免同一首歌被所有客户端反复请求上游。不同失败原因使用不同的缓存时间。
+
+import time
+import collections
+from . import log
+from . import config
+from . import metrics
+
+logger = log.log('negative_cache')
+
+# _entries[(source, songId, quality)] = (reason, expire_at, msg)
+_entries = collections.OrderedDict()
+
+
+def _ttl(reason):
+    ttl_config = config.read_config('common.negative_cache.ttl') or {}
+    ttl = ttl_config.get(reason)
+    if ttl is None:
+        ttl = ttl_config.get('failed', 0)
+    return int(ttl or 0)
+
+
+def get(source, song_id, quality):
+    """返回 (reason, msg)，没有有效的失败记录时返回 None"""
+    if not config.read_config('common.negative_cache.enable'):
+        return None
+    key = (source, song_id, quality)
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+    reason, expire_at, msg = entry
+    if time.time() >= expire_at:
+        _entries.pop(key, None)
+        return None
+    metrics.inc('negative_cache_hits_total', source=source, reason=reason)
+    return reason, msg
+
+
+def put(source, song_id, quality, reason, msg):
+    if not config.read_config('common.negative_cache.enable'):
+        return
+    ttl = _ttl(reason)
+    if ttl <= 0:
+        return
+    key = (source, song_id, quality)
+    _entries[key] = (reason, time.time() + ttl, msg)
+    _entries.move_to_end(key)
+    max_size = int(config.read_config('common.negative_cache.max_size') or 10000)
+    while len(_entries) > max_size:
+        _entries.popitem(last=False)
+    metrics.inc('negative_cache_stores_total', source=source, reason=reason)
+    logger.debug(f'失败结果已缓存: {source}_{song_id}_{quality}, reason: {reason}, ttl: {ttl}')
+
+
+def invalidate(source, song_id, quality=None):
+    if quality is not None:
+        _entries.pop((source, song_id, quality), None)
+        return
+    for key in [k for k in _entries if k[0] == source and k[1] == song_id]:
+        _entries.pop(key, None)
+
+
+metrics.register_collector('negative_cache', lambda: {'size': len(_entries)})
@@ -0,0 +1,157 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: peer_cache.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 节点间共享音频缓存（不依赖 redis）
+# 各节点在 common.peer_cache.peers 中配置其他节点的地址，并使用相同的 key 验证
+#   GET /peer/has?filename=xxx 或 /peer/has?source=kw&id=xxx&quality=320k  查询对方是否缓存了音频
+#   GET /peer/cache/{filename}  下载对方缓存的音频
+# 本地与 WebDAV 均未命中时，同时向所有节点查询，最多等待 hedge_timeout 秒，有节点持有时从该节点获取，否则请求上游
+# 所有节点都没有的文件名在 miss_ttl 秒内不再查询，未经验证的 /cache 请求不能借此让本节点反复查询所有节点
+
+import hmac
+import asyncio
+import collections
+import aiohttp
+from . import log
+from . import config
+from . import metrics
+from . import variable
+
+logger = log.log('peer_cache')
+
+KEY_HEADER = 'X-Peer-Key'
+
+# 最近查询到的文件位置: _locations[filename] = peer
+_locations = collections.OrderedDict()
+_max_locations = 10000
+
+# 最近所有节点都没有的文件名: _misses[filename] = 过期时间
+_misses = collections.OrderedDict()
+
+
+def enabled():
+    return bool(config.read_config('common.peer_cache.enable')
+                and config.read_config('common.peer_cache.key')
+                and config.read_config('common.peer_cache.peers'))
+
+
+def check_key(request):
+    key = config.read_config('common.peer_cache.key')
+    if not (config.read_config('common.peer_cache.enable') and key):
+        return False
+    return hmac.compare_digest(request.headers.get(KEY_HEADER, ''), str(key))
+
+
+def _headers():
+    return {KEY_HEADER: str(config.read_config('common.peer_cache.key'))}
+
+
+def _session():
+    return variable.aioSession or aiohttp.ClientSession(trust_env=True)
+
+
+def remember(filename, peer):
+    _locations[filename] = peer
+    _locations.move_to_end(filename)
+    while len(_locations) > _max_locations:
+        _locations.popitem(last=False)
+
+
+def location(filename):
+    return _locations.get(filename)
+
+
+def _recent_miss(filename, now):
+    expire_at = _misses.get(filename)
+    if expire_at is None:
+        return False
+    if expire_at > now:
+        return True
+    del _misses[filename]
+    return False
+
+
+def _remember_miss(filename, now):
+    ttl = config.read_config('common.peer_cache.miss_ttl')
+    ttl = float(30 if ttl is None else ttl)
+    if ttl <= 0:
+        return
+    _misses[filename] = now + ttl
+    _misses.move_to_end(filename)
+    while len(_misses) > _max_locations:
+        _misses.popitem(last=False)
+
+
+async def _ask(session, peer, params):
+    async with session.get(f'{peer}/peer/has', params=params, headers=_headers()) as resp:
+        if resp.status != 200:
+            return None
+        body = await resp.json(content_type=None)
+    data = body.get('data') if isinstance(body, dict) else None
+    if data and data.get('filename'):
+        return peer, data['filename']
+    return None
+
+
+async def find(**params):
+    """
+    同时向所有节点查询，返回第一个持有文件的 (节点地址, 文件名)
+    最多等待 hedge_timeout 秒，超时或都没有时返回 None
+    """
+    if not enabled():
+        return None
+    loop = asyncio.get_running_loop()
+    filename = params.get('filename')
+    if filename and _recent_miss(filename, loop.time()):
+        metrics.inc('peer_cache_lookup_total', result='negative')
+        return None
+    peers = [p.rstrip('/') for p in config.read_config('common.peer_cache.peers')]
+    timeout = float(config.read_config('common.peer_cache.hedge_timeout') or 0.3)
+    session = _session()
+    owns_session = session is not variable.aioSession
+    deadline = loop.time() + timeout
+    pending = {asyncio.ensure_future(_ask(session, peer, params)) for peer in peers}
+    tasks = list(pending)
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    logger.debug('查询节点缓存失败: %s', task.exception())
+                    continue
+                result = task.result()
+                if result:
+                    metrics.inc('peer_cache_lookup_total', result='hit')
+                    remember(result[1], result[0])
+                    return result
+        metrics.inc('peer_cache_lookup_total', result='timeout' if pending else 'miss')
+        # 按文件名查询（/cache 请求）时记录未命中，同一文件名的后续请求在 miss_ttl 内直接返回
+        if filename:
+            _remember_miss(filename, loop.time())
+    finally:
+        for task in tasks:
+            task.cancel()
+        if owns_session:
+            await session.close()
+    return None
+
+
+def file_url(peer, filename):
+    return f'{peer}/peer/cache/{filename}'
+
+
+def request_options():
+    """从其他节点下载文件时使用的请求参数"""
+    return {
+        'headers': _headers(),
+        'timeout': aiohttp.ClientTimeout(total=float(config.read_config('common.peer_cache.timeout') or 60)),
+    }
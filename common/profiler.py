@@ -0,0 +1,233 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: profiler.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 运行时性能分析
+# - 按需采样：管理接口 GET /admin/profile?seconds=10 在后台线程中定时读取线程调用栈（sys._current_frames），
+#   结束后以折叠格式（每行 "调用栈 次数"，可直接用 flamegraph.pl / speedscope 生成火焰图）返回；
+#   事件循环空闲时的调用栈停在 select 上，因此等待上游的时间与 SQLite、mutagen、歌词解析等占用 CPU 的时间可以区分开
+# - 慢请求：处理时间超过阈值的请求，在超时时刻记录其协程的 await 链，即请求当时卡在哪里
+# - 事件循环阻塞：监控协程定期更新心跳，看门狗线程发现心跳超过阈值未更新时记录事件循环线程当时的调用栈，
+#   即正在阻塞事件循环的回调
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+import collections
+from . import log
+from . import config
+from . import metrics
+from . import lxsecurity
+from aiohttp.web import Response
+
+logger = log.log('profiler')
+
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_labels = {}
+_profiling = threading.Lock()
+_loop_thread = None
+_heartbeat = 0.0
+# 慢请求与事件循环阻塞记录，看门狗线程也会写入
+_records_lock = threading.Lock()
+_slow_requests = collections.deque()
+_loop_stalls = collections.deque()
+
+
+def _settings():
+    return config.read_config('common.profiler') or {}
+
+
+def _keep(records, record):
+    keep = max(1, int(_settings().get('keep', 20)))
+    with _records_lock:
+        records.append(record)
+        while len(records) > keep:
+            records.popleft()
+
+
+def _short_path(filename):
+    """项目内的文件使用相对路径，第三方库与标准库去掉安装目录"""
+    if filename.startswith(_project_root + os.sep):
+        return os.path.relpath(filename, _project_root)
+    parts = filename.split(os.sep)
+    for i in range(len(parts) - 1, -1, -1):
+        if parts[i] == 'site-packages' or parts[i].startswith('python3'):
+            return '/'.join(parts[i + 1:])
+    return parts[-1]
+
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'.replace(';', ',')
+    return label
+
+
+def collapse(frame):
+    """将调用栈转换为折叠格式中的一行（从外到内，以 ; 分隔）"""
+    names = []
+    while frame is not None:
+        names.append(_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def sample(seconds, interval=0.005, thread_ids=None):
+    """
+    在当前线程中采样 seconds 秒，返回 {折叠调用栈: 次数}
+    thread_ids 为 None 时采样除当前线程外的所有线程，并以线程名作为调用栈的根
+    """
+    counts = collections.Counter()
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (thread_ids is not None and ident not in thread_ids):
+                continue
+            stack = collapse(frame)
+            if thread_ids is None:
+                stack = f'{names.get(ident, ident)};{stack}'
+            counts[stack] += 1
+        time.sleep(interval)
+    return counts
+
+
+def format_collapsed(counts):
+    return ''.join(f'{stack} {count}\n' for stack, count in counts.most_common())
+
+
+async def handle_profile(request):
+    '''GET /admin/profile?seconds=10&interval=0.005&threads=all'''
+    if not lxsecurity.check_admin(request):
+        return {'code': 1, 'msg': '管理接口验证失败', 'data': None}, 403
+    settings = _settings()
+    try:
+        seconds = min(float(request.query.get('seconds', 10)), float(settings.get('max_seconds', 60)))
+        interval = max(float(request.query.get('interval', settings.get('interval', 0.005))), 0.001)
+    except ValueError:
+        return {'code': 6, 'msg': '参数错误', 'data': None}, 400
+    if not _profiling.acquire(blocking=False):
+        return {'code': 6, 'msg': '已有正在进行的采样', 'data': None}, 409
+    try:
+        threads = None if request.query.get('threads') == 'all' else {threading.get_ident()}
+        logger.info(f'开始采样 {seconds} 秒，间隔 {interval} 秒')
+        counts = await asyncio.get_running_loop().run_in_executor(None, sample, seconds, interval, threads)
+    finally:
+        _profiling.release()
+    return Response(text=format_collapsed(counts), content_type='text/plain')
+
+
+def await_chain(coro):
+    """返回挂起的协程从外到内的 await 链 [(frame, 行号), ...] 与最内层等待的对象"""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            break
+        frames.append((frame, frame.f_lineno))
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return frames, coro
+
+
+def _record_slow(request, task, started, threshold):
+    if task.done():
+        return
+    frames, awaiting = await_chain(task.get_coro())
+    stack = ''.join(traceback.StackSummary.extract(frames).format())
+    if asyncio.isfuture(awaiting):
+        stack += f'  awaiting {awaiting!r}\n'
+    _keep(_slow_requests, {
+        'time': int(time.time()),
+        'method': request.method,
+        'path': request.path,
+        'elapsed': round(time.monotonic() - started, 3),
+        'stack': stack,
+    })
+    metrics.inc('slow_requests_total')
+    logger.warning(f'请求 {request.method} {request.path} 已处理超过 {threshold} 秒，当前调用栈:\n{stack}')
+
+
+async def handle_slow_requests(app, handler):
+    async def handle_request(request):
+        settings = _settings().get('slow_request') or {}
+        if not settings.get('enable') or request.path.startswith(tuple(settings.get('exclude') or ())):
+            return await handler(request)
+        threshold = float(settings.get('threshold', 5))
+        loop = asyncio.get_running_loop()
+        timer = loop.call_later(threshold, _record_slow, request, asyncio.current_task(), time.monotonic(), threshold)
+        try:
+            return await handler(request)
+        finally:
+            timer.cancel()
+    return handle_request
+
+
+async def _lag_monitor(interval, threshold):
+    global _heartbeat
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        _heartbeat = time.monotonic()
+        await asyncio.sleep(interval)
+        lag = loop.time() - start - interval
+        metrics.observe('event_loop_lag_seconds', max(lag, 0))
+        if lag * 1000 > threshold:
+            metrics.inc('event_loop_blocked_total')
+
+
+def _watchdog(interval, threshold):
+    reported = 0.0
+    while True:
+        time.sleep(interval)
+        heartbeat = _heartbeat
+        blocked = (time.monotonic() - heartbeat - interval) * 1000
+        if blocked <= threshold or heartbeat == reported:
+            continue
+        # 同一次阻塞只记录一次
+        reported = heartbeat
+        frame = sys._current_frames().get(_loop_thread)
+        if frame is None:
+            continue
+        stack = ''.join(traceback.format_stack(frame))
+        _keep(_loop_stalls, {'time': int(time.time()), 'blocked_ms': int(blocked), 'stack': stack})
+        logger.warning(f'事件循环已阻塞超过 {int(blocked)} 毫秒，事件循环线程当前调用栈:\n{stack}')
+
+
+def start_loop_monitor():
+    """在事件循环中启动阻塞监控，需要在事件循环线程中调用"""
+    global _loop_thread, _heartbeat
+    settings = _settings().get('loop_lag') or {}
+    if not settings.get('enable') or _loop_thread is not None:
+        return
+    interval = float(settings.get('interval', 0.1))
+    threshold = float(settings.get('threshold', 200))
+    _loop_thread = threading.get_ident()
+    _heartbeat = time.monotonic()
+    asyncio.create_task(_lag_monitor(interval, threshold))
+    threading.Thread(target=_watchdog, args=(interval, threshold), name='loop-watchdog', daemon=True).start()
+
+
+async def handle_slow(request):
+    '''GET /admin/profile/slow 最近的慢请求与事件循环阻塞记录'''
+    if not lxsecurity.check_admin(request):
+        return {'code': 1, 'msg': '管理接口验证失败', 'data': None}, 403
+    with _records_lock:
+        data = {'slow_requests': list(_slow_requests), 'loop_stalls': list(_loop_stalls)}
+    return {'code': 0, 'msg': 'success', 'data': data}
+
+
+metrics.register_collector('profiler', lambda: {
+    'profiling': _profiling.locked(),
+    'loop_monitor': _loop_thread is not None,
+    'slow_requests': len(_slow_requests),
+    'loop_stalls': len(_loop_stalls),
+})
@@ -0,0 +1,222 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: rate_limit.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 令牌桶限速：每个桶以 rate 个/秒的速度补充令牌，最多积攒 burst 个，每个请求消耗一个令牌
+# 桶按 全局 / IP / 请求key / (IP, 平台) 划分，rate 为 0 的桶不启用
+# memory 后端为每个进程独立的有界 LRU，多进程模式下每个 worker 按 rate / worker 数量限速；
+# redis 后端在所有 worker 之间共享令牌，redis 不可用时临时使用内存后端
+
+import math
+import time
+import collections
+import redis.asyncio as aioredis
+from . import log
+from . import config
+from . import metrics
+from . import workers
+
+logger = log.log('rate_limit')
+
+# (名称, 旧配置项)：旧配置为两次请求的最小间隔（秒），新配置未设置时按 rate = 1 / 间隔, burst = 1 换算
+BUCKETS = (
+    ('global', 'global'),
+    ('ip', 'ip'),
+    ('key', None),
+    ('ip_source', None),
+)
+
+
+class MemoryBackend:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        # _buckets[key] = [tokens, last_refill]
+        self._buckets = collections.OrderedDict()
+
+    async def acquire(self, key, rate, burst):
+        """消耗一个令牌，返回 (是否允许, 需要等待的秒数)"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True, 0
+        return False, (1 - bucket[0]) / rate
+
+    async def refund(self, key, rate, burst):
+        """归还一个令牌（请求被后面的桶拒绝时）"""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(burst, bucket[0] + 1)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+_REDIS_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+_REDIS_REFUND_SCRIPT = """
+local burst = tonumber(ARGV[1])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens then
+  redis.call('HSET', KEYS[1], 'tokens', tostring(math.min(burst, tokens + 1)))
+end
+"""
+
+
+class RedisBackend:
+    def __init__(self):
+        client = aioredis.Redis(
+            host=config.read_config('common.cache.redis.host'),
+            port=config.read_config('common.cache.redis.port'),
+            username=config.read_config('common.cache.redis.user') or None,
+            password=config.read_config('common.cache.redis.password') or None,
+            db=config.read_config('common.cache.redis.db'),
+        )
+        self._script = client.register_script(_REDIS_SCRIPT)
+        self._refund_script = client.register_script(_REDIS_REFUND_SCRIPT)
+        self._prefix = f"{config.read_config('common.cache.redis.key_prefix')}:ratelimit:"
+
+    async def acquire(self, key, rate, burst):
+        allowed, tokens = await self._script(keys=[self._prefix + key], args=[rate, burst, time.time()])
+        if int(allowed):
+            return True, 0
+        return False, (1 - float(tokens)) / rate
+
+    async def refund(self, key, rate, burst):
+        await self._refund_script(keys=[self._prefix + key], args=[burst])
+
+    def __len__(self):
+        return 0
+
+
+_backend = None
+# redis 后端出错时临时使用的内存后端
+_fallback = None
+_fallback_warned_at = 0
+
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        if config.read_config('security.rate_limit.backend') == 'redis':
+            try:
+                _backend = RedisBackend()
+                logger.info('限速使用 redis 后端')
+            except Exception as e:
+                logger.warning(f'连接 redis 失败，限速回退到内存后端: {e}')
+        if _backend is None:
+            _backend = MemoryBackend(int(config.read_config('security.rate_limit.max_keys') or 100000))
+    return _backend
+
+
+def _get_fallback(error):
+    global _fallback, _fallback_warned_at
+    if _fallback is None:
+        _fallback = MemoryBackend(int(config.read_config('security.rate_limit.max_keys') or 100000))
+    # redis 持续不可用时每分钟最多提示一次
+    if time.monotonic() - _fallback_warned_at > 60:
+        _fallback_warned_at = time.monotonic()
+        logger.warning(f'限速访问 redis 失败，暂时使用内存后端: {error}')
+    metrics.inc('rate_limit_fallback_total')
+    return _fallback
+
+
+def _bucket_config(name, legacy_key, backend):
+    bucket = (config.read_config(f'security.rate_limit.buckets.{name}') or {})
+    rate = float(bucket.get('rate') or 0)
+    burst = float(bucket.get('burst') or 0)
+    if rate <= 0 and legacy_key:
+        interval = config.read_config('security.rate_limit')[legacy_key]
+        if interval and float(interval) > 0:
+            rate, burst = 1 / float(interval), 1
+    if rate <= 0:
+        return None
+    if isinstance(backend, MemoryBackend) and workers.is_multi_process():
+        # 连接由内核在各 worker 之间大致均匀分配，按比例分摊速率
+        rate = rate / workers.worker_count()
+    return rate, max(1, burst or math.ceil(rate))
+
+
+async def _check(backend, keys):
+    charged = []
+    for name, legacy_key in BUCKETS:
+        key = keys[name]
+        if key is None:
+            continue
+        bucket = _bucket_config(name, legacy_key, backend)
+        if bucket is None:
+            continue
+        allowed, retry_after = await backend.acquire(key, *bucket)
+        if not allowed:
+            for charged_key, charged_bucket in charged:
+                await backend.refund(charged_key, *charged_bucket)
+            metrics.inc('rate_limit_rejected_total', bucket=name)
+            return name, retry_after
+        charged.append((key, bucket))
+    return None
+
+
+async def check(remote_addr, api_key=None, source=None):
+    """
+    依次检查各个桶，返回 None 表示放行，否则返回 (被拒绝的桶名称, 建议等待的秒数)
+    被某个桶拒绝时归还前面的桶已消耗的令牌，已超出自身限额的客户端不会继续消耗全局令牌
+    """
+    keys = {
+        'global': 'global',
+        'ip': f'ip:{remote_addr}',
+        'key': f'key:{api_key}' if api_key else None,
+        'ip_source': f'ip_source:{remote_addr}:{source}' if source else None,
+    }
+    backend = _get_backend()
+    if isinstance(backend, MemoryBackend):
+        return await _check(backend, keys)
+    try:
+        return await _check(backend, keys)
+    except Exception as e:
+        return await _check(_get_fallback(e), keys)
+
+
+@config.subscribe
+def _reload_config():
+    # 后端或容量变化时重新创建（已有的令牌状态会被丢弃）
+    global _backend
+    backend = config.read_config('security.rate_limit.backend')
+    if isinstance(_backend, RedisBackend) != (backend == 'redis'):
+        _backend = None
+    elif isinstance(_backend, MemoryBackend):
+        _backend.max_keys = int(config.read_config('security.rate_limit.max_keys') or 100000)
+
+
+metrics.register_collector('rate_limit', lambda: {
+    'backend': 'redis' if isinstance(_backend, RedisBackend) else 'memory',
+    'tracked_keys': len(_backend) if _backend is not None else 0,
+})
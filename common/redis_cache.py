@@ -0,0 +1,327 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: redis_cache.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# redis 缓存适配器的异步实现，供 config.getCacheAsync / updateCacheAsync / getCacheMany 使用
+# 1. 使用 redis.asyncio 的连接池，不再在事件循环中进行阻塞的网络请求
+# 2. 同一个事件循环周期内发起的 get / set 会合并到一个 pipeline 中发送，减少往返次数
+# 3. 可选的客户端缓存：通过 CLIENT TRACKING 的 BCAST 模式订阅热点模块的失效通知，
+#    命中时直接使用本地副本，其他进程修改或键过期时由 redis 通知删除本地副本
+
+import copy
+import time
+import asyncio
+import collections
+import traceback
+import redis.asyncio as aioredis
+from . import log
+from . import config
+from . import metrics
+
+logger = log.log('redis_cache')
+
+INVALIDATE_CHANNEL = '__redis__:invalidate'
+
+
+class TrackedCache:
+    """服务端辅助的客户端缓存，只保存配置中的热点模块"""
+
+    def __init__(self, pool, prefixes, max_size=10000, ttl=300):
+        self.pool = pool
+        self.prefixes = tuple(prefixes)
+        self.max_size = max_size
+        self.ttl = ttl
+        # _data[key] = (value, 写入时间)
+        self._data = collections.OrderedDict()
+        self.active = False
+        # 每收到一次失效通知加一，读取期间收到过通知的结果不写入本地，避免保存过期的副本
+        self.generation = 0
+        self._task = None
+        self._connections = []
+
+    def tracks(self, key):
+        return self.active and key.startswith(self.prefixes)
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if time.monotonic() - item[1] > self.ttl:
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value, generation):
+        if not self.tracks(key) or value is None or generation != self.generation:
+            return
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, keys):
+        self.generation += 1
+        if keys is None:
+            # FLUSHDB / FLUSHALL 或连接断开
+            self._data.clear()
+            return
+        for key in keys:
+            self._data.pop(key.decode('utf-8', 'ignore') if isinstance(key, bytes) else key, None)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def _make_connection(self):
+        # 使用 RESP2：失效通知以普通的频道消息转发到订阅连接，不依赖客户端库对 RESP3 推送消息的处理
+        return self.pool.connection_class(**dict(self.pool.connection_kwargs, protocol=2))
+
+    async def _connect(self):
+        # 失效通知连接：先获取连接 id，再订阅失效通知频道
+        listener = self._make_connection()
+        await listener.connect()
+        await listener.send_command('CLIENT', 'ID')
+        listener_id = await listener.read_response()
+        await listener.send_command('SUBSCRIBE', INVALIDATE_CHANNEL)
+        await listener.read_response()
+        # 开启追踪的连接需要一直保持打开，BCAST 模式下追踪与读取键的连接无关
+        tracker = self._make_connection()
+        await tracker.connect()
+        args = ['CLIENT', 'TRACKING', 'ON', 'REDIRECT', listener_id, 'BCAST']
+        for prefix in self.prefixes:
+            args += ['PREFIX', prefix]
+        await tracker.send_command(*args)
+        await tracker.read_response()
+        self._connections = [listener, tracker]
+        return listener
+
+    async def _run(self):
+        retry = 1
+        while True:
+            try:
+                listener = await self._connect()
+                self.active = True
+                retry = 1
+                logger.info('redis 客户端缓存已启用')
+                while True:
+                    message = await listener.read_response(timeout=None)
+                    if isinstance(message, list) and len(message) == 3 and message[0] in (b'message', 'message'):
+                        self.invalidate(message[2])
+                        metrics.inc('redis_client_cache_invalidations_total')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.active:
+                    logger.warning(f'redis 客户端缓存失效通知连接断开，{retry}s 后重试: {e}')
+                else:
+                    logger.debug(f'启用 redis 客户端缓存失败，{retry}s 后重试\n' + traceback.format_exc())
+            finally:
+                # 断开期间无法收到失效通知，丢弃所有本地副本
+                self.active = False
+                self._data.clear()
+                await self._close_connections()
+            await asyncio.sleep(retry)
+            retry = min(retry * 2, 60)
+
+    async def _close_connections(self):
+        for conn in self._connections:
+            try:
+                await conn.disconnect()
+            except Exception:
+                pass
+        self._connections = []
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self._close_connections()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _settings():
+    """影响适配器的配置，变化时才需要重新创建"""
+    return copy.deepcopy((config.read_config('common.cache.adapter'), config.read_config('common.cache.redis')))
+
+
+class AsyncRedisCache:
+    def __init__(self):
+        self.settings = _settings()
+        self.prefix = config.read_config('common.cache.redis.key_prefix')
+        self.pool = aioredis.BlockingConnectionPool(
+            host=config.read_config('common.cache.redis.host'),
+            port=config.read_config('common.cache.redis.port'),
+            username=config.read_config('common.cache.redis.user') or None,
+            password=config.read_config('common.cache.redis.password') or None,
+            db=config.read_config('common.cache.redis.db'),
+            max_connections=int(config.read_config('common.cache.redis.max_connections') or 32),
+        )
+        self.client = aioredis.Redis(connection_pool=self.pool)
+        self.pipeline_max_size = int(config.read_config('common.cache.redis.pipeline_max_size') or 64)
+        self._pending = []
+        self._flush_handle = None
+        # 已发出但还没有返回的 pipeline 数量，关闭前等待它们完成
+        self._inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.local = None
+        client_cache = config.read_config('common.cache.redis.client_cache') or {}
+        if client_cache.get('enable'):
+            self.local = TrackedCache(
+                self.pool,
+                [f'{self.prefix}:{module}:' for module in (client_cache.get('modules') or [])],
+                int(client_cache.get('max_size') or 10000),
+                float(client_cache.get('ttl') or 300),
+            )
+            self.local.start()
+
+    def build_key(self, module, key):
+        return f'{self.prefix}:{module}:{key}'
+
+    def _flush(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch = self._pending[:]
+        self._pending.clear()
+        if batch:
+            self._inflight += 1
+            self._idle.clear()
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch):
+        try:
+            await self._send_batch(batch)
+        finally:
+            self._inflight -= 1
+            if self._inflight == 0:
+                self._idle.set()
+
+    async def _send_batch(self, batch):
+        metrics.observe('redis_pipeline_size', len(batch))
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for command, args, _ in batch:
+                pipe.execute_command(command, *args)
+            results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _execute(self, command, *args):
+        """加入当前事件循环周期的 pipeline，返回结果的 future"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((command, args, future))
+        if len(self._pending) >= self.pipeline_max_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_soon(self._flush)
+        return future
+
+    async def get(self, module, key):
+        full_key = self.build_key(module, key)
+        if self.local is not None and self.local.tracks(full_key):
+            value = self.local.get(full_key)
+            if value is not None:
+                metrics.inc('redis_client_cache_total', result='hit')
+                return value
+            metrics.inc('redis_client_cache_total', result='miss')
+        generation = self.local.generation if self.local is not None else 0
+        value = await self._execute('GET', full_key)
+        if self.local is not None:
+            self.local.put(full_key, value, generation)
+        return value
+
+    async def get_many(self, items):
+        """items 为 [(module, key), ...]，使用一次 MGET 获取，返回与 items 顺序一致的列表"""
+        keys = [self.build_key(module, key) for module, key in items]
+        values = [None] * len(keys)
+        missing = []
+        for i, full_key in enumerate(keys):
+            if self.local is not None and self.local.tracks(full_key):
+                values[i] = self.local.get(full_key)
+            if values[i] is None:
+                missing.append(i)
+        if missing:
+            generation = self.local.generation if self.local is not None else 0
+            result = await self._execute('MGET', *[keys[i] for i in missing])
+            for i, value in zip(missing, result):
+                values[i] = value
+                if self.local is not None:
+                    self.local.put(keys[i], value, generation)
+        return values
+
+    async def set(self, module, key, value, expire=None):
+        full_key = self.build_key(module, key)
+        if self.local is not None:
+            self.local.invalidate([full_key])
+        if expire and expire > 0:
+            await self._execute('SET', full_key, value, 'EX', int(expire))
+        else:
+            await self._execute('SET', full_key, value)
+
+    async def close(self, timeout=10):
+        # 发出尚未发送的命令，并等待进行中的 pipeline 完成后再关闭连接
+        self._flush()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning('等待进行中的 redis 请求超时，强制关闭连接')
+        if self.local is not None:
+            await self.local.close()
+        await self.client.aclose()
+        await self.pool.disconnect()
+
+
+_adapter = None
+_adapter_loop = None
+
+
+def get_adapter():
+    """返回当前事件循环的异步适配器，连接池与事件循环绑定，循环变化时重新创建"""
+    global _adapter, _adapter_loop
+    loop = asyncio.get_running_loop()
+    if _adapter is None or _adapter_loop is not loop:
+        _adapter = AsyncRedisCache()
+        _adapter_loop = loop
+    return _adapter
+
+
+@config.subscribe
+def _reload_config():
+    # 连接配置变化时下次使用时重新创建，旧的适配器在进行中的请求完成后关闭
+    global _adapter, _adapter_loop
+    if _adapter is not None and _adapter.settings != _settings():
+        old = _adapter
+        _adapter = None
+        _adapter_loop = None
+        try:
+            asyncio.get_running_loop().create_task(old.close())
+        except RuntimeError:
+            pass
+
+
+metrics.register_collector('redis_cache', lambda: None if _adapter is None else {
+    'pool_in_use': len(getattr(_adapter.pool, '_in_use_connections', ())),
+    'client_cache': None if _adapter.local is None else {
+        'active': _adapter.local.active,
+        'keys': len(_adapter.local),
+    },
+})
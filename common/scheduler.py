@@ -8,61 +8,219 @@
 # This file is part of the "lx-music-api-server" project.
 
 # 一个简单的循环任务调度器
+# 任务按下次执行时间放入最小堆，调度协程只睡眠到最近的一个截止时间（或有新任务加入）为止，
+# 到期的任务各自在独立的协程中执行，互不阻塞；同一任务执行完成后才会安排下一次执行，不会重叠。
+# 每个任务有超时时间，执行时间加入随机抖动，同时执行的任务数量受 common.scheduler.max_concurrency 限制。
+# 0 号 worker 执行的任务的最近执行时间保存在数据库中，重启后按原来的周期继续，而不是全部立即执行一遍
 
 import time
+import heapq
+import random
 import asyncio
+import itertools
 import traceback
 from .utils import timestamp_format
 from . import log
+from . import config
+from . import metrics
+from . import workers
+from . import lxsecurity
 
 logger = log.log("scheduler")
 running_event = asyncio.Event()
 global tasks
 tasks = []
 
+# 最近执行时间在数据库中的键
+PERSIST_KEY = 'schedulerLastRun'
+# 调度协程单次睡眠的上限（秒），系统时间被调整时最多在此时间后按新时间重新计算
+MAX_SLEEP = 60
+
+_heap = []
+_seq = itertools.count()
+_wakeup = asyncio.Event()
+_running = set()
+_semaphore = None
+_started = False
+
+
 class taskWrapper:
-    def __init__(self, name, function, interval = 86400, args = {}, latest_execute = 0):
+    def __init__(self, name, function, interval = 86400, args = {}, latest_execute = 0, every_worker = False, timeout = None):
         self.function = function
+        # 多进程模式下默认只在 0 号 worker 中执行，every_worker 为 True 时每个 worker 都执行（用于进程内的状态维护）
+        self.every_worker = every_worker
         self.interval = interval
         self.name = name
         self.latest_execute = latest_execute
         self.args = args
+        # 单次执行的超时时间（秒），为 None 时使用 common.scheduler.timeout，0 表示不限制
+        self.timeout = timeout
+        self.next_execute = 0
+        self.running = False
+        self.run_count = 0
+        self.fail_count = 0
+        self.timeout_count = 0
+        self.last_duration = None
+        self.max_duration = 0
+        self.last_success = None
+        self.last_error = None
 
     def check_available(self):
         return (time.time() - self.latest_execute) >= self.interval
 
+    def get_timeout(self):
+        timeout = self.timeout
+        if (timeout is None):
+            timeout = config.read_config('common.scheduler.timeout')
+        return timeout if (timeout and timeout > 0) else None
+
+    def jitter(self):
+        '''随机推迟的秒数，不超过执行间隔的 10%'''
+        jitter = min(config.read_config('common.scheduler.jitter') or 0, self.interval * 0.1)
+        return random.uniform(0, jitter) if (jitter > 0) else 0
+
     async def run(self):
+        start = time.time()
+        self.latest_execute = int(start)
         try:
             logger.info(f"task {self.name} run start")
-            await self.function(**self.args)
+            await asyncio.wait_for(self.function(**self.args), self.get_timeout())
+            self.last_success = self.latest_execute
+            result = 'success'
             logger.info(f'task {self.name} run success, next execute: {timestamp_format(self.interval + self.latest_execute)}')
+        except asyncio.TimeoutError:
+            self.timeout_count += 1
+            self.fail_count += 1
+            self.last_error = f'timeout after {self.get_timeout()}s'
+            result = 'timeout'
+            logger.error(f"task {self.name} run timeout, waiting for next execute...")
         except Exception as e:
+            self.fail_count += 1
+            self.last_error = f'{type(e).__name__}: {e}'
+            result = 'failed'
             logger.error(f"task {self.name} run failed, waiting for next execute...")
             logger.error(traceback.format_exc())
+        self.run_count += 1
+        self.last_duration = time.time() - start
+        self.max_duration = max(self.max_duration, self.last_duration)
+        metrics.inc('scheduler_task_total', task=self.name, result=result)
+        metrics.observe('scheduler_task_seconds', self.last_duration, task=self.name)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'interval': self.interval,
+            'every_worker': self.every_worker,
+            'timeout': self.get_timeout(),
+            'running': self.running,
+            'latest_execute': self.latest_execute,
+            'next_execute': self.next_execute,
+            'run_count': self.run_count,
+            'fail_count': self.fail_count,
+            'timeout_count': self.timeout_count,
+            'last_duration': self.last_duration,
+            'max_duration': self.max_duration,
+            'last_success': self.last_success,
+            'last_error': self.last_error,
+        }
 
     def __str__(self):
-        return f'SchedulerTaskWrapper(name="{self.name}", interval={self.interval}, function={self.function}, args={self.args}, latest_execute={self.latest_execute})'
+        return f'SchedulerTaskWrapper(name="{self.name}", interval={self.interval}, every_worker={self.every_worker}, function={self.function}, args={self.args}, latest_execute={self.latest_execute})'
+
+
+def _enabled_here(t):
+    return t.every_worker or workers.is_primary()
+
+
+def _load_last_run():
+    try:
+        return config.load_data().get(PERSIST_KEY) or {}
+    except Exception:
+        logger.warning('读取定时任务执行记录失败\n' + traceback.format_exc())
+        return {}
+
+
+def _save_last_run():
+    if (not config.read_config('common.scheduler.persist')):
+        return
+    # every_worker 任务维护的是进程内的状态，重启后需要重新执行，不保存
+    data = {t.name: t.latest_execute for t in tasks if (not t.every_worker and t.latest_execute)}
+    try:
+        config.write_data(PERSIST_KEY, data)
+    except Exception:
+        logger.warning('保存定时任务执行记录失败\n' + traceback.format_exc())
 
-def append(name, task, interval = 86400, args = {}):
+
+def _schedule(t, deadline):
+    t.next_execute = deadline
+    heapq.heappush(_heap, (deadline, next(_seq), t))
+    _wakeup.set()
+
+
+async def _execute(t):
+    try:
+        async with _semaphore:
+            await t.run()
+    finally:
+        t.running = False
+        if (not t.every_worker):
+            _save_last_run()
+        if (not running_event.is_set()):
+            # 执行时间超过间隔时立即安排下一次，不会与本次重叠
+            _schedule(t, max(t.latest_execute + t.interval, time.time()) + t.jitter())
+
+
+def append(name, task, interval = 86400, args = {}, every_worker = False, timeout = None):
     global tasks
-    wrapper = taskWrapper(name, task, interval, args)
+    wrapper = taskWrapper(name, task, interval, args, every_worker = every_worker, timeout = timeout)
     logger.debug(f"new task ({name}) registered")
-    return tasks.append(wrapper)
+    tasks.append(wrapper)
+    if (_started and _enabled_here(wrapper)):
+        _schedule(wrapper, time.time() + wrapper.jitter())
+
 
-# 在 thread_runner 函数中修改循环逻辑
 async def thread_runner():
     global tasks, running_event
     while not running_event.is_set():
-        tasks_runner = []
-        for t in tasks:
-            if (t.check_available() and not running_event.is_set()):
-                t.latest_execute = int(time.time())
-                tasks_runner.append(t.run())
-        if (tasks_runner):
-            await asyncio.gather(*tasks_runner)
-        await asyncio.sleep(1)
+        now = time.time()
+        while (_heap and _heap[0][0] <= now):
+            _, _, t = heapq.heappop(_heap)
+            t.running = True
+            job = asyncio.create_task(_execute(t))
+            _running.add(job)
+            job.add_done_callback(_running.discard)
+        _wakeup.clear()
+        delay = min(_heap[0][0] - now, MAX_SLEEP) if (_heap) else MAX_SLEEP
+        try:
+            await asyncio.wait_for(_wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
 
 async def run():
+    global _semaphore, _started
     logger.debug("scheduler thread starting...")
+    _semaphore = asyncio.Semaphore(max(1, int(config.read_config('common.scheduler.max_concurrency') or 1)))
+    last_run = _load_last_run() if (config.read_config('common.scheduler.persist')) else {}
+    now = time.time()
+    for t in tasks:
+        if (not _enabled_here(t)):
+            continue
+        if (not t.every_worker and t.name in last_run):
+            t.latest_execute = int(last_run[t.name])
+        deadline = t.latest_execute + t.interval if (t.latest_execute) else now
+        _schedule(t, max(deadline, now) + t.jitter())
+    _started = True
     task = asyncio.create_task(thread_runner())
-    logger.debug("schedluer thread load success")
\ No newline at end of file
+    logger.debug("schedluer thread load success")
+    return task
+
+
+def status():
+    return sorted((t.to_dict() for t in tasks if _enabled_here(t)), key = lambda t: t['next_execute'])
+
+
+async def handle_status(request):
+    if (not lxsecurity.check_admin(request)):
+        return {'code': 1, 'msg': '管理接口验证失败', 'data': None}, 403
+    return {'code': 0, 'msg': 'success', 'data': {'worker': workers.worker_id(), 'tasks': status()}}
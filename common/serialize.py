@@ -0,0 +1,58 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: serialize.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 响应与缓存使用的 JSON 序列化
+# 开启 common.performance.orjson 且已安装 orjson 时使用 orjson，否则使用 ujson
+# orjson 不支持的数据（如超过 64 位的整数）会自动回退到 ujson
+
+import ujson as _ujson
+from . import log
+from . import variable
+
+logger = log.log('serialize')
+
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+_use_orjson = False
+
+
+def configure(use_orjson):
+    global _use_orjson
+    if use_orjson and _orjson is None:
+        logger.warning('未安装 orjson，已回退到 ujson，可以通过 pip install orjson 安装')
+    _use_orjson = bool(use_orjson and _orjson is not None)
+
+
+def dumps_bytes(obj, pretty=False) -> bytes:
+    if _use_orjson:
+        try:
+            return _orjson.dumps(obj, option=(_orjson.OPT_INDENT_2 if pretty else 0) | _orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return _ujson.dumps(obj, indent=2 if pretty else 0, ensure_ascii=False).encode('utf-8')
+
+
+def dumps(obj, pretty=False) -> str:
+    if _use_orjson:
+        return dumps_bytes(obj, pretty).decode('utf-8')
+    return _ujson.dumps(obj, indent=2 if pretty else 0, ensure_ascii=False)
+
+
+def dumps_response(obj) -> bytes:
+    """接口响应，只有调试模式下才格式化输出"""
+    return dumps_bytes(obj, pretty=variable.debug_mode)
+
+
+def loads(data):
+    if _use_orjson:
+        return _orjson.loads(data)
+    return _ujson.loads(data)
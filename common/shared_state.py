@@ -0,0 +1,104 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: shared_state.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 多进程模式下 worker 之间共享的状态：封禁列表、本地音频缓存索引
+# 限速的令牌桶见 rate_limit.py（redis 后端在 worker 之间共享）
+# 使用 WAL 模式的 SQLite 文件存储，单进程模式下不会被使用
+# worker 之间争用写锁时 SQLite 操作可能等待数秒，请求处理中的读写都放到专用线程中执行，不阻塞事件循环
+
+import time
+import asyncio
+import sqlite3
+import threading
+import concurrent.futures
+from . import log
+from . import workers
+
+logger = log.log('shared_state')
+
+_path = './config/shared.db'
+_conn = None
+_lock = threading.Lock()
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='shared_state')
+
+
+def enabled():
+    return workers.is_multi_process()
+
+
+def _connection():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(_path, timeout=5, check_same_thread=False, isolation_level=None)
+        _conn.execute('PRAGMA journal_mode=WAL')
+        _conn.execute('PRAGMA synchronous=NORMAL')
+        _conn.execute('''CREATE TABLE IF NOT EXISTS ban
+(ip TEXT PRIMARY KEY,
+expire INTEGER NOT NULL,
+expire_time REAL NOT NULL)''')
+        _conn.execute('''CREATE TABLE IF NOT EXISTS audio_index
+(source TEXT NOT NULL,
+song_id TEXT NOT NULL,
+quality TEXT NOT NULL,
+path TEXT NOT NULL,
+PRIMARY KEY (source, song_id, quality))''')
+    return _conn
+
+
+def _execute(sql, args=()):
+    with _lock:
+        return _connection().execute(sql, args).fetchall()
+
+
+async def run(func, *args):
+    """在专用线程中执行 func(*args)"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def _log_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f'写入共享状态失败: {future.exception()}')
+
+
+def submit(func, *args):
+    """在专用线程中执行 func(*args)，不等待结果，用于请求处理中的写入"""
+    _executor.submit(func, *args).add_done_callback(_log_error)
+
+
+# —— 封禁列表 ——
+
+def put_ban(ban_info):
+    _execute('INSERT OR REPLACE INTO ban (ip, expire, expire_time) VALUES (?, ?, ?)',
+             (ban_info['ip'], int(bool(ban_info['expire'])), ban_info['expire_time']))
+
+
+def remove_ban(ip):
+    _execute('DELETE FROM ban WHERE ip = ?', (ip,))
+
+
+def load_bans():
+    now = time.time()
+    return [
+        {'ip': ip, 'expire': bool(expire), 'expire_time': expire_time}
+        for ip, expire, expire_time in _execute('SELECT ip, expire, expire_time FROM ban')
+        if not (expire and expire_time <= now)
+    ]
+
+
+# —— 本地音频缓存索引 ——
+
+def put_audio(source, song_id, quality, path):
+    _execute('INSERT OR REPLACE INTO audio_index (source, song_id, quality, path) VALUES (?, ?, ?, ?)',
+             (source, song_id, quality, path))
+
+
+def audio_since(rowid):
+    """返回 rowid 之后写入的索引 ([(source, song_id, quality, path), ...], 最大的 rowid)"""
+    rows = _execute('SELECT rowid, source, song_id, quality, path FROM audio_index WHERE rowid > ? ORDER BY rowid', (rowid,))
+    return [row[1:] for row in rows], (rows[-1][0] if rows else rowid)
@@ -31,6 +31,7 @@ def _read_config(key):
                 value[k] = []
             elif k not in value and keys.index(k) == len(keys) - 1:
                 value = None
+                break
             value = value[k]
         else:
             value = None
@@ -41,10 +42,12 @@ def _read_config(key):
 _dm = _read_config("common.debug_mode")
 _lm = _read_config("common.log_file")
 _ll = _read_config("common.log_length_limit")
+_lc = _read_config("common.logging")
 debug_mode = True if (_os.getenv('CURRENT_ENV') ==
                       'development') else (_dm if (_dm) else False)
 log_length_limit = _ll if (_ll) else 500
 log_file = _lm if (isinstance(_lm, bool)) else True
+log_config = dict(_lc) if (isinstance(_lc, dict)) else {}
 running = True
 config = {}
 workdir = _os.getcwd()
@@ -58,7 +61,5 @@ running_ports = []
 use_proxy = False
 http_proxy = ''
 https_proxy = ''
-log_files = []
-request_time = {}
 ban_list = {}
 ban_list_raw = set()
@@ -0,0 +1,125 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: workers.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 多进程模式：主进程作为 supervisor 启动 N 个 worker 进程，worker 之间通过 SO_REUSEPORT 共享监听端口，
+# 由内核分配连接；worker 异常退出时 supervisor 会自动重启它。
+# worker 编号通过环境变量传递，编号为 0 的 worker 负责运行只需要执行一次的定时任务。
+
+import os
+import sys
+import time
+import signal
+import socket
+import subprocess
+from . import log
+
+logger = log.log('workers')
+
+ENV_WORKERS = 'LX_API_WORKERS'
+ENV_WORKER_ID = 'LX_API_WORKER_ID'
+
+
+def worker_count():
+    try:
+        return int(os.getenv(ENV_WORKERS) or 1)
+    except ValueError:
+        return 1
+
+
+def worker_id():
+    """当前进程的 worker 编号，单进程模式下为 None"""
+    wid = os.getenv(ENV_WORKER_ID)
+    return int(wid) if (wid is not None and wid.isdigit()) else None
+
+
+def is_multi_process():
+    return worker_id() is not None and worker_count() > 1
+
+
+def is_primary():
+    """单进程模式，或多进程模式下的 0 号 worker"""
+    return worker_id() in (None, 0)
+
+
+def reuse_port_supported():
+    return hasattr(socket, 'SO_REUSEPORT') and not sys.platform.startswith('win')
+
+
+def _worker_command():
+    if getattr(sys, 'frozen', False):
+        return [sys.executable] + sys.argv[1:]
+    return [sys.executable, os.path.abspath(sys.argv[0])] + sys.argv[1:]
+
+
+class Supervisor:
+    def __init__(self, count, restart_backoff_max=30, stable_time=60):
+        self.count = count
+        self.restart_backoff_max = restart_backoff_max
+        self.stable_time = stable_time
+        self.procs = {}
+        self.started_at = {}
+        self.restarts = {}
+        self.next_start = {}
+        self.stopping = False
+
+    def _spawn(self, wid):
+        env = dict(os.environ)
+        env[ENV_WORKERS] = str(self.count)
+        env[ENV_WORKER_ID] = str(wid)
+        self.procs[wid] = subprocess.Popen(_worker_command(), env=env)
+        self.started_at[wid] = time.time()
+        logger.info(f'worker {wid} 已启动，pid: {self.procs[wid].pid}')
+
+    def _handle_exit(self, wid, code):
+        # 长时间正常运行后退出的，不计入连续重启次数
+        if time.time() - self.started_at[wid] >= self.stable_time:
+            self.restarts[wid] = 0
+        self.restarts[wid] = self.restarts.get(wid, 0) + 1
+        delay = min(2 ** (self.restarts[wid] - 1), self.restart_backoff_max)
+        self.next_start[wid] = time.time() + delay
+        logger.warning(f'worker {wid} 已退出，退出码: {code}，将在 {delay} 秒后重启')
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        logger.info(f'多进程模式已启用，worker 数量: {self.count}')
+        for wid in range(self.count):
+            self._spawn(wid)
+        try:
+            while not self.stopping:
+                for wid in range(self.count):
+                    proc = self.procs.get(wid)
+                    if proc is not None:
+                        code = proc.poll()
+                        if code is None:
+                            continue
+                        self.procs.pop(wid)
+                        self._handle_exit(wid, code)
+                    if time.time() >= self.next_start.get(wid, 0):
+                        self._spawn(wid)
+                time.sleep(0.5)
+        finally:
+            self.shutdown()
+
+    def shutdown(self, timeout=10):
+        logger.info('正在停止所有 worker...')
+        for proc in self.procs.values():
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGINT)
+        deadline = time.time() + timeout
+        for proc in self.procs.values():
+            try:
+                proc.wait(max(0, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        self.procs.clear()
+        logger.info('所有 worker 已停止')
@@ -16,7 +16,6 @@ import traceback
 import threading
 import ujson as json
 from aiohttp.web import Response, FileResponse, StreamResponse, Application
-from io import TextIOWrapper
 import sys
 import os
 
@@ -38,6 +37,16 @@ from common import scheduler
 from common import lx_script
 from common import gcsp
 from common import webdav_cache
+from common import metrics
+from common import workers
+from common import shared_state
+from common import serialize
+from common import rate_limit
+from common import cache_reaper
+from common import cluster
+from common import peer_cache
+from common import compression
+from common import profiler
 import modules
 import base64
 
@@ -48,7 +57,7 @@ def handleResult(dic, status=200) -> Response:
             'msg': 'success',
             'data': dic
         }
-    return Response(body=json.dumps(dic, indent=2, ensure_ascii=False), content_type='application/json', status=status)
+    return Response(body=serialize.dumps_response(dic), content_type='application/json', status=status)
 
 
 logger = log.log("main")
@@ -66,42 +75,44 @@ else:
 # check request info before start
 
 
+rate_limit_msgs = {
+    'global': '全局限速',
+    'ip': 'IP限速',
+    'key': 'key限速',
+    'ip_source': '平台限速',
+}
+
+
 async def handle_before_request(app, handler):
     async def handle_request(request):
         try:
-            if config.read_config("common.reverse_proxy.allow_proxy") and request.headers.get(
-                config.read_config("common.reverse_proxy.real_ip_header")):
-                if not (config.read_config("common.reverse_proxy.allow_public_ip") or utils.is_local_ip(request.remote)):
+            # 同一个请求内使用同一份配置快照
+            settings = config.settings
+            reverse_proxy = settings.common.reverse_proxy
+            if reverse_proxy.allow_proxy and request.headers.get(reverse_proxy.real_ip_header):
+                if not (reverse_proxy.allow_public_ip or utils.is_local_ip(request.remote)):
                     return handleResult({"code": 1, "msg": "不允许的公网ip转发", "data": None}, 403)
                 # proxy header
-                request.remote_addr = request.headers.get(config.read_config("common.reverse_proxy.real_ip_header"))
+                request.remote_addr = request.headers.get(reverse_proxy.real_ip_header)
             else:
                 request.remote_addr = request.remote
             # check ip
             if (config.check_ip_banned(request.remote_addr)):
                 return handleResult({"code": 1, "msg": "您的IP已被封禁", "data": None}, 403)
-            # check global rate limit
-            if (
-                (time.time() - config.getRequestTime('global'))
-                <
-                (config.read_config("security.rate_limit.global"))
-            ):
-                return handleResult({"code": 5, "msg": "全局限速", "data": None}, 429)
-            if (
-                (time.time() - config.getRequestTime(request.remote_addr))
-                <
-                (config.read_config("security.rate_limit.ip"))
-            ):
-                return handleResult({"code": 5, "msg": "IP限速", "data": None}, 429)
-            # update request time
-            config.updateRequestTime('global')
-            config.updateRequestTime(request.remote_addr)
+            # check rate limit
+            limited = await rate_limit.check(
+                request.remote_addr, request.headers.get("X-Request-Key"), request.match_info.get('source'))
+            if (limited):
+                bucket, retry_after = limited
+                resp = handleResult({"code": 5, "msg": rate_limit_msgs[bucket], "data": None}, 429)
+                resp.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+                return resp
             # check host
-            if (config.read_config("security.allowed_host.enable")):
-                if request.host.split(":")[0] not in config.read_config("security.allowed_host.list"):
-                    if config.read_config("security.allowed_host.blacklist.enable"):
-                        config.ban_ip(request.remote_addr, int(
-                            config.read_config("security.allowed_host.blacklist.length")))
+            allowed_host = settings.security.allowed_host
+            if (allowed_host.enable):
+                if request.host.split(":")[0] not in allowed_host.list:
+                    if allowed_host.blacklist.enable:
+                        config.ban_ip(request.remote_addr, int(allowed_host.blacklist.length))
                     return handleResult({'code': 6, 'msg': '未找到您所请求的资源', 'data': None}, 404)
 
             resp = await handler(request)
@@ -130,21 +141,34 @@ async def main(request):
     return handleResult({"code": 0, "msg": "success", "data": None})
 
 
+def check_request_key(request):
+    security = config.settings.security
+    if (security.key.enable and request.host.split(':')[0] not in security.whitelist_host):
+        if (request.headers.get("X-Request-Key")) not in security.key.values:
+            if (security.key.ban):
+                config.ban_ip(request.remote_addr)
+            return False
+    return True
+
+
+def check_lxm(request):
+    if (config.read_config('security.check_lxm.enable') and request.host.split(':')[0] not in config.settings.security.whitelist_host):
+        lxm = request.headers.get('lxm')
+        if (not lxsecurity.checklxmheader(lxm, str(request.url))):
+            if (config.read_config('security.lxm_ban.enable')):
+                config.ban_ip(request.remote_addr)
+            return False
+    return True
+
+
 async def handle(request):
     method = request.match_info.get('method')
     source = request.match_info.get('source')
     songId = request.match_info.get('songId')
     quality = request.match_info.get('quality')
-    if (config.read_config("security.key.enable") and request.host.split(':')[0] not in config.read_config('security.whitelist_host')):
-        if (request.headers.get("X-Request-Key")) not in config.read_config("security.key.values"):
-            if (config.read_config("security.key.ban")):
-                config.ban_ip(request.remote_addr)
-            return handleResult({"code": 1, "msg": "key验证失败", "data": None}, 403)
-    if (config.read_config('security.check_lxm.enable') and request.host.split(':')[0] not in config.read_config('security.whitelist_host')):
-        lxm = request.headers.get('lxm')
-        if (not lxsecurity.checklxmheader(lxm, request.url)):
-            if (config.read_config('security.lxm_ban.enable')):
-                config.ban_ip(request.remote_addr)
+    if (not check_request_key(request)):
+        return handleResult({"code": 1, "msg": "key验证失败", "data": None}, 403)
+    if (not check_lxm(request)):
         return handleResult({"code": 1, "msg": "lxm请求头验证失败", "data": None}, 403)
 
     try:
@@ -158,6 +182,8 @@ async def handle(request):
                 'data': None,
                 "Your IP": request.remote_addr
             }, 404)
+        if method == 'url':
+            modules.prefetch.observe(request.remote_addr, source, songId, quality)
         if method in dir(modules):
             return handleResult(await getattr(modules, method)(source, songId, quality, query))
         else:
@@ -167,6 +193,99 @@ async def handle(request):
         return handleResult({'code': 4, 'msg': '内部服务器错误', 'data': None}, 500)
 
 
+async def handle_batch_url(request):
+    '''
+    批量获取链接，请求体为 {"items": [{"source": "tx", "songId": "xxx", "quality": "320k"}, ...]}
+    每首歌处理完成后立即以一行 JSON 返回（NDJSON），行内的 index 对应请求中的位置
+    每首歌分别按 (IP, 平台) 等限速桶计数，超出限速的歌曲单独返回限速错误
+    '''
+    if (not check_request_key(request)):
+        return handleResult({"code": 1, "msg": "key验证失败", "data": None}, 403)
+    if (not check_lxm(request)):
+        return handleResult({"code": 1, "msg": "lxm请求头验证失败", "data": None}, 403)
+    try:
+        body = await request.json()
+    except:
+        return handleResult({"code": 6, "msg": "请求体不是有效的JSON", "data": None}, 400)
+    items = body.get('items') if isinstance(body, dict) else body
+    if (not isinstance(items, list) or not items):
+        return handleResult({"code": 6, "msg": '需要参数"items"', "data": None}, 400)
+    batch_config = config.read_config('common.batch')
+    if (len(items) > int(batch_config.get('max_items', 200))):
+        return handleResult({"code": 6, "msg": f'单次最多请求{batch_config.get("max_items", 200)}首歌曲', "data": None}, 400)
+
+    semaphore = asyncio.Semaphore(int(batch_config.get('concurrency', 8)))
+
+    async def resolve(index, item):
+        if (not isinstance(item, dict)):
+            return {'index': index, 'code': 6, 'msg': '参数格式错误', 'data': None}
+        source, songId, quality = item.get('source'), str(item.get('songId') or ''), item.get('quality')
+        if (source not in modules.sourceExpirationTime or not songId):
+            res = {'code': 1, 'msg': '未知的源或不支持的方法', 'data': None}
+        elif (not isinstance(quality, str) or not quality):
+            res = {'code': 6, 'msg': '需要参数"quality"', 'data': None}
+        else:
+            limited = await rate_limit.check(request.remote_addr, request.headers.get("X-Request-Key"), source)
+            if (limited):
+                bucket, retry_after = limited
+                res = {'code': 5, 'msg': rate_limit_msgs[bucket], 'data': None, 'retryAfter': max(1, int(retry_after + 0.999))}
+            else:
+                async with semaphore:
+                    try:
+                        res = await modules.url(source, songId, quality)
+                    except:
+                        logger.error(traceback.format_exc())
+                        res = {'code': 4, 'msg': '内部服务器错误', 'data': None}
+        return dict(res, index=index, source=source, songId=songId, quality=quality)
+
+    resp = StreamResponse(headers={'Content-Type': 'application/x-ndjson; charset=utf-8'})
+    await resp.prepare(request)
+    tasks = [asyncio.ensure_future(resolve(i, item)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            res = await next_done
+            await resp.write(serialize.dumps_bytes(res) + b'\n')
+    finally:
+        for t in tasks:
+            t.cancel()
+    await resp.write_eof()
+    return resp
+
+
+async def handle_prefetch(request):
+    '''
+    提交接下来要播放的歌曲，在后台预先获取链接（可选下载音频），立即返回
+    请求体与批量接口相同: {"items": [{"source": "tx", "songId": "xxx", "quality": "320k"}, ...]}
+    '''
+    if (not check_request_key(request)):
+        return handleResult({"code": 1, "msg": "key验证失败", "data": None}, 403)
+    try:
+        body = await request.json()
+    except:
+        return handleResult({"code": 6, "msg": "请求体不是有效的JSON", "data": None}, 400)
+    items = body.get('items') if isinstance(body, dict) else body
+    if (not isinstance(items, list) or not items):
+        return handleResult({"code": 6, "msg": '需要参数"items"', "data": None}, 400)
+    max_items = int(config.read_config('common.prefetch.max_items') or 10)
+    queued = 0
+    for item in items[:max_items]:
+        if (not isinstance(item, dict)):
+            continue
+        source, songId, quality = item.get('source'), str(item.get('songId') or ''), item.get('quality')
+        if (source in modules.sourceExpirationTime and songId and quality and modules.prefetch.enqueue(source, songId, quality)):
+            queued += 1
+    return handleResult({'code': 0, 'msg': 'success', 'data': {'queued': queued, 'ignored': len(items) - queued}})
+
+
+async def handle_admin_reload(request):
+    if (not lxsecurity.check_admin(request)):
+        return {'code': 1, 'msg': '管理接口验证失败', 'data': None}, 403
+    success, errors = config.reload_config()
+    if (not success):
+        return {'code': 6, 'msg': '配置文件无效，已保留原配置', 'data': errors}, 400
+    return {'code': 0, 'msg': 'success', 'data': None}
+
+
 async def handle_404(request):
     return handleResult({'code': 6, 'msg': '未找到您所请求的资源', 'data': None}, 404)
 
@@ -224,8 +343,31 @@ async def handle_cache_file(request):
     path = os.path.join(cache_dir, filename)
     if os.path.exists(path):
         return FileResponse(path)
+    if peer_cache.enabled():
+        resp = await modules.stream_from_peer(request, filename)
+        if resp is not None:
+            return resp
     return handleResult({'code': 6, 'msg': '未找到您所请求的资源', 'data': None}, 404)
 
+# 节点间缓存共享
+async def handle_peer_has(request):
+    if (not peer_cache.check_key(request)):
+        return {'code': 1, 'msg': '节点验证失败', 'data': None}, 403
+    query = request.query
+    path = modules.peer_cached_file(query.get('filename'), query.get('source'), query.get('id'), query.get('quality'))
+    if path is None:
+        return {'code': 0, 'msg': 'success', 'data': None}
+    return {'code': 0, 'msg': 'success', 'data': {'filename': os.path.basename(path), 'size': os.path.getsize(path)}}
+
+
+async def handle_peer_cache_file(request):
+    if (not peer_cache.check_key(request)):
+        return {'code': 1, 'msg': '节点验证失败', 'data': None}, 403
+    path = modules.peer_cached_file(request.match_info.get('filename'))
+    if path is None:
+        return handleResult({'code': 6, 'msg': '未找到您所请求的资源', 'data': None}, 404)
+    return FileResponse(path)
+
 # WebDAV 代理处理
 async def handle_webdav_proxy(request):
     """代理 WebDAV 请求，添加认证头"""
@@ -361,7 +503,7 @@ async def handle_webdav_url_proxy(request):
         logger.error(traceback.format_exc())
         return handleResult({'code': 4, 'msg': '内部服务器错误', 'data': None}, 500)
 
-app = Application(middlewares=[handle_before_request])
+app = Application(middlewares=[profiler.handle_slow_requests, compression.handle_compression, handle_before_request])
 utils.setGlobal(app, "app")
 
 # 缓存文件访问路由需要放在通配符路由之前
@@ -374,6 +516,25 @@ app.router.add_get('/webdav/{source}/{songId}/{quality}', handle_webdav_proxy)
 # WebDAV URL 代理路由 (for direct_url mode)
 app.router.add_get('/webdav-proxy', handle_webdav_url_proxy)
 
+# 节点间缓存共享
+app.router.add_get('/peer/has', handle_peer_has)
+app.router.add_get('/peer/cache/{filename}', handle_peer_cache_file)
+
+# 管理接口
+app.router.add_get('/admin/metrics', metrics.handle_request)
+app.router.add_post('/admin/reload', handle_admin_reload)
+app.router.add_get('/admin/scheduler', scheduler.handle_status)
+app.router.add_get('/admin/profile', profiler.handle_profile)
+app.router.add_get('/admin/profile/slow', profiler.handle_slow)
+
+# 批量接口
+if (config.read_config('common.batch.enable')):
+    app.router.add_post('/batch/url', handle_batch_url)
+
+# 预取接口
+if (config.read_config('common.prefetch.enable')):
+    app.router.add_post('/prefetch', handle_prefetch)
+
 # 动态 API 路由
 app.router.add_get('/{method}/{source}/{songId}/{quality}', handle)
 app.router.add_get('/{method}/{source}/{songId}', handle)
@@ -422,7 +583,7 @@ async def run_app_host(host):
             for port in final_ports:
                 if (port not in variable.running_ports):
                     http_site = aiohttp.web.TCPSite(
-                        http_runner, host, port)
+                        http_runner, host, port, reuse_port=workers.is_multi_process() or None)
                     await http_site.start()
                     variable.running_ports.append(f'{host}_{port}')
                     logger.info(f"""监听 -> http://{
@@ -446,7 +607,8 @@ async def run_app_host(host):
                     for port in ssl_ports:
                         if (port not in variable.running_ports):
                             https_site = aiohttp.web.TCPSite(
-                                https_runner, host, port, ssl_context=ssl_context)
+                                https_runner, host, port, ssl_context=ssl_context,
+                                reuse_port=workers.is_multi_process() or None)
                             await https_site.start()
                             variable.running_ports.append(f'{host}_{port}')
                             logger.info(f"""监听 -> https://{
@@ -471,10 +633,30 @@ async def run_app():
         await run_app_host(host)
 
 
+async def sync_shared_state(interval=3):
+    while variable.running:
+        await asyncio.sleep(interval)
+        try:
+            await config.sync_ban_list()
+            await modules.sync_shared_cache_index()
+        except:
+            logger.warning('同步共享状态失败\n' + traceback.format_exc())
+
+
 async def initMain():
     scheduler.append("persist_ban_list", config.persist_ban_list, 900)
+    cache_reaper.register()
+    if (shared_state.enabled()):
+        # 多进程模式：0 号 worker 将数据库中的封禁列表写入共享状态，各 worker 定期同步
+        if (workers.is_primary()):
+            for b in variable.ban_list.values():
+                shared_state.put_ban(b)
+        asyncio.create_task(sync_shared_state())
     await scheduler.run()
+    profiler.start_loop_monitor()
+    await cluster.start(modules.local_audio_files)
     variable.aioSession = aiohttp.ClientSession(trust_env=True)
+    asyncio.create_task(config.watch_config())
     asyncio.create_task(checkcn_async())
     try:
         await modules.external_script.refresh_external_scripts()
@@ -506,6 +688,7 @@ async def initMain():
         logger.error(traceback.format_exc())
     finally:
         logger.info('wating for sessions to complete...')
+        await modules.external_script.close_worker_pool()
         if variable.aioSession:
             await variable.aioSession.close()
 
@@ -526,10 +709,31 @@ if __name__ == "__main__":
             except Exception as e:
                 logger.warning(f"禁用快速编辑模式失败: {e}")
 
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker 进程数量，大于 1 时启用多进程模式（需要系统支持 SO_REUSEPORT）')
+    args, _ = parser.parse_known_args()
+    worker_num = args.workers if (args.workers is not None) else int(config.read_config('common.workers') or 1)
+    if (worker_num > 1 and workers.worker_id() is None):
+        if (workers.reuse_port_supported()):
+            workers.Supervisor(worker_num).run()
+            sys.exit(0)
+        logger.warning('当前系统不支持 SO_REUSEPORT，已回退到单进程模式')
+
     try:
         disable_quick_edit_mode()
         # 初始化自定义事件循环以便托盘线程可以优雅关闭服务器
-        loop = asyncio.new_event_loop()
+        loop = None
+        if (config.read_config('common.performance.uvloop')):
+            try:
+                import uvloop
+                loop = uvloop.new_event_loop()
+                logger.info('已启用 uvloop 事件循环')
+            except ImportError:
+                logger.warning('未安装 uvloop，已回退到默认事件循环，可以通过 pip install uvloop 安装（不支持 Windows）')
+        if (loop is None):
+            loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
         # 动态获取一个用于展示的 host / port（选第一个即可）
@@ -560,6 +764,4 @@ if __name__ == "__main__":
             f.write(e)
         logger.critical('dumprecord_{}.txt 已保存至当前目录'.format(int(time.time())))
     finally:
-        for f in variable.log_files:
-            if (f and isinstance(f, TextIOWrapper)):
-                f.close()
+        log.shutdown()
@@ -11,6 +11,11 @@ from common.exceptions import FailedException
 from common.utils import require
 from common import log
 from common import config
+from common import negative_cache
+from common import shared_state
+from common import cluster
+from common import peer_cache
+from common import metrics
 import os
 import glob
 import asyncio
@@ -29,6 +34,8 @@ import threading
 
 # 导入外部脚本模块
 from . import external_script
+from . import cross_source
+from . import prefetch
 
 # 从.引入的包并没有在代码中直接使用，但是是用require在请求时进行引入的，不要动
 from . import kw
@@ -73,22 +80,27 @@ if not os.path.exists(_remote_cache_dir):
 # 结构: _cache_index[(source, song_id)][quality] = filepath
 _cache_index: dict[tuple[str, str], dict[str, str]] = collections.defaultdict(dict)
 
+def _parse_cache_filename(fname: str):
+    """解析 <source>_<songId>_<quality>.<ext>，返回 (source, song_id, quality) 或 None"""
+    name_no_ext, _ = os.path.splitext(fname)
+    parts = name_no_ext.split('_')
+    if len(parts) < 3:
+        return None
+    # song_id 可能包含 '_'，这里重新拼接中间段
+    return parts[0], '_'.join(parts[1:-1]), parts[-1]
+
 def _init_cache_index():
     """扫描远端缓存目录并构建索引，在进程启动时调用一次。"""
     try:
         for fname in os.listdir(_remote_cache_dir):
             # 排除封面/其它非音频文件
-            if fname.endswith('_cover.jpg') or fname.startswith('.'):
+            if fname.endswith('_cover.jpg') or fname.endswith('.download') or fname.startswith('.'):
                 continue
-            name_no_ext, _ = os.path.splitext(fname)
-            parts = name_no_ext.split('_')
-            if len(parts) < 3:
+            parsed = _parse_cache_filename(fname)
+            if parsed is None:
                 # 文件名不符合 <source>_<songId>_<quality> 规则，跳过
                 continue
-            source = parts[0]
-            quality = parts[-1]
-            # song_id 可能包含 '_'，这里重新拼接中间段
-            song_id = '_'.join(parts[1:-1])
+            source, song_id, quality = parsed
             _cache_index[(source, song_id)][quality] = os.path.join(_remote_cache_dir, fname)
     except FileNotFoundError:
         # 目录尚不存在
@@ -97,9 +109,61 @@ def _init_cache_index():
 # 在模块导入时立即构建索引
 _init_cache_index()
 
+@config.subscribe
+def _reload_config():
+    # 音频缓存目录变化时重建索引，其余情况保留已有索引
+    global _remote_cache_dir
+    new_dir = config.read_config("common.remote_cache.path") or "./cache_audio"
+    if new_dir == _remote_cache_dir:
+        return
+    os.makedirs(new_dir, exist_ok=True)
+    _remote_cache_dir = new_dir
+    _cache_index.clear()
+    _init_cache_index()
+    logger.info(f"音频缓存目录已变更为 {new_dir}，索引已重建")
+
 # 公共方法: 增量更新索引
 def _update_cache_index(source: str, song_id: str, quality: str, filepath: str):
     _cache_index[(source, song_id)][quality] = filepath
+    if shared_state.enabled():
+        shared_state.submit(shared_state.put_audio, source, song_id, quality, filepath)
+
+_shared_index_rowid = 0
+
+async def sync_shared_cache_index():
+    """多进程模式下定期同步其他 worker 写入的音频缓存索引"""
+    global _shared_index_rowid
+    rows, _shared_index_rowid = await shared_state.run(shared_state.audio_since, _shared_index_rowid)
+    for source, song_id, quality, path in rows:
+        _cache_index[(source, song_id)][quality] = path
+
+def local_audio_files():
+    """
+    本节点已缓存的音频文件 [(source, song_id, quality, filename), ...]，集群模式下定期登记；
+    已被删除（且没有正在进行的下载）的文件同时从索引与集群的登记中移除
+    """
+    files = []
+    for (source, song_id), song_map in list(_cache_index.items()):
+        for quality, path in list(song_map.items()):
+            if os.path.exists(path):
+                files.append((source, song_id, quality, os.path.basename(path)))
+            elif not os.path.exists(path + ".download"):
+                song_map.pop(quality, None)
+                cluster.remove_audio(source, song_id, quality)
+        if not song_map:
+            _cache_index.pop((source, song_id), None)
+    return files
+
+
+# 其他节点确认获取失败的歌曲同样写入本节点的失败结果缓存；某个节点获取成功时清除
+@cluster.on('negative_put')
+def _on_negative_put(source, song_id, quality, reason, msg):
+    negative_cache.put(source, song_id, quality, reason, msg)
+
+
+@cluster.on('negative_invalidate')
+def _on_negative_invalidate(source, song_id, quality=None):
+    negative_cache.invalidate(source, song_id, quality)
 
 # ---------------- Metadata in-flight set to avoid duplicate tasks ----------------
 _inflight_meta: set[tuple[str, str]] = set()
@@ -109,7 +173,133 @@ _inflight_meta_lock = asyncio.Lock()
 _file_locks: dict[str, threading.Lock] = {}
 _file_locks_lock = threading.Lock()
 
+async def _fallback_result(source, songId, quality, res, fallback):
+    """缓存兜底方式获取到的链接（音频缓存、URL 缓存、元数据）并构造返回结果"""
+    cache_filepath = None
+    # 后台缓存音频
+    try:
+        if config.read_config('common.remote_cache.enable') is not False:
+            _ext = os.path.splitext(res['url'].split('?')[0])[1] or '.mp3'
+            cache_filename = f"{source}_{songId}_{res['quality']}{_ext}"
+            cache_filepath = os.path.join(_remote_cache_dir, cache_filename)
+            if not os.path.exists(cache_filepath):
+                # 音频下载为后台异步任务，避免阻塞当前请求
+                asyncio.create_task(_download_audio_to_cache(res['url'], cache_filepath, source, songId))
+    except Exception:
+        logger.warning(f'音频缓存调度失败(来自 {fallback})\n' + traceback.format_exc())
+
+    # 写入 URL 缓存：external script 的结果不过期；
+    # 跨平台结果是目标平台的链接，按目标平台的有效期缓存，并记录目标平台用于计算返回的过期时间
+    target_source = res.get('source') or source
+    canExpire = fallback == 'crossSource' and sourceExpirationTime.get(target_source, {}).get('expire', False)
+    expireTime = int(sourceExpirationTime[target_source]['time'] * 0.75) if canExpire else None
+    expireAt = int(time.time() + expireTime) if canExpire else None
+    cache_data = {'expire': canExpire, 'time': expireAt or 0, 'url': res['url']}
+    if canExpire:
+        cache_data['source'] = target_source
+    await config.updateCacheAsync('urls', f"{source}_{songId}_{quality}", cache_data, expireTime)
+
+    asyncio.create_task(_ensure_metadata_cached(source, songId))
+
+    # 写入内存索引，供后续请求直接命中
+    try:
+        name_no_ext = os.path.splitext(os.path.basename(cache_filepath))[0]
+        quality_inferred = name_no_ext.split('_')[-1]
+        _update_cache_index(source, songId, quality_inferred, cache_filepath)
+    except Exception:
+        pass
+
+    extra = {
+        'cache': False,
+        'quality': {
+            'target': quality,
+            'result': res['quality'],
+        },
+        'expire': {
+            'time': expireAt,
+            'canExpire': canExpire,
+        },
+        'localfile': False,
+        'fallback': fallback,
+    }
+    if res.get('source') and res['source'] != source:
+        extra['mapped'] = {'source': res['source'], 'songId': res['songId']}
+    return {
+        'code': 0,
+        'msg': 'success',
+        'data': res['url'],
+        'extra': extra,
+    }
+
+
+def _url_cache_result(source, songId, quality, cache):
+    # 缓存虽已命中，但仍异步确认歌词/信息/封面是否存在
+    asyncio.create_task(_ensure_metadata_cached(source, songId))
+    return {
+        "code": 0,
+        "msg": "success",
+        "data": cache["url"],
+        "extra": {
+            "cache": True,
+            "quality": {
+                "target": quality,
+                "result": quality,
+            },
+            "expire": {
+                # 在更新缓存的时候把有效期的75%作为链接可用时长，现在加回来（跨平台结果按目标平台计算）
+                "time": (
+                    int(cache["time"] + (sourceExpirationTime[cache.get("source", source)]["time"] * 0.25))
+                    if cache["expire"]
+                    else None
+                ),
+                "canExpire": cache["expire"],
+            },
+        },
+    }
+
+
+async def _cluster_single_flight(source, songId, quality):
+    """
+    集群模式下获取解析锁，返回 (锁, None)；其他节点正在解析同一首歌时等待其完成，
+    共享的 URL 缓存中有结果时返回 (None, 结果)，否则返回 (None, None) 由本节点自行解析
+    """
+    name = f"url:{source}_{songId}_{quality}"
+    lock = await cluster.acquire(name)
+    if lock is not None or not await cluster.is_locked(name):
+        return lock, None
+    logger.debug("其他节点正在解析 %s_%s_%s，等待其完成", source, songId, quality)
+    await cluster.wait(name)
+    cache = await config.getCacheAsync("urls", f"{source}_{songId}_{quality}")
+    if cache:
+        metrics.inc('cluster_url_shared_total')
+        return None, _url_cache_result(source, songId, quality, cache)
+    negative = negative_cache.get(source, songId, quality)
+    if negative:
+        return None, {"code": 2, "msg": negative[1], "data": None, "extra": {"cache": True, "reason": negative[0]}}
+    return await cluster.acquire(name), None
+
+
+# ---------------- Single-flight for url requests ----------------
+# 同一首歌同一音质的并发请求只向上游请求一次，其余请求等待同一个结果；
+# 客户端内嵌的 info 会在获取失败时供 external script 使用，只合并携带相同 info 的请求
+_inflight_urls: dict[tuple[str, str, str, str], asyncio.Future] = {}
+
+
 async def url(source, songId, quality, query={}):
+    if source == "kg":
+        songId = songId.lower()
+    key = (source, songId, quality, (query or {}).get('info') or '')
+    future = _inflight_urls.get(key)
+    if future is not None:
+        logger.debug("合并进行中的请求: %s_%s_%s", source, songId, quality)
+        return await asyncio.shield(future)
+    future = asyncio.ensure_future(_url(source, songId, quality, query))
+    _inflight_urls[key] = future
+    future.add_done_callback(lambda _: _inflight_urls.pop(key, None))
+    return await asyncio.shield(future)
+
+
+async def _url(source, songId, quality, query={}):
     # ❗ 为保证酷狗(Kugou)源的歌曲 ID 与磁盘/缓存中的命名一致，统一转为小写。
     #   之前的实现是在本地文件检查之后才转换，导致相同歌曲无法命中缓存。
     if source == "kg":
@@ -182,7 +372,7 @@ async def url(source, songId, quality, query={}):
             if 'info' in query and query['info']:
                 info_obj = _decode_b64url(query['info'])
                 if isinstance(info_obj, dict):
-                    config.updateCache(
+                    await config.updateCacheAsync(
                         'info', f"{source}_{songId}",
                         {"expire": False, "time": 0, "data": info_obj}
                     )
@@ -193,7 +383,7 @@ async def url(source, songId, quality, query={}):
                 if lyric_obj:
                     expire_time = 86400 * 3
                     expire_at = int(time.time() + expire_time)
-                    config.updateCache(
+                    await config.updateCacheAsync(
                         'lyric', f"{source}_{songId}",
                         {"expire": True, "time": expire_at, "data": lyric_obj},
                         expire_time,
@@ -212,7 +402,7 @@ async def url(source, songId, quality, query={}):
     # —— 本地音频缓存预检查 ——
     cached_path = _find_cached_file(source, songId, quality)
     if cached_path:
-        logger.debug(f"命中本地音频缓存: {cached_path}")
+        logger.debug("命中本地音频缓存: %s", cached_path)
         # 缓存虽已命中，但仍异步确认歌词/信息/封面是否存在
         asyncio.create_task(_ensure_metadata_cached(source, songId))
         return {
@@ -230,34 +420,81 @@ async def url(source, songId, quality, query={}):
         }
 
     try:
-        cache = config.getCache("urls", f"{source}_{songId}_{quality}")
+        cache = await config.getCacheAsync("urls", f"{source}_{songId}_{quality}")
         if cache:
-            logger.debug(f'使用缓存的{source}_{songId}_{quality}数据，URL：{cache["url"]}')
-            # 缓存虽已命中，但仍异步确认歌词/信息/封面是否存在
+            logger.debug('使用缓存的%s_%s_%s数据，URL：%s', source, songId, quality, cache["url"])
+            deferred_quality = prefetch.take_deferred(source, songId, quality)
+            if deferred_quality:
+                cache_audio(source, songId, deferred_quality, cache["url"])
+            return _url_cache_result(source, songId, quality, cache)
+    except:
+        logger.error(traceback.format_exc())
+    # —— 近期已确认获取失败的歌曲直接返回 ——
+    negative = negative_cache.get(source, songId, quality)
+    if negative:
+        reason, msg = negative
+        logger.debug("命中失败结果缓存: %s_%s_%s, reason: %s", source, songId, quality, reason)
+        return {
+            "code": 2,
+            "msg": msg,
+            "data": None,
+            "extra": {
+                "cache": True,
+                "reason": reason,
+            },
+        }
+
+    # —— 集群中其他节点持有的音频缓存（链接缓存未命中时才查询，避免命中链接缓存的请求等待节点查询） ——
+    if cluster.enabled() and config.read_config('common.cluster.redirect'):
+        peer = await cluster.find_audio(source, songId, quality)
+        if peer:
+            node, peer_url, peer_quality = peer
+            logger.debug("命中节点 %s 的音频缓存: %s", node, peer_url)
+            metrics.inc('cluster_redirect_total')
             asyncio.create_task(_ensure_metadata_cached(source, songId))
             return {
                 "code": 0,
                 "msg": "success",
-                "data": cache["url"],
+                "data": peer_url,
                 "extra": {
                     "cache": True,
                     "quality": {
                         "target": quality,
-                        "result": quality,
+                        "result": peer_quality,
                     },
-                    "expire": {
-                        # 在更新缓存的时候把有效期的75%作为链接可用时长，现在加回来
-                        "time": (
-                            int(cache["time"] + (sourceExpirationTime[source]["time"] * 0.25))
-                            if cache["expire"]
-                            else None
-                        ),
-                        "canExpire": cache["expire"],
+                    "localfile": False,
+                    "node": node,
+                },
+            }
+
+    # —— 配置的其他节点持有的音频缓存，由本节点的 /cache 转发并同时缓存到本地 ——
+    if peer_cache.enabled():
+        found = await peer_cache.find(source=source, id=songId, quality=quality)
+        if found:
+            peer, filename = found
+            logger.debug("命中节点 %s 的音频缓存: %s", peer, filename)
+            asyncio.create_task(_ensure_metadata_cached(source, songId))
+            return {
+                "code": 0,
+                "msg": "success",
+                "data": f"/cache/{filename}",
+                "extra": {
+                    "cache": True,
+                    "quality": {
+                        "target": quality,
+                        "result": quality,
                     },
+                    "localfile": False,
+                    "peer": peer,
                 },
             }
-    except:
-        logger.error(traceback.format_exc())
+
+    # —— 之前已匹配到其他平台的同一首歌，直接使用 ——
+    mapped_res = await cross_source.resolve_mapped(source, songId, quality)
+    if mapped_res:
+        logger.info(f"使用跨平台映射获取{source}_{songId}_{quality}成功: {mapped_res['source']}_{mapped_res['songId']}")
+        return await _fallback_result(source, songId, quality, mapped_res, 'crossSource')
+
     try:
         func = require("modules." + source + ".url")
     except:
@@ -266,20 +503,21 @@ async def url(source, songId, quality, query={}):
             "msg": "未知的源或不支持的方法",
             "data": None,
         }
+    cluster_lock, shared_result = await _cluster_single_flight(source, songId, quality)
+    if shared_result:
+        return shared_result
     try:
         result = await func(songId, quality)
         logger.info(f'获取{source}_{songId}_{quality}成功，URL：{result["url"]}')
+        if cluster_lock is not None:
+            cluster.publish_nowait('negative_invalidate', source=source, song_id=songId, quality=quality)
 
         # —— 下载音频以供下次使用 ——
         try:
             if config.read_config("common.remote_cache.enable") is not False:
-                # 取文件扩展名
-                _ext = os.path.splitext(result["url"].split("?")[0])[1]
-                if _ext == "":
-                    _ext = ".mp3"
-                cache_filename = f"{source}_{songId}_{result['quality']}{_ext}"
-                cache_filepath = os.path.join(_remote_cache_dir, cache_filename)
-                if not os.path.exists(cache_filepath):
+                cache_filepath = _audio_cache_path(source, songId, result["quality"], result["url"])
+                # 预取且不预下载音频时，推迟到客户端真正请求时再下载
+                if not os.path.exists(cache_filepath) and not prefetch.defer_download(source, songId, quality, result["quality"]):
                     asyncio.create_task(_download_audio_to_cache(result["url"], cache_filepath, source, songId))
                 # 并行缓存歌曲信息/封面/歌词
                 asyncio.create_task(_ensure_metadata_cached(source, songId))
@@ -289,7 +527,7 @@ async def url(source, songId, quality, query={}):
         canExpire = sourceExpirationTime[source]["expire"]
         expireTime = int(sourceExpirationTime[source]["time"] * 0.75)
         expireAt = int(time.time() + expireTime)
-        config.updateCache(
+        await config.updateCacheAsync(
             "urls",
             f"{source}_{songId}_{quality}",
             {
@@ -300,7 +538,7 @@ async def url(source, songId, quality, query={}):
             },
             expireTime if canExpire else None,
         )
-        logger.debug(f'缓存已更新：{source}_{songId}_{quality}, URL：{result["url"]}, expire: {expireTime}')
+        logger.debug('缓存已更新：%s_%s_%s, URL：%s, expire: %s', source, songId, quality, result["url"], expireTime)
 
         # 缓存虽已命中，但仍异步确认歌词/信息/封面是否存在
         asyncio.create_task(_ensure_metadata_cached(source, songId))
@@ -337,60 +575,27 @@ async def url(source, songId, quality, query={}):
         ext_res = await external_script.try_external_script(source, songId, quality)
         if ext_res:
             logger.info(f"external script 获取成功: {ext_res['url']}")
+            return await _fallback_result(source, songId, quality, ext_res, 'externalScript')
 
-            # 后台缓存音频
-            try:
-                if config.read_config('common.remote_cache.enable') is not False:
-                    _ext = os.path.splitext(ext_res['url'].split('?')[0])[1] or '.mp3'
-                    cache_filename = f"{source}_{songId}_{ext_res['quality']}{_ext}"
-                    cache_filepath = os.path.join(_remote_cache_dir, cache_filename)
-                    if not os.path.exists(cache_filepath):
-                        # 将 external script 返回的音频下载改为后台异步任务，避免阻塞当前请求
-                        asyncio.create_task(_download_audio_to_cache(ext_res['url'], cache_filepath, source, songId))
-            except Exception:
-                logger.warning('音频缓存调度失败(来自 external script)\n' + traceback.format_exc())
-
-            # 写入 URL 缓存（不过期）
-            config.updateCache('urls', f"{source}_{songId}_{quality}", {'expire': False, 'time': 0, 'url': ext_res['url']})
-
-            asyncio.create_task(_ensure_metadata_cached(source, songId))
-
-            # 写入内存索引，供后续请求直接命中
-            try:
-                name_no_ext = os.path.splitext(os.path.basename(cache_filepath))[0]
-                quality_inferred = name_no_ext.split('_')[-1]
-                _update_cache_index(source, songId, quality_inferred, cache_filepath)
-            except Exception:
-                pass
-
-            return {
-                'code': 0,
-                'msg': 'success',
-                'data': ext_res['url'],
-                'extra': {
-                    'cache': False,
-                    'quality': {
-                        'target': quality,
-                        'result': ext_res['quality'],
-                    },
-                    'expire': {
-                        'time': None,
-                        'canExpire': False,
-                    },
-                    'localfile': False,
-                    'fallback': 'externalScript',
-                },
-            }
+        # —— 跨平台兜底 ——
+        cross_res = await cross_source.resolve(source, songId, quality)
+        if cross_res:
+            return await _fallback_result(source, songId, quality, cross_res, 'crossSource')
 
+        negative_cache.put(source, songId, quality, e.reason, e.args[0])
+        cluster.publish_nowait('negative_put', source=source, song_id=songId, quality=quality, reason=e.reason, msg=e.args[0])
         return {
             'code': 2,
             'msg': e.args[0],
             'data': None,
         }
+    finally:
+        if cluster_lock is not None:
+            await cluster_lock.release()
 
 
 async def lyric(source, songId, _, query):
-    cache = config.getCache("lyric", f"{source}_{songId}")
+    cache = await config.getCacheAsync("lyric", f"{source}_{songId}")
     if cache:
         return {"code": 0, "msg": "success", "data": cache["data"]}
     try:
@@ -405,7 +610,7 @@ async def lyric(source, songId, _, query):
         result = await func(songId)
         expireTime = 86400 * 3
         expireAt = int(time.time() + expireTime)
-        config.updateCache(
+        await config.updateCacheAsync(
             "lyric",
             f"{source}_{songId}",
             {
@@ -415,7 +620,7 @@ async def lyric(source, songId, _, query):
             },
             expireTime,
         )
-        logger.debug(f"缓存已更新：{source}_{songId}, lyric: {result}")
+        logger.debug("缓存已更新：%s_%s, lyric: %s", source, songId, result)
         return {"code": 0, "msg": "success", "data": result}
     except FailedException as e:
         return {
@@ -449,7 +654,7 @@ async def other(method, source, songid, _, query):
     # info 方法支持本地缓存
     cache_key = f"{source}_{songid}"
     if method == "info":
-        cache = config.getCache("info", cache_key)
+        cache = await config.getCacheAsync("info", cache_key)
         if cache:
             return {"code": 0, "msg": "success", "data": cache["data"]}
 
@@ -465,7 +670,7 @@ async def other(method, source, songid, _, query):
         result = await func(songid)
         # 若是 info，写入缓存
         if method == "info":
-            config.updateCache("info", cache_key, {"expire": False, "time": 0, "data": result})
+            await config.updateCacheAsync("info", cache_key, {"expire": False, "time": 0, "data": result})
         return {"code": 0, "msg": "success", "data": result}
     except FailedException as e:
         return {
@@ -478,13 +683,88 @@ async def other(method, source, songid, _, query):
 async def info_with_query(source, songid, _, query):
     return await other("info", source, songid, None)
 
+def _audio_cache_path(source: str, song_id: str, quality: str, url: str):
+    # 取文件扩展名
+    _ext = os.path.splitext(url.split("?")[0])[1]
+    if _ext == "":
+        _ext = ".mp3"
+    return os.path.join(_remote_cache_dir, f"{source}_{song_id}_{quality}{_ext}")
+
+def cache_audio(source: str, song_id: str, quality: str, url: str):
+    """在后台将已获取到链接的音频下载到本地缓存，未开启 remote_cache 或已缓存时不做任何事"""
+    if config.read_config("common.remote_cache.enable") is False:
+        return
+    filepath = _audio_cache_path(source, song_id, quality, url)
+    if not os.path.exists(filepath):
+        asyncio.create_task(_download_audio_to_cache(url, filepath, source, song_id))
+        _update_cache_index(source, song_id, quality, filepath)
+
 async def _download_audio_to_cache(url: str, filepath: str, source: str, song_id: str):
     """后台下载音频文件到本地缓存，并在完成后写入元数据。
     增加最多 3 次重试，并捕获 ConnectionResetError 等网络异常，降低 10054 触发概率。"""
 
     if os.path.exists(filepath):
         return
+    # 以独占方式创建临时文件作为下载锁，避免多个请求/多个 worker 同时下载同一首歌
+    tmp_path = _acquire_download(filepath)
+    if tmp_path is None:
+        logger.debug(f"音频正在由其他任务下载: {filepath}")
+        return
+    cluster_lock = None
+    try:
+        # 集群模式下可以重定向到其他节点时，整个集群只下载一次
+        if cluster.enabled() and config.read_config('common.cluster.redirect'):
+            filename = os.path.basename(filepath)
+            cluster_lock = await cluster.acquire(f"download:{filename}")
+            if cluster_lock is None and await cluster.is_locked(f"download:{filename}"):
+                logger.debug(f"音频正在由其他节点下载: {filename}")
+                return
+            quality = os.path.splitext(filename)[0].split('_')[-1]
+            peer = await cluster.find_audio(source, song_id, quality)
+            if peer and peer[1].endswith('/' + filename):
+                logger.debug(f"音频已由节点 {peer[0]} 缓存: {filename}")
+                return
+        if peer_cache.enabled():
+            # 其他节点已有该文件时从节点下载，不再请求上游
+            filename = os.path.basename(filepath)
+            found = await peer_cache.find(filename=filename)
+            if found:
+                logger.debug("从节点 %s 下载音频: %s", found[0], filename)
+                await _download_audio(peer_cache.file_url(found[0], filename), filepath, tmp_path, source, song_id,
+                                      headers=peer_cache.request_options()['headers'])
+                return
+        await _download_audio(url, filepath, tmp_path, source, song_id)
+    finally:
+        if cluster_lock is not None:
+            await cluster_lock.release()
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
 
+
+# 超过该时间仍未完成的临时下载文件视为残留（进程崩溃等原因），可以被重新下载
+_download_stale_time = 600
+
+
+def _acquire_download(filepath: str):
+    tmp_path = filepath + ".download"
+    for _ in range(2):
+        try:
+            os.close(os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return tmp_path
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(tmp_path) < _download_stale_time:
+                    return None
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+    return None
+
+
+async def _download_audio(url: str, filepath: str, tmp_path: str, source: str, song_id: str, headers: dict | None = None):
     import aiohttp
     max_retry = 3
     for attempt in range(1, max_retry + 1):
@@ -495,24 +775,27 @@ async def _download_audio_to_cache(url: str, filepath: str, source: str, song_id
             _owns_session = True
 
         try:
-            async with session.get(url, timeout=120) as resp:
+            async with session.get(url, timeout=120, headers=headers) as resp:
                 if resp.status != 200:
                     raise aiohttp.ClientResponseError(status=resp.status, request_info=resp.request_info, history=resp.history)
 
-                async with aiofiles.open(filepath, "wb") as f:
+                async with aiofiles.open(tmp_path, "wb") as f:
                     async for chunk in resp.content.iter_chunked(64 * 1024):
                         await f.write(chunk)
+            os.replace(tmp_path, filepath)
 
             logger.info(f"音频缓存完成: {filepath}")
+            name_no_ext = os.path.splitext(os.path.basename(filepath))[0]
+            cluster.put_audio(source, song_id, name_no_ext.split('_')[-1], os.path.basename(filepath))
 
             # 添加短暂延迟，确保文件句柄完全释放
             await asyncio.sleep(0.5)
             
             # 下载完成后嵌入元数据（若可用）
             try:
-                info_cache = config.getCache("info", f"{source}_{song_id}")
+                info_cache, lyric_cache = await config.getCacheMany(
+                    [("info", f"{source}_{song_id}"), ("lyric", f"{source}_{song_id}")])
                 info_data = info_cache["data"] if info_cache else None
-                lyric_cache = config.getCache("lyric", f"{source}_{song_id}")
                 lyric_data = lyric_cache["data"] if lyric_cache else None
                 cover_path = os.path.join(_remote_cache_dir, f"{source}_{song_id}_cover.jpg")
                 _embed_metadata(filepath, info_data, cover_path if os.path.exists(cover_path) else None, lyric_data)
@@ -530,24 +813,12 @@ async def _download_audio_to_cache(url: str, filepath: str, source: str, song_id
             # 成功即结束
             break
         except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionResetError) as e:
-            # 删除可能写入的不完整文件
-            if os.path.exists(filepath):
-                try:
-                    os.remove(filepath)
-                except Exception:
-                    pass
-
             logger.warning(f"下载音频失败/重试 {attempt}/{max_retry}: {e}")
 
             if attempt == max_retry:
                 logger.error(f"下载音频放弃: {url}")
         except Exception:
             logger.warning(f"下载音频异常: {url}\n" + traceback.format_exc())
-            if os.path.exists(filepath):
-                try:
-                    os.remove(filepath)
-                except Exception:
-                    pass
             if attempt == max_retry:
                 logger.error(f"下载音频放弃: {url}")
         finally:
@@ -653,15 +924,121 @@ def _embed_metadata(filepath: str, info: dict | None, cover_path: str | None, ly
 # Helper to build cache file path based on naming rule
 def _find_cached_file(source: str, song_id: str, quality: str):
     """从内存索引中查找缓存文件，避免每次请求都进行磁盘 glob。"""
+    # 多进程模式下其他 worker 下载的文件由 sync_shared_cache_index 定期同步到索引中
     song_map = _cache_index.get((source, song_id))
     if not song_map:
         return None
+    # 索引在开始下载时就会写入，只返回已经下载完成的文件（集群模式下可能由其他节点下载）
     # 精准匹配 quality
-    if quality in song_map:
+    if quality in song_map and os.path.exists(song_map[quality]):
         return song_map[quality]
     # 回退：任意质量
     # 按质量名称排序可保证稳定输出，但这里简单返回第一个
-    return next(iter(song_map.values()), None)
+    return next((p for p in song_map.values() if os.path.exists(p)), None)
+
+def peer_cached_file(filename: str | None = None, source: str | None = None, song_id: str | None = None, quality: str | None = None):
+    """供其他节点查询的本地缓存文件，按文件名或 source/song_id/quality 精确匹配，返回路径或 None"""
+    if filename:
+        filename = os.path.basename(filename)
+        if _parse_cache_filename(filename) is None or filename.endswith(('.download', '_cover.jpg')):
+            return None
+        path = os.path.join(_remote_cache_dir, filename)
+    else:
+        if source == "kg" and song_id:
+            song_id = song_id.lower()
+        path = _cache_index.get((source, song_id), {}).get(quality)
+    if path and os.path.isfile(path):
+        return path
+    return None
+
+
+async def stream_from_peer(request, filename: str):
+    """
+    本地没有的缓存文件从其他节点获取：边转发给客户端边写入本地缓存，
+    客户端中途断开时继续下载完成；其他任务正在下载同一文件时只转发不写入
+    返回 StreamResponse，没有节点持有该文件时返回 None
+    """
+    from aiohttp import web
+    import aiohttp
+    filename = os.path.basename(filename)
+    parsed = _parse_cache_filename(filename)
+    if parsed is None:
+        return None
+    peer = peer_cache.location(filename)
+    if peer is None:
+        found = await peer_cache.find(filename=filename)
+        if not found:
+            return None
+        peer = found[0]
+
+    filepath = os.path.join(_remote_cache_dir, filename)
+    session = variable.aioSession
+    owns_session = session is None
+    if owns_session:
+        session = aiohttp.ClientSession(trust_env=True)
+    tmp_path = None
+    response = None
+    try:
+        upstream = await session.get(peer_cache.file_url(peer, filename), **peer_cache.request_options())
+    except Exception as e:
+        logger.warning(f"从节点 {peer} 获取 {filename} 失败: {e}")
+        if owns_session:
+            await session.close()
+        return None
+    try:
+        if upstream.status != 200:
+            logger.warning(f"从节点 {peer} 获取 {filename} 失败: HTTP {upstream.status}")
+            return None
+        tmp_path = _acquire_download(filepath)
+        response = web.StreamResponse(headers={
+            'Content-Type': upstream.headers.get('Content-Type', 'application/octet-stream'),
+        })
+        if upstream.content_length is not None:
+            response.content_length = upstream.content_length
+        await response.prepare(request)
+        client_alive = True
+        received = 0
+        f = await aiofiles.open(tmp_path, "wb") if tmp_path else None
+        try:
+            async for chunk in upstream.content.iter_chunked(64 * 1024):
+                received += len(chunk)
+                if f is not None:
+                    await f.write(chunk)
+                if client_alive:
+                    try:
+                        await response.write(chunk)
+                    except (ConnectionResetError, RuntimeError):
+                        client_alive = False
+                        if f is None:
+                            break
+        finally:
+            if f is not None:
+                await f.close()
+        if tmp_path and (upstream.content_length is None or received == upstream.content_length):
+            os.replace(tmp_path, filepath)
+            source, song_id, quality = parsed
+            _update_cache_index(source, song_id, quality, filepath)
+            cluster.put_audio(source, song_id, quality, filename)
+            metrics.inc('peer_cache_fetch_total', result='success')
+            metrics.inc('peer_cache_fetch_bytes_total', received)
+            logger.info(f"已从节点 {peer} 缓存音频: {filepath}")
+        if client_alive:
+            await response.write_eof()
+        return response
+    except Exception:
+        metrics.inc('peer_cache_fetch_total', result='failed')
+        logger.warning(f"从节点 {peer} 获取 {filename} 失败\n" + traceback.format_exc())
+        # 已经开始转发时只能中断响应
+        return response if response is not None and response.prepared else None
+    finally:
+        upstream.release()
+        if owns_session:
+            await session.close()
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
 
 # —— 额外信息、歌词、封面缓存 ——
 async def _ensure_metadata_cached(source: str, song_id: str):
@@ -677,13 +1054,13 @@ async def _ensure_metadata_cached(source: str, song_id: str):
     try:
         # Info cache
         info_key = f"{source}_{song_id}"
-        info_cache = config.getCache("info", info_key)
+        info_cache, lyric_cache = await config.getCacheMany([("info", info_key), ("lyric", info_key)])
         if not info_cache:
             try:
                 func_info = require(f"modules.{source}.info")
                 info_data = await func_info(song_id)
                 # 写入缓存数据库（不过期）
-                config.updateCache("info", info_key, {"expire": False, "time": 0, "data": info_data})
+                await config.updateCacheAsync("info", info_key, {"expire": False, "time": 0, "data": info_data})
             except Exception:
                 logger.debug(f"获取 info 失败: {source} {song_id}\n" + traceback.format_exc())
                 info_data = None
@@ -691,7 +1068,6 @@ async def _ensure_metadata_cached(source: str, song_id: str):
             info_data = info_cache["data"]
 
         # Lyric cache(已有实现，但若没命中可手动触发)
-        lyric_cache = config.getCache("lyric", info_key)
         if not lyric_cache:
             try:
                 func_lyric = require(f"modules.{source}.lyric")
@@ -699,7 +1075,7 @@ async def _ensure_metadata_cached(source: str, song_id: str):
                 # 3 天过期与 modules.lyric 保持一致
                 expire_time = 86400 * 3
                 expire_at = int(time.time() + expire_time)
-                config.updateCache("lyric", info_key, {"expire": True, "time": expire_at, "data": lyric_data}, expire_time)
+                await config.updateCacheAsync("lyric", info_key, {"expire": True, "time": expire_at, "data": lyric_data}, expire_time)
             except Exception:
                 logger.debug(f"获取 lyric 失败: {source} {song_id}\n" + traceback.format_exc())
 
@@ -716,7 +1092,7 @@ async def _ensure_metadata_cached(source: str, song_id: str):
                             info_data["cover"] = f"/webdav/{source}/{song_id}/cover"
                         else:
                             info_data["cover"] = webdav_cover_url
-                        config.updateCache("info", info_key, {"expire": False, "time": 0, "data": info_data})
+                        await config.updateCacheAsync("info", info_key, {"expire": False, "time": 0, "data": info_data})
                     webdav_cover_checked = True
                     logger.debug(f"使用 WebDAV 封面: {source}_{song_id}")
             except Exception:
@@ -738,7 +1114,7 @@ async def _ensure_metadata_cached(source: str, song_id: str):
                             logger.info(f"封面缓存完成: {cover_path}")
                             # 把cover地址替换为本地路径并重新写入缓存
                             info_data["cover"] = f"/cache/{cover_filename}"
-                            config.updateCache("info", info_key, {"expire": False, "time": 0, "data": info_data})
+                            await config.updateCacheAsync("info", info_key, {"expire": False, "time": 0, "data": info_data})
                 except Exception:
                     logger.debug(f"下载封面失败: {cover_url}\n" + traceback.format_exc())
 
@@ -747,9 +1123,9 @@ async def _ensure_metadata_cached(source: str, song_id: str):
             for file_path in glob.glob(os.path.join(_remote_cache_dir, f"{source}_{song_id}_*.*")):
                 if file_path.endswith('_cover.jpg'):
                     continue
-                info_cache = config.getCache("info", f"{source}_{song_id}")
+                info_cache, lyric_cache = await config.getCacheMany(
+                    [("info", f"{source}_{song_id}"), ("lyric", f"{source}_{song_id}")])
                 info_data = info_cache["data"] if info_cache else None
-                lyric_cache = config.getCache("lyric", f"{source}_{song_id}")
                 lyric_data = lyric_cache["data"] if lyric_cache else None
                 cover_file = os.path.join(_remote_cache_dir, f"{source}_{song_id}_cover.jpg")
                 if not info_data:
@@ -0,0 +1,202 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: cross_source.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 跨平台兜底：某个平台获取链接失败时，根据歌名/歌手/时长在其他已启用的平台上搜索同一首歌，
+# 匹配成功后使用该平台获取链接，并缓存 (源平台, 歌曲ID) -> (目标平台, 歌曲ID) 的映射，
+# 之后的请求直接使用映射到的平台。
+
+import re
+import time
+import asyncio
+import traceback
+import unicodedata
+from common import log
+from common import config
+from common import metrics
+from common.utils import require
+from common.exceptions import FailedException
+
+logger = log.log('cross_source')
+
+# 各平台搜索结果中可直接用于获取链接的 ID 字段
+_id_field = {
+    'kg': 'hash',
+}
+
+_bracket_rxp = re.compile(r'[\(\[（【<《].*?[\)\]）】>》]')
+_feat_rxp = re.compile(r'\s*(?:feat\.?|ft\.?)\s.*$', re.IGNORECASE)
+_symbol_rxp = re.compile(r'[\W_]+', re.UNICODE)
+_artist_split_rxp = re.compile(r'\s*(?:、|,|，|/|&|;|；|\s+x\s+|\s+feat\.?\s+|\s+ft\.?\s+)\s*', re.IGNORECASE)
+
+
+def normalize_title(title) -> str:
+    if not title:
+        return ''
+    title = unicodedata.normalize('NFKC', str(title)).lower()
+    title = _bracket_rxp.sub('', title)
+    title = _feat_rxp.sub('', title)
+    title = title.split(' - ')[0]
+    return _symbol_rxp.sub('', title)
+
+
+def normalize_artists(singer) -> set:
+    if not singer:
+        return set()
+    if isinstance(singer, list):
+        singer = '、'.join(s.get('name', '') if isinstance(s, dict) else str(s) for s in singer)
+    singer = unicodedata.normalize('NFKC', str(singer)).lower()
+    return {_symbol_rxp.sub('', a) for a in _artist_split_rxp.split(singer) if _symbol_rxp.sub('', a)}
+
+
+def parse_duration(value):
+    """支持秒数或 mm:ss / hh:mm:ss 格式，无法解析时返回 None"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parts = [float(p) for p in str(value).split(':')]
+    except ValueError:
+        return None
+    total = 0.0
+    for p in parts:
+        total = total * 60 + p
+    return total
+
+
+def extract_metadata(info: dict) -> dict | None:
+    """从 info 接口结果或客户端内嵌的 musicInfo 中提取匹配所需的字段"""
+    if not isinstance(info, dict):
+        return None
+    name = info.get('name_ori') or info.get('name')
+    if not name:
+        return None
+    return {
+        'title': normalize_title(name),
+        'artists': normalize_artists(info.get('singer_list') or info.get('singer')),
+        'duration': parse_duration(info.get('length') if info.get('length') is not None else info.get('interval')),
+        'keyword': f"{name} {info.get('singer') if isinstance(info.get('singer'), str) else ''}".strip(),
+    }
+
+
+def is_match(meta: dict, candidate: dict, tolerance: float) -> bool:
+    if not meta['title'] or normalize_title(candidate.get('name_ori') or candidate.get('name')) != meta['title']:
+        return False
+    candidate_artists = normalize_artists(candidate.get('singer_list') or candidate.get('singer'))
+    if meta['artists'] and candidate_artists and not (meta['artists'] & candidate_artists):
+        return False
+    duration = parse_duration(candidate.get('length'))
+    if meta['duration'] and duration and abs(meta['duration'] - duration) > tolerance:
+        return False
+    return True
+
+
+async def get_mapping(source: str, song_id: str):
+    cache = await config.getCacheAsync('cross_source', f'{source}_{song_id}')
+    if cache:
+        return cache['data']
+    return None
+
+
+async def _save_mapping(source: str, song_id: str, target_source: str, target_id: str):
+    expire_time = int(config.read_config('common.cross_source.mapping_expire') or 86400)
+    await config.updateCacheAsync(
+        'cross_source', f'{source}_{song_id}',
+        {'expire': True, 'time': int(time.time() + expire_time), 'data': {'source': target_source, 'songId': target_id}},
+        expire_time,
+    )
+
+
+async def _get_metadata(source: str, song_id: str):
+    # 优先使用已缓存的 info（包括客户端通过 ?info= 内嵌上传的 musicInfo）
+    cache = await config.getCacheAsync('info', f'{source}_{song_id}')
+    if cache:
+        return extract_metadata(cache['data'])
+    try:
+        info = await require(f'modules.{source}.info')(song_id)
+        return extract_metadata(info)
+    except Exception:
+        logger.debug(f'获取 {source}_{song_id} 的歌曲信息失败\n' + traceback.format_exc())
+    return None
+
+
+async def _search(target: str, meta: dict, tolerance: float):
+    try:
+        func = require(f'modules.{target}.search')
+    except AttributeError:
+        return []
+    try:
+        result = await func('song', {'query': meta['keyword'], 'page': 1, 'size': 10})
+    except Exception:
+        logger.debug(f'跨平台搜索失败: {target}\n' + traceback.format_exc())
+        return []
+    field = _id_field.get(target, 'songmid')
+    matched = []
+    for item in result.get('list', []):
+        candidates = [item] + (item.get('subresult') or [])
+        for c in candidates:
+            if c.get(field) and is_match(meta, c, tolerance):
+                matched.append((target, str(c[field])))
+    return matched
+
+
+async def _try_url(target: str, target_id: str, quality: str):
+    try:
+        result = await require(f'modules.{target}.url')(target_id, quality)
+        return result
+    except FailedException as e:
+        logger.debug(f'跨平台候选 {target}_{target_id} 获取失败: {e.args[0] if e.args else e}')
+    except Exception:
+        logger.debug(f'跨平台候选 {target}_{target_id} 获取异常\n' + traceback.format_exc())
+    return None
+
+
+async def resolve_mapped(source: str, song_id: str, quality: str):
+    """使用已缓存的映射直接获取链接，映射失效时返回 None"""
+    if not config.read_config('common.cross_source.enable'):
+        return None
+    mapping = await get_mapping(source, song_id)
+    if not mapping:
+        return None
+    result = await _try_url(mapping['source'], mapping['songId'], quality)
+    if result:
+        metrics.inc('cross_source_total', source=source, target=mapping['source'], result='mapped')
+        return dict(result, source=mapping['source'], songId=mapping['songId'])
+    return None
+
+
+async def resolve(source: str, song_id: str, quality: str):
+    """在其他已启用的平台上查找同一首歌并获取链接，返回 {url, quality, source, songId} 或 None"""
+    if not config.read_config('common.cross_source.enable'):
+        return None
+    cross_config = config.read_config('common.cross_source')
+    tolerance = float(cross_config.get('duration_tolerance', 3))
+    targets = [
+        s for s in (cross_config.get('sources') or [])
+        if s != source and config.read_config(f'module.{s}.enable')
+    ]
+    if not targets:
+        return None
+    meta = await _get_metadata(source, song_id)
+    if not meta or not meta['title']:
+        logger.debug(f'{source}_{song_id} 缺少歌曲信息，跳过跨平台查找')
+        return None
+
+    results = await asyncio.gather(*[_search(t, meta, tolerance) for t in targets])
+    candidates = [c for r in results for c in r]
+    logger.debug(f'{source}_{song_id} 跨平台候选: {candidates}')
+    for target, target_id in candidates:
+        result = await _try_url(target, target_id, quality)
+        if result:
+            logger.info(f'跨平台获取成功: {source}_{song_id} -> {target}_{target_id}')
+            await _save_mapping(source, song_id, target, target_id)
+            metrics.inc('cross_source_total', source=source, target=target, result='success')
+            return dict(result, source=target, songId=target_id)
+    metrics.inc('cross_source_total', source=source, target='-', result='failed')
+    return None
@@ -8,13 +8,19 @@
 # This file is part of the "lx-music-api-server" project.
 
 import os
+import time
+import asyncio
+import tempfile
 import traceback
+import collections
 import ujson as json
 import asyncio.subprocess as asp
 from common import log
 from common import config
 from common import utils
 from common import variable
+from common import scheduler
+from common import metrics
 
 logger = log.log("external_script")
 
@@ -139,24 +145,174 @@ try {
 """
 
 
+# ========= 内嵌 run_external_worker.js 脚本内容 =========
+# 常驻工作进程：每个脚本只 require 一次，之后通过 stdin/stdout 上的逐行 JSON 协议接收调用
+# 请求: {"id": 1, "op": "call", "script": "...", "source": "kw", "songId": "...", "quality": "128k", "info": {}}
+#       {"id": 2, "op": "ping"}
+# 响应: {"id": 1, "code": 0, "data": "https://..."} / {"id": 1, "code": 2, "msg": "..."}
+
+_RUN_WORKER_JS = r"""
+// Persistent node worker for lx-music-api-server
+// Protocol: line-delimited JSON on stdin/stdout, one request/response per line.
+
+const path = require('path');
+const util = require('util');
+const readline = require('readline');
+const http = require('http');
+const https = require('https');
+
+// stdout 只用于协议输出，脚本自身的 console 输出全部转到 stderr
+const writeOut = (obj) => process.stdout.write(JSON.stringify(obj) + '\n');
+console.log = console.info = console.warn = console.debug = (...args) => {
+  process.stderr.write(util.format(...args) + '\n');
+};
+
+function lxRequest(url, options = {}, cb) {
+  try {
+    const lib = url.startsWith('https') ? https : http;
+    const req = lib.request(url, {
+      method: options.method || 'GET',
+      headers: options.headers || {},
+    }, res => {
+      const chunks = [];
+      res.on('data', chunk => chunks.push(chunk));
+      res.on('end', () => {
+        const bodyBuf = Buffer.concat(chunks);
+        let body;
+        try {
+          body = JSON.parse(bodyBuf.toString());
+        } catch {
+          body = bodyBuf.toString();
+        }
+        cb(null, { body, statusCode: res.statusCode, headers: res.headers });
+      });
+    });
+    req.on('error', err => cb(err));
+    if (options.timeout) req.setTimeout(options.timeout, () => req.destroy(new Error('timeout')));
+    if (options.body) req.write(options.body);
+    req.end();
+  } catch (err) {
+    cb(err);
+  }
+}
+
+const EVENT_NAMES = {
+  request: 'request',
+  inited: 'inited',
+  updateAlert: 'updateAlert',
+};
+
+// 每个脚本拥有独立的 lx 对象与事件监听表，互不干扰
+function createLx(listeners) {
+  return {
+    EVENT_NAMES,
+    env: 'server',
+    version: 'external',
+    request: lxRequest,
+    on: (name, cb) => { listeners[name] = cb; },
+    send: async (name, payload) => {
+      if (typeof listeners[name] === 'function') {
+        return await listeners[name](payload);
+      }
+    },
+    utils: {
+      buffer: {
+        from: (...args) => Buffer.from(...args),
+        bufToString: (buf, enc) => buf.toString(enc),
+      },
+    },
+  };
+}
+
+const scripts = {};
+
+function loadScript(scriptPath) {
+  const key = path.resolve(scriptPath);
+  if (scripts[key]) return scripts[key];
+  const listeners = {};
+  const lx = createLx(listeners);
+  globalThis.lx = lx;
+  require(key);
+  scripts[key] = lx;
+  return lx;
+}
+
+async function handle(msg) {
+  if (msg.op === 'ping') {
+    return { id: msg.id, code: 0, data: 'pong', loaded: Object.keys(scripts).length };
+  }
+  if (msg.op !== 'call') {
+    return { id: msg.id, code: 2, msg: 'unknown op: ' + msg.op };
+  }
+  let lx;
+  try {
+    lx = loadScript(msg.script);
+  } catch (e) {
+    return { id: msg.id, code: 2, msg: 'require script error: ' + e.message };
+  }
+  const result = await lx.send(EVENT_NAMES.request, {
+    action: 'musicUrl',
+    source: msg.source,
+    info: {
+      musicInfo: Object.assign({ songmid: msg.songId, hash: msg.songId }, msg.info || {}),
+      type: msg.quality,
+    },
+  });
+  if (!result) return { id: msg.id, code: 2, msg: 'no result' };
+  return { id: msg.id, code: 0, data: result };
+}
+
+readline.createInterface({ input: process.stdin }).on('line', line => {
+  line = line.trim();
+  if (!line) return;
+  let msg;
+  try {
+    msg = JSON.parse(line);
+  } catch (e) {
+    return;
+  }
+  handle(msg)
+    .then(writeOut)
+    .catch(err => writeOut({ id: msg.id, code: 2, msg: err && err.message ? err.message : String(err) }));
+});
+
+process.stdin.on('end', () => process.exit(0));
+process.on('uncaughtException', err => process.stderr.write('uncaughtException: ' + (err && err.stack) + '\n'));
+process.on('unhandledRejection', err => process.stderr.write('unhandledRejection: ' + String(err) + '\n'));
+"""
+
+
 async def _ensure_script_download(url: str, force: bool = False) -> str | None:
     """下载脚本；force=True 时即使已存在也会重新下载覆盖。返回本地路径或 None"""
     filename = utils.createMD5(url.encode()) + '.js'
     filepath = os.path.join(_ext_script_dir, filename)
     if os.path.exists(filepath) and not force:
         return filepath
+    # 先写入同目录下的临时文件，完整下载后再替换，下载失败或被取消时不会留下不完整的脚本
+    fd, tmppath = tempfile.mkstemp(suffix='.tmp', prefix=filename + '.', dir=_ext_script_dir)
     try:
         async with variable.aioSession.get(url, timeout=20) as resp:
             if resp.status == 200:
-                with open(filepath, 'wb') as f:
+                with os.fdopen(fd, 'wb') as f:
+                    fd = None
                     async for chunk in resp.content.iter_chunked(8192):
                         f.write(chunk)
+                os.replace(tmppath, filepath)
+                tmppath = None
                 logger.info(f"external script downloaded: {url} -> {filepath}")
                 return filepath
             else:
                 logger.warning(f"download script failed({resp.status}): {url}")
     except Exception:
         logger.warning(f"download script exception: {url}\n" + traceback.format_exc())
+    finally:
+        if fd is not None:
+            os.close(fd)
+        if tmppath is not None:
+            try:
+                os.remove(tmppath)
+            except OSError:
+                pass
     return None
 
 
@@ -179,8 +335,273 @@ def _locate_run_external_js() -> str | None:
         return None
 
 
-async def _run_node_script(script_path: str, source: str, song_id: str, quality: str, info_dict: dict | None):
+def _locate_run_worker_js() -> str | None:
+    """写入内嵌的 run_external_worker.js，内容变化时覆盖旧文件。"""
+    target_path = os.path.join(_ext_script_dir, 'run_external_worker.js')
+    try:
+        if os.path.exists(target_path):
+            with open(target_path, 'r', encoding='utf-8') as f:
+                if f.read() == _RUN_WORKER_JS:
+                    return os.path.abspath(target_path)
+        with open(target_path, 'w', encoding='utf-8') as f:
+            f.write(_RUN_WORKER_JS)
+        logger.info(f'run_external_worker.js 已写入: {target_path}')
+        return os.path.abspath(target_path)
+    except Exception as e:
+        logger.error(f'写入 run_external_worker.js 失败: {e}')
+        return None
+
+
+class NodeWorker:
+    """单个常驻 node 工作进程，按请求 id 将响应分发给等待中的调用方。"""
+
+    def __init__(self, runner_js: str):
+        self.runner_js = runner_js
+        self.proc = None
+        self.served = 0
+        self.retiring = False
+        self._seq = 0
+        self._pending: dict[int, asyncio.Future] = {}
+        self._reader_task = None
+        self._stderr_task = None
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        # 单行 JSON 可能较大（脚本返回的链接带长签名），放宽 StreamReader 行长度限制
+        self.proc = await asp.create_subprocess_exec(
+            'node', self.runner_js,
+            stdin=asp.PIPE, stdout=asp.PIPE, stderr=asp.PIPE,
+            limit=1024 * 1024,
+        )
+        self._reader_task = asyncio.create_task(self._read_stdout())
+        self._stderr_task = asyncio.create_task(self._read_stderr())
+        logger.debug(f'node worker started, pid: {self.proc.pid}')
+
+    async def _read_stdout(self):
+        try:
+            while True:
+                line = await self.proc.stdout.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line.decode(errors='ignore'))
+                except Exception:
+                    logger.debug(f'node worker 输出无法解析: {line[:200]}')
+                    continue
+                fut = self._pending.pop(msg.get('id'), None)
+                if fut and not fut.done():
+                    fut.set_result(msg)
+        except Exception:
+            logger.debug('node worker reader error\n' + traceback.format_exc())
+        finally:
+            # 进程退出，所有等待中的调用立即失败
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionResetError('node worker exited'))
+            self._pending.clear()
+
+    async def _read_stderr(self):
+        try:
+            while True:
+                line = await self.proc.stderr.readline()
+                if not line:
+                    break
+                logger.debug(f"external script stderr: {line.decode(errors='ignore').rstrip()}")
+        except Exception:
+            pass
+
+    async def request(self, payload: dict, timeout: float) -> dict:
+        if not self.alive:
+            raise ConnectionResetError('node worker is not running')
+        self._seq += 1
+        req_id = self._seq
+        payload['id'] = req_id
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[req_id] = fut
+        try:
+            self.proc.stdin.write((json.dumps(payload, ensure_ascii=False) + '\n').encode('utf-8'))
+            await self.proc.stdin.drain()
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self._pending.pop(req_id, None)
+
+    async def ping(self, timeout: float = 5) -> bool:
+        try:
+            res = await self.request({'op': 'ping'}, timeout)
+            return res.get('code') == 0
+        except Exception:
+            return False
+
+    async def close(self):
+        if self.proc is None:
+            return
+        try:
+            if self.proc.returncode is None:
+                self.proc.stdin.close()
+                try:
+                    await asyncio.wait_for(self.proc.wait(), 3)
+                except asyncio.TimeoutError:
+                    self.proc.kill()
+                    await self.proc.wait()
+        except ProcessLookupError:
+            pass
+        except Exception:
+            logger.debug('close node worker error\n' + traceback.format_exc())
+        for t in (self._reader_task, self._stderr_task):
+            if t:
+                t.cancel()
+        logger.debug(f'node worker stopped, pid: {self.proc.pid}, served: {self.served}')
+
+
+class NodeWorkerPool:
+    """常驻 node 工作进程池。
+
+    - size: 工作进程数量，调用时选择待处理请求最少的进程
+    - max_concurrency: 同时在途的脚本调用上限
+    - max_requests: 单个进程处理该数量的调用后被回收并替换
+    - timeout: 单次调用超时，超时的进程视为卡死并被替换
+    """
+
+    def __init__(self, runner_js: str, size: int = 2, max_concurrency: int = 8, max_requests: int = 500, timeout: float = 15):
+        self.runner_js = runner_js
+        self.size = max(1, int(size))
+        self.max_requests = max(0, int(max_requests))
+        self.timeout = timeout
+        self.workers: list[NodeWorker] = []
+        self._semaphore = asyncio.Semaphore(max(1, int(max_concurrency)))
+        self._lock = asyncio.Lock()
+        self._closed = False
+
+    async def _spawn(self) -> NodeWorker:
+        worker = NodeWorker(self.runner_js)
+        await worker.start()
+        self.workers.append(worker)
+        return worker
+
+    async def _acquire_worker(self) -> NodeWorker:
+        async with self._lock:
+            self.workers = [w for w in self.workers if w.alive and not w.retiring]
+            while len(self.workers) < self.size:
+                await self._spawn()
+            return min(self.workers, key=lambda w: w.pending)
+
+    def _retire_soon(self, worker: NodeWorker, wait: bool = True):
+        # 在调度回收任务之前同步标记，任务开始执行之前新的调用也不会再选中该进程
+        worker.retiring = True
+        asyncio.create_task(self._retire(worker, wait))
+
+    async def _retire(self, worker: NodeWorker, wait: bool = True):
+        worker.retiring = True
+        async with self._lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+        if wait:
+            # 等待在途调用完成后再关闭
+            deadline = time.time() + self.timeout
+            while worker.pending and time.time() < deadline:
+                await asyncio.sleep(0.1)
+        await worker.close()
+
+    async def run(self, script_path: str, source: str, song_id: str, quality: str, info_dict: dict | None):
+        if self._closed:
+            return None
+        async with self._semaphore:
+            worker = await self._acquire_worker()
+            worker.served += 1
+            try:
+                return await worker.request({
+                    'op': 'call',
+                    'script': script_path,
+                    'source': source,
+                    'songId': song_id,
+                    'quality': quality,
+                    'info': info_dict or {},
+                }, self.timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f'[externalScript] 工作进程调用超时({self.timeout}s)，回收进程 pid={worker.proc.pid}')
+                self._retire_soon(worker, wait=False)
+                return None
+            except ConnectionResetError:
+                logger.warning('[externalScript] 工作进程已退出，将在下次调用时重建')
+                return None
+            finally:
+                if self.max_requests and worker.served >= self.max_requests and not worker.retiring:
+                    logger.debug(f'node worker 已处理 {worker.served} 次调用，回收 pid={worker.proc.pid}')
+                    self._retire_soon(worker)
+
+    async def health_check(self):
+        for worker in list(self.workers):
+            if worker.retiring:
+                continue
+            if not (worker.alive and await worker.ping()):
+                logger.warning('[externalScript] 工作进程健康检查失败，已替换')
+                await self._retire(worker, wait=False)
+        async with self._lock:
+            while (not self._closed) and len(self.workers) < self.size:
+                await self._spawn()
+
+    async def reload(self):
+        """脚本文件更新后替换所有工作进程：node 的 require 缓存会一直保留已加载的旧脚本；
+        旧进程在途的调用完成后关闭，新的调用由重新启动的进程处理"""
+        async with self._lock:
+            workers, self.workers = self.workers, []
+            for worker in workers:
+                worker.retiring = True
+        if workers:
+            logger.info(f'[externalScript] 外部脚本已更新，替换 {len(workers)} 个工作进程')
+        await asyncio.gather(*[self._retire(w) for w in workers], return_exceptions=True)
+
+    async def close(self):
+        self._closed = True
+        workers, self.workers = self.workers, []
+        await asyncio.gather(*[w.close() for w in workers], return_exceptions=True)
+
+
+_worker_pool: NodeWorkerPool | None = None
+
+
+def _get_worker_pool() -> NodeWorkerPool | None:
+    global _worker_pool
+    if not config.read_config('common.external_scripts.worker_pool.enable'):
+        return None
+    if _worker_pool is None:
+        runner_js = _locate_run_worker_js()
+        if runner_js is None:
+            return None
+        pool_config = config.read_config('common.external_scripts.worker_pool')
+        _worker_pool = NodeWorkerPool(
+            runner_js,
+            size=pool_config.get('size', 2),
+            max_concurrency=pool_config.get('max_concurrency', 8),
+            max_requests=pool_config.get('max_requests', 500),
+            timeout=pool_config.get('timeout', 15),
+        )
+    return _worker_pool
+
+
+async def _worker_pool_health_check():
+    if _worker_pool is not None:
+        await _worker_pool.health_check()
+
+
+async def close_worker_pool():
+    global _worker_pool
+    if _worker_pool is not None:
+        await _worker_pool.close()
+        _worker_pool = None
+
+
+async def _run_node_script(script_path: str, source: str, song_id: str, quality: str, info_dict: dict | None, timeout: float | None = None):
     """调用 node 子进程执行脚本，返回解析后的 JSON。"""
+    if timeout is None:
+        timeout = config.read_config('common.external_scripts.worker_pool.timeout') or 15
     try:
         info_json = json.dumps(info_dict or {}, ensure_ascii=False)
         runner_js = _locate_run_external_js()
@@ -198,7 +619,18 @@ async def _run_node_script(script_path: str, source: str, song_id: str, quality:
             info_json,
         ]
         proc = await asp.create_subprocess_exec(*cmd, stdout=asp.PIPE, stderr=asp.PIPE)
-        stdout, stderr = await proc.communicate()
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # 超时或竞速中被取消时结束子进程，避免残留
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            logger.warning(f'[externalScript] 脚本执行超时({timeout}s): {script_path}')
+            return None
         if stderr:
             logger.debug(f"external script stderr: {stderr.decode(errors='ignore')}")
         if stdout:
@@ -217,33 +649,189 @@ async def _run_node_script(script_path: str, source: str, song_id: str, quality:
     return None
 
 
+async def _call_script(script_path: str, source: str, song_id: str, quality: str, info_dict: dict | None):
+    """优先使用常驻工作进程池，未启用或 node 不可用时回退到单次子进程。"""
+    try:
+        pool = _get_worker_pool()
+        if pool is not None:
+            return await pool.run(script_path, source, song_id, quality, info_dict)
+    except FileNotFoundError:
+        logger.error('Node.js 未安装或未在 PATH 中，无法使用 external script fallback')
+        return None
+    except Exception:
+        logger.debug('node worker pool error, fallback to spawn\n' + traceback.format_exc())
+    return await _run_node_script(script_path, source, song_id, quality, info_dict)
+
+
+class _ScriptScore:
+    """记录某个脚本在某个平台上最近若干次调用的成功率与耗时，用于竞速排序。"""
+
+    def __init__(self, window: int):
+        self.records = collections.deque(maxlen=max(1, window))
+
+    def add(self, ok: bool, latency: float):
+        self.records.append((ok, latency))
+
+    @property
+    def success_rate(self) -> float:
+        # 拉普拉斯平滑：没有记录的新脚本按 50% 计算，不会一直排在最后
+        success = sum(1 for ok, _ in self.records if ok)
+        return (success + 1) / (len(self.records) + 2)
+
+    @property
+    def latency(self) -> float:
+        latencies = [t for ok, t in self.records if ok]
+        if not latencies:
+            return 0.0
+        return sum(latencies) / len(latencies)
+
+    @property
+    def cost(self) -> float:
+        # 期望耗时：成功一次平均需要的时间，越小越优先
+        return (self.latency or 1.0) / self.success_rate
+
+    def to_dict(self):
+        return {
+            'calls': len(self.records),
+            'success_rate': round(self.success_rate, 3),
+            'latency': round(self.latency, 3),
+            'cost': round(self.cost, 3),
+        }
+
+
+# _script_scores[(url, source)] = _ScriptScore
+_script_scores: dict[tuple[str, str], _ScriptScore] = {}
+
+
+def _get_score(url: str, source: str) -> _ScriptScore:
+    key = (url, source)
+    score = _script_scores.get(key)
+    if score is None:
+        window = config.read_config('common.external_scripts.race.window') or 50
+        score = _script_scores[key] = _ScriptScore(int(window))
+    return score
+
+
+def _rank_scripts(urls: list[str], source: str) -> list[str]:
+    # 按期望耗时升序，相同时保持配置顺序
+    return sorted(urls, key=lambda u: (_get_score(u, source).cost, urls.index(u)))
+
+
+def _valid_result(result) -> bool:
+    return bool(result and isinstance(result, dict) and result.get('code') == 0 and result.get('data'))
+
+
+async def _attempt_script(url: str, source: str, song_id: str, quality: str):
+    """下载（如需要）并执行单个脚本，记录成功率/耗时，返回有效结果或 None。"""
+    start = time.time()
+    ok = False
+    cancelled = False
+    try:
+        local_path = await _ensure_script_download(url)
+        if not local_path:
+            logger.info(f"[externalScript] 下载失败/跳过: {url}")
+            return None
+        logger.debug(f"[externalScript] 执行脚本文件: {local_path}")
+        result = await _call_script(local_path, source, song_id, quality, {'songmid': song_id, 'hash': song_id})
+        logger.debug(f"[externalScript] 脚本返回({url}): {result}")
+        ok = _valid_result(result)
+        return result if ok else None
+    except asyncio.CancelledError:
+        # 被其他更快的脚本抢先，不计入统计
+        cancelled = True
+        metrics.inc('external_script_calls_total', script=url, source=source, result='cancelled')
+        raise
+    finally:
+        latency = time.time() - start
+        if not cancelled:
+            _get_score(url, source).add(ok, latency)
+            metrics.inc('external_script_calls_total', script=url, source=source, result='success' if ok else 'failed')
+            metrics.observe('external_script_latency_seconds', latency, script=url, source=source)
+
+
+async def _race_scripts(urls: list[str], source: str, song_id: str, quality: str):
+    """对冲执行：立即启动排名第一的脚本，每过 hedge_delay 仍无结果就追加下一个，取最先成功的结果并取消其余任务。"""
+    race_config = config.read_config('common.external_scripts.race') or {}
+    hedge_delay = float(race_config.get('hedge_delay', 1.5))
+    deadline = time.time() + float(race_config.get('timeout', 20))
+    queue = list(urls)
+    running: dict[asyncio.Task, str] = {}
+
+    def launch():
+        url = queue.pop(0)
+        logger.info(f"[externalScript] 尝试脚本来源: {url}")
+        running[asyncio.create_task(_attempt_script(url, source, song_id, quality))] = url
+
+    launch()
+    try:
+        while running:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                logger.info('[externalScript] 脚本竞速超时')
+                metrics.inc('external_script_race_total', source=source, result='timeout')
+                return None
+            wait_time = min(hedge_delay, remaining) if queue else remaining
+            done, _ = await asyncio.wait(running.keys(), timeout=wait_time, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                url = running.pop(task)
+                result = task.result() if not task.cancelled() else None
+                if result:
+                    logger.info(f"[externalScript] 获取成功({url}) --> {result['data']}")
+                    metrics.inc('external_script_race_total', source=source, result='success')
+                    return result
+                logger.info(f'[externalScript] 未得到有效结果: {url}')
+            if queue and (not done or not running):
+                # 到达对冲延迟，或者当前没有在执行的脚本时，启动下一个
+                if running:
+                    metrics.inc('external_script_hedges_total', source=source)
+                launch()
+        metrics.inc('external_script_race_total', source=source, result='failed')
+        return None
+    finally:
+        for task in running:
+            task.cancel()
+
+
 async def try_external_script(source: str, song_id: str, quality: str):
-    """遍历配置的外部脚本，尝试获取播放链接，并输出详细日志。"""
+    """按历史表现排序并竞速执行配置的外部脚本，返回最先获取到的播放链接。"""
     urls: list[str] = config.read_config('common.external_scripts.urls') or []
     if not urls:
         logger.info('[externalScript] external_scripts.urls 未配置，跳过')
         return None
-    for url in urls:
-        logger.info(f"[externalScript] 尝试脚本来源: {url}")
-        local_path = await _ensure_script_download(url)
-        if not local_path:
-            logger.info(f"[externalScript] 下载失败/跳过: {url}")
-            continue
-        logger.info(f"[externalScript] 执行脚本文件: {local_path}")
-        result = await _run_node_script(local_path, source, song_id, quality, {'songmid': song_id, 'hash': song_id})
-        logger.info(f"[externalScript] 脚本返回: {result}")
-        if result and isinstance(result, dict) and result.get('code') == 0 and result.get('data'):
-            logger.info(f"[externalScript] 获取成功 --> {result['data']}")
-            return {
-                'url': result['data'],
-                'quality': result.get('quality', quality),
-            }
-        else:
+    ranked = _rank_scripts(urls, source)
+    if config.read_config('common.external_scripts.race.enable'):
+        result = await _race_scripts(ranked, source, song_id, quality)
+    else:
+        result = None
+        for url in ranked:
+            logger.info(f"[externalScript] 尝试脚本来源: {url}")
+            result = await _attempt_script(url, source, song_id, quality)
+            if result:
+                break
             logger.info('[externalScript] 未得到有效结果，继续下一个脚本')
+    if result:
+        return {
+            'url': result['data'],
+            'quality': result.get('quality', quality),
+        }
     logger.info('[externalScript] 所有脚本尝试失败')
     return None
 
 
+def _collect_metrics():
+    return {
+        'scores': {f'{url}|{source}': score.to_dict() for (url, source), score in _script_scores.items()},
+        'worker_pool': {
+            'workers': len(_worker_pool.workers),
+            'pending': sum(w.pending for w in _worker_pool.workers),
+            'served': [w.served for w in _worker_pool.workers],
+        } if _worker_pool is not None else None,
+    }
+
+
+metrics.register_collector('external_script', _collect_metrics)
+
+
 # 主动刷新所有脚本（启动时调用）
 async def refresh_external_scripts():
     urls: list[str] = config.read_config('common.external_scripts.urls') or []
@@ -253,4 +841,13 @@ async def refresh_external_scripts():
     logger.info('[externalScript] 正在刷新外部脚本...')
     for url in urls:
         await _ensure_script_download(url, force=True)
-    logger.info('[externalScript] 外部脚本刷新完成')
\ No newline at end of file
+    # 常驻工作进程已经 require 过的脚本不会重新加载，需要替换进程
+    if _worker_pool is not None:
+        await _worker_pool.reload()
+    logger.info('[externalScript] 外部脚本刷新完成')
+
+
+if (config.read_config('common.external_scripts.worker_pool.enable')):
+    scheduler.append('external_script_worker_health_check', _worker_pool_health_check,
+                     int(config.read_config('common.external_scripts.worker_pool.health_check_interval') or 60),
+                     every_worker=True)
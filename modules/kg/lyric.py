@@ -12,83 +12,84 @@ from common.utils import encodeURI, createBase64Decode
 from .musicInfo import getMusicInfo
 from common import Httpx
 import ujson as json
+import collections
 import zlib
 import re
 
-class ParseTools:
-    def __init__(self):
-        self.head_exp = r'^.*\[id:\$\w+\]\n'
+_HEAD_EXP = re.compile(r'^.*\[id:\$\w+\]\n')
+_LANGUAGE_EXP = re.compile(r'\[language:([\w=\\/+]+)\]')
+_LANGUAGE_LINE_EXP = re.compile(r'\[language:[\w=\\/+]+\]\n')
+_TIME_TAG_EXP = re.compile(r'\[((\d+),\d+)\]')
+_WORD_TAG_EXP = re.compile(r'<(\d+,\d+),\d+>')
+_LX_WORD_TAG_EXP = re.compile(r'<\d+,\d+>')
 
+class ParseTools:
     def parse(self, string):
         string = string.replace('\r', '')
-        if re.match(self.head_exp, string):
-            string = re.sub(self.head_exp, '', string)
-        trans = re.search(r'\[language:([\w=\\/+]+)\]', string)
-        lyric = None
+        head = _HEAD_EXP.match(string)
+        if head:
+            string = string[head.end():]
         rlyric = None
         tlyric = None
-        if trans:
-            string = re.sub(r'\[language:[\w=\\/+]+\]\n', '', string)
-            decoded_trans = createBase64Decode(trans.group(1)).decode('utf-8')
-            trans_json = json.loads(decoded_trans)
-            for item in trans_json['content']:
-                if item['type'] == 0:
-                    rlyric = item['lyricContent']
-                elif item['type'] == 1:
-                    tlyric = item['lyricContent']
-        self.i = 0
-        lxlyric = re.sub(r'\[((\d+),\d+)\].*', lambda x: self.process_lyric_match(x, rlyric, tlyric, self.i), string)
-        rlyric = '\n'.join(rlyric) if rlyric else ''
-        tlyric = '\n'.join(tlyric) if tlyric else ''
-        lxlyric = re.sub(r'<(\d+,\d+),\d+>', r'<\1>', lxlyric)
-        lyric = re.sub(r'<\d+,\d+>', '', lxlyric)
+        if '[language:' in string:
+            trans = _LANGUAGE_EXP.search(string)
+            if trans:
+                string = _LANGUAGE_LINE_EXP.sub('', string)
+                decoded_trans = createBase64Decode(trans.group(1)).decode('utf-8')
+                trans_json = json.loads(decoded_trans)
+                for item in trans_json['content']:
+                    if item['type'] == 0:
+                        rlyric = item['lyricContent']
+                    elif item['type'] == 1:
+                        tlyric = item['lyricContent']
+
+        # 逐行处理：行时间 [开始,时长] 转为 [mm:ss.ms]，同时生成同一行的翻译与罗马音
+        lines = string.split('\n')
+        rlines = []
+        tlines = []
+        i = 0
+        for n, line in enumerate(lines):
+            match = _TIME_TAG_EXP.search(line)
+            if match is None:
+                continue
+            time = int(match.group(2))
+            seconds = time // 1000
+            time_string = f'{str(seconds // 60).zfill(2)}:{str(seconds % 60).zfill(2)}.{time % 1000}'
+            if tlyric and i < len(tlyric):
+                tlines.append(f'[{time_string}]{"".join(tlyric[i])}')
+            if rlyric and i < len(rlyric):
+                words = rlyric[i]
+                text = ''.join(words)
+                if ' ' not in text:
+                    text = ' '.join(r.strip() for r in words)
+                rlines.append(f'[{time_string}]{text}'.replace('  ', ' '))
+            start = match.start()
+            lines[n] = line[:start] + line[start:].replace(match.group(1), time_string)
+            i += 1
+
+        # 逐字时间 <偏移,时长,0> 转为 <偏移,时长>；使用 split 而不是模板替换，避免每个标签展开一次替换模板
+        parts = _WORD_TAG_EXP.split('\n'.join(lines))
+        parts[1::2] = ['<' + tag + '>' for tag in parts[1::2]]
+        lxlyric = ''.join(parts)
+        lyric = _LX_WORD_TAG_EXP.sub('', lxlyric)
         return {
             'lyric': lyric,
-            'tlyric': tlyric,
-            'rlyric': rlyric,
+            'tlyric': '\n'.join(tlines),
+            'rlyric': '\n'.join(rlines),
             'lxlyric': lxlyric
         }
 
-    def process_lyric_match(self, match, rlyric, tlyric, i):
-        result = re.match(r'\[((\d+),\d+)\].*', match.group(0))
-        time = int(result.group(2))
-        ms = time % 1000
-        time /= 1000
-        m = str(int(time / 60)).zfill(2)
-        time %= 60
-        s = str(int(time)).zfill(2)
-        time_string = f'{m}:{s}.{ms}'
-        transformed_t = ''
-        if (tlyric):
-            for t in tlyric[i]:
-                transformed_t += t
-            tlyric[i] = transformed_t
-        if (rlyric):
-            nr = []
-            for r in rlyric[i]:
-                nr.append(r)
-            _tnr = ''.join(nr)
-            if (' ' in _tnr):
-                rlyric[i] = _tnr
-            else:
-                nr = []
-                for r in rlyric[i]:
-                    nr.append(r.strip())
-                rlyric[i] = ' '.join(nr)
-        if rlyric:
-            rlyric[i] = f'[{time_string}]{rlyric[i] if rlyric[i] else ""}'.replace('  ', ' ')
-        if tlyric:
-            tlyric[i] = f'[{time_string}]{tlyric[i] if tlyric[i] else ""}'
-        self.i += 1
-        return re.sub(result.group(1), time_string, match.group(0))
-
 global_parser = ParseTools()
 
+_KRC_KEY = bytes((64, 71, 97, 119, 94, 50, 116, 71, 81, 54, 49, 45, 206, 210, 110, 105))
+
 def krcDecode(a:bytes):
-    encrypt_key = (64, 71, 97, 119, 94, 50, 116, 71, 81, 54, 49, 45, 206, 210, 110, 105)
     content = a[4:] # krc1
-    compress_content = bytes(content[i] ^ encrypt_key[i % len(encrypt_key)] for i in range(len(content)))
-    text_bytes = zlib.decompress(bytes(compress_content))
+    # 整段数据与重复的密钥一起转换为大整数后异或，避免逐字节处理
+    size = len(content)
+    key = (_KRC_KEY * (size // len(_KRC_KEY) + 1))[:size]
+    compress_content = (int.from_bytes(content, 'little') ^ int.from_bytes(key, 'little')).to_bytes(size, 'little')
+    text_bytes = zlib.decompress(compress_content)
     text = text_bytes.decode("utf-8")
     return text
 
@@ -110,7 +111,16 @@ async def lyricSearchByHash(hash_):
         raise FailedException('歌词获取失败: 当前歌曲无歌词')
     return body['candidates']
 
+# 解析结果缓存: _lyric_cache[(lyric_id, accesskey)] = 解析结果
+_lyric_cache = collections.OrderedDict()
+_lyric_cache_size = 256
+
 async def getLyric(lyric_id, accesskey):
+    key = (str(lyric_id), accesskey)
+    cached = _lyric_cache.get(key)
+    if cached is not None:
+        _lyric_cache.move_to_end(key)
+        return dict(cached)
     req = await Httpx.AsyncRequest(f'https://lyrics.kugou.com/download?ver=1&client=pc&id={lyric_id}&accesskey={accesskey}', {
         'method': 'GET',
     })
@@ -120,4 +130,8 @@ async def getLyric(lyric_id, accesskey):
     content = createBase64Decode(body['content'])
     content = krcDecode(content)
 
-    return global_parser.parse(content)
\ No newline at end of file
+    result = global_parser.parse(content)
+    _lyric_cache[key] = result
+    while len(_lyric_cache) > _lyric_cache_size:
+        _lyric_cache.popitem(last=False)
+    return dict(result)
\ No newline at end of file
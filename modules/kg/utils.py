@@ -16,17 +16,22 @@ import json
 createObject = utils.CreateObject
 
 
+def _configured_tools():
+    return {
+        "signkey": config.read_config("module.kg.client.signatureKey"),
+        "pidversec": config.read_config("module.kg.client.pidversionsecret"),
+        "clientver": config.read_config("module.kg.client.clientver"),
+        "x-router": config.read_config("module.kg.tracker.x-router"),
+        "url": config.read_config("module.kg.tracker.host") + config.read_config("module.kg.tracker.path"),
+        "version": config.read_config("module.kg.tracker.version"),
+        "extra_params": config.read_config("module.kg.tracker.extra_params"),
+        "appid": config.read_config("module.kg.client.appid"),
+        'mid': config.read_config('module.kg.user.mid'),
+        "pid": config.read_config("module.kg.client.pid"),
+    }
+
 tools = createObject({
-    "signkey": config.read_config("module.kg.client.signatureKey"),
-    "pidversec": config.read_config("module.kg.client.pidversionsecret"),
-    "clientver": config.read_config("module.kg.client.clientver"),
-    "x-router": config.read_config("module.kg.tracker.x-router"),
-    "url": config.read_config("module.kg.tracker.host") + config.read_config("module.kg.tracker.path"),
-    "version": config.read_config("module.kg.tracker.version"),
-    "extra_params": config.read_config("module.kg.tracker.extra_params"),
-    "appid": config.read_config("module.kg.client.appid"),
-    'mid': config.read_config('module.kg.user.mid'),
-    "pid": config.read_config("module.kg.client.pid"),
+    **_configured_tools(),
     'qualityHashMap': {
         '128k': 'hash_128',
         '320k': 'hash_320',
@@ -43,6 +48,13 @@ tools = createObject({
     },
 })
 
+@config.subscribe
+def _reload_config():
+    # 原地更新，已经 import 了 tools 的模块也能读到新值
+    for k, v in _configured_tools().items():
+        tools[k] = v
+        setattr(tools, k, createObject(v) if isinstance(v, dict) else v)
+
 def buildSignatureParams(dictionary, body = ""):
     joined_str = ''.join([f'{k}={v}' for k, v in dictionary.items()])
     return joined_str + body
@@ -51,14 +63,15 @@ def buildRequestParams(dictionary: dict):
     joined_str = '&'.join([f'{k}={v}' for k, v in dictionary.items()])
     return joined_str
 
-def sign(params, body = "", signkey = tools["signkey"]):
+def sign(params, body = "", signkey = None):
+    signkey = signkey or tools["signkey"]
     if (isinstance(body, dict)):
         body = json.dumps(body)
     params = utils.sortDict(params)
     params = buildSignatureParams(params, body)
     return utils.createMD5(signkey + params + signkey)
 
-async def signRequest(url, params, options, signkey = tools["signkey"]):
+async def signRequest(url, params, options, signkey = None):
     params['signature'] = sign(params, options.get("body") if options.get("body") else (options.get("data") if options.get("data") else (options.get("json") if options.get("json") else "")), signkey)
     url = url + "?" + buildRequestParams(params)
     return await Httpx.AsyncRequest(url, options)
@@ -7,8 +7,7 @@
 # ----------------------------------------
 # This file is part of the "lx-music-api-server" project.
 
-import random
-from common import Httpx, config, variable
+from common import Httpx, config, cookie_pool
 from common.exceptions import FailedException
 from common.utils import CreateObject
 from .encrypt import base64_encrypt
@@ -41,33 +40,38 @@ tools = {
 async def url(songId, quality):
     proto = config.read_config('module.kw.proto')
     if (proto == 'bd-api'):
-        user_info = config.read_config('module.kw.user') if (not variable.use_cookie_pool) else random.choice(config.read_config('module.cookiepool.kw'))
-        target_url = f'''https://bd-api.kuwo.cn/api/service/music/downloadInfo/{songId}?isMv=0&format={tools['extMap'][quality]}&br={tools['qualityMap'][quality]}&uid={user_info['uid']}&token={user_info['token']}'''
-        req = await Httpx.AsyncRequest(target_url, {
-            'method': 'GET',
-            'headers': {
-                'User-Agent': 'Dart/2.14 (dart:io)',
-                'channel': 'qq',
-                'plat': 'ar',
-                'net': 'wifi',
-                'ver': '3.1.2',
-                'uid': user_info['uid'],
-                'devId': user_info['device_id'],
-            }
-        })
-        try:
-            body = req.json()
-            data = body['data']
+        async with cookie_pool.use('kw') as user_info:
+            target_url = f'''https://bd-api.kuwo.cn/api/service/music/downloadInfo/{songId}?isMv=0&format={tools['extMap'][quality]}&br={tools['qualityMap'][quality]}&uid={user_info['uid']}&token={user_info['token']}'''
+            req = await Httpx.AsyncRequest(target_url, {
+                'method': 'GET',
+                'headers': {
+                    'User-Agent': 'Dart/2.14 (dart:io)',
+                    'channel': 'qq',
+                    'plat': 'ar',
+                    'net': 'wifi',
+                    'ver': '3.1.2',
+                    'uid': user_info['uid'],
+                    'devId': user_info['device_id'],
+                }
+            })
+            try:
+                body = req.json()
+                data = body['data']
 
-            if (body['code'] != 200) or (int(data['audioInfo']['bitrate']) == 1):
-                raise FailedException('failed')
+                if (body['code'] != 200):
+                    raise FailedException('failed')
+                # 只有试听音质时是歌曲本身的问题，不计入账号的失败次数
+                if (int(data['audioInfo']['bitrate']) == 1):
+                    raise FailedException('failed', reason='song_unavailable')
 
-            return {
-                'url': data['url'].split('?')[0],
-                'quality': tools['qualityMapReverse'][int(data['audioInfo']['bitrate'])]
-            }
-        except:
-            raise FailedException('failed')
+                return {
+                    'url': data['url'].split('?')[0],
+                    'quality': tools['qualityMapReverse'][int(data['audioInfo']['bitrate'])]
+                }
+            except FailedException:
+                raise
+            except:
+                raise FailedException('failed')
     elif (proto == 'kuwodes'):
         des_info = config.read_config('module.kw.des')
         params = des_info['params'].format(
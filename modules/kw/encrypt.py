@@ -14,6 +14,12 @@
 # in http://www.gnu.org/licenses/gpl-3.0.html
 
 import base64
+import functools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 DES_MODE_DECRYPT = 1
 
@@ -128,6 +134,9 @@ matrixNSBox = [[
 
 SECRET_KEY = b'ylzsxkwm'
 
+_MASK32 = 0xFFFFFFFF
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
 
 def bit_transform(arr_int, n, l):
     l2 = 0
@@ -138,37 +147,47 @@ def bit_transform(arr_int, n, l):
     return l2
 
 
+# —— 查表实现 ——
+# 置换的每个输出位只取决于一个输入位，可以按输入字节拆开：
+# tables[b][v] 为第 b 个输入字节取值 v（其余字节为 0）时的置换结果，整个置换等于各字节查表结果的按位或
+# 原实现中的有符号 64 位整数在这里统一按无符号处理，输出字节不变
+
+def _byte_tables(arr_int, n, in_bytes):
+    bits = [bit_transform(arr_int, n, 1 << i) & _MASK64 for i in range(in_bytes * 8)]
+    tables = []
+    for b in range(in_bytes):
+        table = [0] * 256
+        for v in range(1, 256):
+            low = v & -v
+            table[v] = table[v ^ low] | bits[b * 8 + low.bit_length() - 1]
+        tables.append(table)
+    return tables
+
+
+_IP0, _IP1, _IP2, _IP3, _IP4, _IP5, _IP6, _IP7 = _byte_tables(arrayIP, 64, 8)
+_FP0, _FP1, _FP2, _FP3, _FP4, _FP5, _FP6, _FP7 = _byte_tables(arrayIP_1, 64, 8)
+_E0, _E1, _E2, _E3 = _byte_tables(arrayE, 64, 4)
+# S 盒与 P 置换合并：E 扩展与子密钥的每个字节只使用低 6 位，
+# _SPj[v] 为第 j 个 S 盒输入 v 时经过 P 置换后的结果
+_SP0, _SP1, _SP2, _SP3, _SP4, _SP5, _SP6, _SP7 = [
+    [bit_transform(arrayP, 32, matrixNSBox[j][v] << j * 4) & _MASK32 for v in range(64)]
+    for j in range(8)
+]
+
+
 def DES64(longs, l):
-    out = 0
-    SOut = 0
-    pR = [0] * 8
-    pSource = [0, 0]
-    sbi = 0
-    t = 0
-    L = 0
-    R = 0
-    out = bit_transform(arrayIP, 64, l)
-    pSource[0] = 0xFFFFFFFF & out
-    pSource[1] = (-4294967296 & out) >> 32
-    for i in range(16):
-        R = pSource[1]
-        R = bit_transform(arrayE, 64, R)
-        R ^= longs[i]
-        for j in range(8):
-            pR[j] = 255 & R >> j * 8
-        SOut = 0
-        for sbi in range(7, -1, -1):
-            SOut <<= 4
-            SOut |= matrixNSBox[sbi][pR[sbi]]
-
-        R = bit_transform(arrayP, 32, SOut)
-        L = pSource[0]
-        pSource[0] = pSource[1]
-        pSource[1] = L ^ R
-    pSource = pSource[::-1]
-    out = -4294967296 & pSource[1] << 32 | 0xFFFFFFFF & pSource[0]
-    out = bit_transform(arrayIP_1, 64, out)
-    return out
+    x = l & _MASK64
+    out = (_IP0[x & 255] | _IP1[x >> 8 & 255] | _IP2[x >> 16 & 255] | _IP3[x >> 24 & 255]
+           | _IP4[x >> 32 & 255] | _IP5[x >> 40 & 255] | _IP6[x >> 48 & 255] | _IP7[x >> 56])
+    L = out & _MASK32
+    R = out >> 32
+    for k in longs:
+        e = (_E0[R & 255] | _E1[R >> 8 & 255] | _E2[R >> 16 & 255] | _E3[R >> 24]) ^ k
+        L, R = R, L ^ (_SP0[e & 63] | _SP1[e >> 8 & 63] | _SP2[e >> 16 & 63] | _SP3[e >> 24 & 63]
+                       | _SP4[e >> 32 & 63] | _SP5[e >> 40 & 63] | _SP6[e >> 48 & 63] | _SP7[e >> 56 & 63])
+    x = L << 32 | R
+    return (_FP0[x & 255] | _FP1[x >> 8 & 255] | _FP2[x >> 16 & 255] | _FP3[x >> 24 & 255]
+            | _FP4[x >> 32 & 255] | _FP5[x >> 40 & 255] | _FP6[x >> 48 & 255] | _FP7[x >> 56])
 
 
 def sub_keys(l, longs, n):
@@ -183,55 +202,102 @@ def sub_keys(l, longs, n):
         j += 1
 
 
-def encrypt(msg, key=SECRET_KEY):
-    if isinstance(msg, str):
-        msg = msg.encode()
+@functools.lru_cache(maxsize=16)
+def key_schedule(key=SECRET_KEY):
+    """16 轮子密钥，密钥固定，只计算一次"""
     if isinstance(key, str):
         key = key.encode()
-    assert (isinstance(msg, bytes))
     assert (isinstance(key, bytes))
-
-    # 处理密钥块
     l = 0
     for i in range(8):
         l = l | key[i] << i * 8
+    longs = [0] * 16
+    sub_keys(l, longs, 0)
+    return tuple(k & _MASK64 for k in longs)
 
-    j = len(msg) // 8
-    # arrLong1 存放的是转换后的密钥块, 在解密时只需要把这个密钥块反转就行了
-    arrLong1 = [0] * 16
-    sub_keys(l, arrLong1, 0)
-    # arrLong2 存放的是前部分的明文
-    arrLong2 = [0] * j
-    for m in range(j):
-        for n in range(8):
-            arrLong2[m] |= msg[n + m * 8] << n * 8
-
-    # 用于存放密文
-    arrLong3 = [0] * ((1 + 8 * (j + 1)) // 8)
-    # 计算前部的数据块(除了最后一部分)
-    for i1 in range(j):
-        arrLong3[i1] = DES64(arrLong1, arrLong2[i1])
-
-    # 保存多出来的字节
-    arrByte1 = msg[j*8:]
-    l2 = 0
-    for i1 in range(len(msg) % 8):
-        l2 |= arrByte1[i1] << i1 * 8
-    # 计算多出的那一位(最后一位)
-    arrLong3[j] = DES64(arrLong1, l2)
 
-    # 将密文转为字节型
-    arrByte2 = [0] * (8 * len(arrLong3))
-    i4 = 0
-    for l3 in arrLong3:
-        for i6 in range(8):
-            arrByte2[i4] = (255 & l3 >> i6 * 8)
-            i4 += 1
-    return arrByte2
+def _pad(msg):
+    # 最后一个数据块用 0 补齐，长度刚好是 8 的倍数时额外加密一个全 0 的数据块
+    return msg + b'\0' * (8 - len(msg) % 8)
+
+
+def encrypt_bytes(msg, key=SECRET_KEY):
+    if isinstance(msg, str):
+        msg = msg.encode()
+    assert (isinstance(msg, bytes))
+    keys = key_schedule(key)
+    data = _pad(msg)
+    out = bytearray(len(data))
+    for i in range(0, len(data), 8):
+        out[i:i + 8] = DES64(keys, int.from_bytes(data[i:i + 8], 'little')).to_bytes(8, 'little')
+    return bytes(out)
+
+
+def encrypt(msg, key=SECRET_KEY):
+    return list(encrypt_bytes(msg, key))
 
 
 def base64_encrypt(msg):
-    b1 = encrypt(msg)
-    b2 = bytearray(b1)
-    s = base64.encodebytes(b2)
-    return s.replace(b'\n', b'').decode()
+    return base64.b64encode(encrypt_bytes(msg)).decode()
+
+
+# —— numpy 批量模式 ——
+# 所有字符串的数据块放在一个 uint64 数组中，每一步查表对整个数组进行，适合一次加密大量参数
+# 数据块较少时 numpy 的调用开销大于计算本身，请直接使用 base64_encrypt
+
+_np_tables = None
+
+
+def _get_np_tables():
+    global _np_tables
+    if _np_tables is None:
+        def arr(tables):
+            return np.array(tables, dtype=np.uint64)
+        _np_tables = (
+            arr([_IP0, _IP1, _IP2, _IP3, _IP4, _IP5, _IP6, _IP7]),
+            arr([_FP0, _FP1, _FP2, _FP3, _FP4, _FP5, _FP6, _FP7]),
+            arr([_E0, _E1, _E2, _E3]),
+            arr([_SP0, _SP1, _SP2, _SP3, _SP4, _SP5, _SP6, _SP7]),
+        )
+    return _np_tables
+
+
+def _np_lookup(tables, x, mask):
+    out = tables[0][x & mask]
+    for b in range(1, len(tables)):
+        out |= tables[b][(x >> np.uint64(b * 8)) & mask]
+    return out
+
+
+def _des64_numpy(keys, blocks):
+    ip, fp, e_tables, sp = _get_np_tables()
+    m8 = np.uint64(255)
+    m6 = np.uint64(63)
+    s32 = np.uint64(32)
+    out = _np_lookup(ip, blocks, m8)
+    L = out & np.uint64(_MASK32)
+    R = out >> s32
+    for k in keys:
+        e = _np_lookup(e_tables, R, m8) ^ np.uint64(k)
+        L, R = R, L ^ _np_lookup(sp, e, m6)
+    return _np_lookup(fp, (L << s32) | R, m8)
+
+
+def encrypt_many(msgs, key=SECRET_KEY):
+    """批量加密，返回与 msgs 顺序一致的密文列表；未安装 numpy 时逐个加密"""
+    data = [m.encode() if isinstance(m, str) else m for m in msgs]
+    if np is None or not data:
+        return [encrypt_bytes(m, key) for m in data]
+    padded = [_pad(m) for m in data]
+    blocks = np.frombuffer(b''.join(padded), dtype='<u8').astype(np.uint64)
+    raw = _des64_numpy(key_schedule(key), blocks).astype('<u8').tobytes()
+    result = []
+    offset = 0
+    for m in padded:
+        result.append(raw[offset:offset + len(m)])
+        offset += len(m)
+    return result
+
+
+def base64_encrypt_many(msgs):
+    return [base64.b64encode(b).decode() for b in encrypt_many(msgs)]
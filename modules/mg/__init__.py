@@ -7,10 +7,9 @@
 # ----------------------------------------
 # This file is part of the "lx-music-api-server" project.
 
-import random
 from common import Httpx
 from common import config
-from common import variable
+from common import cookie_pool
 from common.exceptions import FailedException
 from . import refresh_login # 删了这个定时任务会寄掉
 
@@ -36,31 +35,36 @@ async def url(songmid, quality):
     infobody = info_request.json()
     if infobody["code"] != "000000":
         raise FailedException("failed to fetch song info")
-    user_info = config.read_config('module.mg.user') if (not variable.use_cookie_pool) else random.choice(config.read_config('module.cookiepool.mg'))
-    req = await Httpx.AsyncRequest(f'https://m.music.migu.cn/migumusic/h5/play/auth/getSongPlayInfo?type={tools["qualityMap"][quality]}&copyrightId={infobody["resource"][0]["copyrightId"]}', {
-        'method': 'GET',
-        'headers': {
-            'User-Agent': user_info['useragent'],
-            "by": user_info["by"],
-            "Cookie": "SESSION=" + user_info["session"],
-            "Referer": "https://m.music.migu.cn/v4/",
-            "Origin": "https://m.music.migu.cn",
-        },
-    })
-    try:
-        body = req.json()
+    async with cookie_pool.use('mg') as user_info:
+        req = await Httpx.AsyncRequest(f'https://m.music.migu.cn/migumusic/h5/play/auth/getSongPlayInfo?type={tools["qualityMap"][quality]}&copyrightId={infobody["resource"][0]["copyrightId"]}', {
+            'method': 'GET',
+            'headers': {
+                'User-Agent': user_info['useragent'],
+                "by": user_info["by"],
+                "Cookie": "SESSION=" + user_info["session"],
+                "Referer": "https://m.music.migu.cn/v4/",
+                "Origin": "https://m.music.migu.cn",
+            },
+        })
+        try:
+            body = req.json()
 
-        if (int(body['code']) != 200 or (not body.get("data")) or (not body["data"]["playUrl"])):
-            raise FailedException(body.get("msg") if body.get("msg") else "failed")
+            if (int(body['code']) != 200):
+                raise FailedException(body.get("msg") if body.get("msg") else "failed")
+            # 请求成功但没有播放链接时是歌曲本身的问题，不计入账号的失败次数
+            if ((not body.get("data")) or (not body["data"]["playUrl"])):
+                raise FailedException(body.get("msg") if body.get("msg") else "failed", reason='song_unavailable')
 
-        data = body["data"]
+            data = body["data"]
 
-        return {
-            'url': body["data"]["playUrl"].split("?")[0] if body["data"]["playUrl"].split("?")[0].startswith("http") else "http:" + body["data"]["playUrl"].split("?")[0],
-            'quality': tools['qualityMapReverse'].get(data['formatId']) if (tools['qualityMapReverse'].get(data['formatId'])) else "unknown",
-        }
-    except:
-        raise FailedException('failed')
+            return {
+                'url': body["data"]["playUrl"].split("?")[0] if body["data"]["playUrl"].split("?")[0].startswith("http") else "http:" + body["data"]["playUrl"].split("?")[0],
+                'quality': tools['qualityMapReverse'].get(data['formatId']) if (tools['qualityMapReverse'].get(data['formatId'])) else "unknown",
+            }
+        except FailedException:
+            raise
+        except:
+            raise FailedException('failed')
 
 # ========================
 # TODO: Lyrics API placeholder
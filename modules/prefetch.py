@@ -0,0 +1,198 @@
+# ----------------------------------------
+# - mode: python -
+# - author: helloplhm-qwq -
+# - name: prefetch.py -
+# - project: lx-music-api-server -
+# - license: MIT -
+# ----------------------------------------
+# This file is part of the "lx-music-api-server" project.
+
+# 预取接下来要播放的歌曲：客户端通过 POST /prefetch 提交播放列表中接下来的歌曲，
+# 或者根据请求记录学习同一客户端常见的 "上一首 -> 下一首"，请求某首歌时预取最可能的下一首。
+# 预取在后台以低优先级执行：有较多正在处理的请求时等待，且每分钟解析的数量受 budget 限制；
+# 已缓存的歌曲不消耗额度。可选地同时下载音频，不下载时推迟到客户端真正请求该歌曲时再下载
+
+import time
+import asyncio
+import contextvars
+import collections
+import traceback
+from common import log
+from common import config
+from common import metrics
+from common.rate_limit import MemoryBackend
+from common.utils import require
+
+logger = log.log('prefetch')
+
+# 单首歌曲记录的后继数量上限
+MAX_SUCCESSORS = 8
+# 等待空闲的最长时间（秒），超时后放弃本次预取
+IDLE_WAIT = 10
+
+# 当前协程是否在执行预取，由 modules.url 在决定是否下载音频时读取
+_prefetching = contextvars.ContextVar('prefetching', default=False)
+
+_queue = None
+_queued = set()
+_workers = []
+_active = 0
+_budget = MemoryBackend(max_keys=1)
+# 预取时推迟下载的音频: (source, songId, quality) -> 实际音质
+_deferred = collections.OrderedDict()
+# 各客户端最近请求的歌曲: client -> ((source, songId), time)
+_last_played = collections.OrderedDict()
+# 歌曲之间的转移次数: (source, songId) -> {(source, songId): count}
+_transitions = collections.OrderedDict()
+
+
+def enabled():
+    return bool(config.read_config('common.prefetch.enable'))
+
+
+def _settings():
+    return config.read_config('common.prefetch') or {}
+
+
+def _key(source, songId, quality):
+    songId = str(songId)
+    # 与 modules.url 一致，酷狗的歌曲 ID 统一为小写
+    return (source, songId.lower() if source == 'kg' else songId, quality)
+
+
+def enqueue(source, songId, quality):
+    """加入预取队列，已在队列中或队列已满时返回 False"""
+    if not enabled():
+        return False
+    key = _key(source, songId, quality)
+    if key in _queued:
+        return False
+    _ensure_workers()
+    try:
+        _queue.put_nowait(key)
+    except asyncio.QueueFull:
+        metrics.inc('prefetch_total', result='dropped')
+        return False
+    _queued.add(key)
+    return True
+
+
+def _ensure_workers():
+    global _queue
+    if _queue is None:
+        settings = _settings()
+        _queue = asyncio.Queue(maxsize=max(1, int(settings.get('max_pending', 100))))
+        for _ in range(max(1, int(settings.get('concurrency', 2)))):
+            _workers.append(asyncio.create_task(_worker()))
+
+
+async def _worker():
+    while True:
+        key = await _queue.get()
+        try:
+            result = await _prefetch(*key)
+            metrics.inc('prefetch_total', result=result)
+            logger.debug('预取 %s_%s_%s: %s', *key, result)
+        except Exception:
+            metrics.inc('prefetch_total', result='error')
+            logger.debug('预取失败\n' + traceback.format_exc())
+        finally:
+            _queued.discard(key)
+            _queue.task_done()
+
+
+async def _wait_idle(modules):
+    """等待正在处理的非预取请求少于 busy_threshold"""
+    threshold = max(1, int(_settings().get('busy_threshold', 4)))
+    deadline = time.monotonic() + IDLE_WAIT
+    while len(modules._inflight_urls) - _active >= threshold:
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.2)
+    return True
+
+
+async def _prefetch(source, songId, quality):
+    global _active
+    modules = require('modules')
+    if modules._find_cached_file(source, songId, quality):
+        return 'cached'
+    settings = _settings()
+    cache = await config.getCacheAsync('urls', f'{source}_{songId}_{quality}')
+    if cache:
+        if settings.get('download'):
+            modules.cache_audio(source, songId, quality, cache['url'])
+        return 'cached'
+    if not await _wait_idle(modules):
+        return 'busy'
+    budget = float(settings.get('budget', 60))
+    if budget > 0 and not (await _budget.acquire('prefetch', budget / 60, budget))[0]:
+        return 'over_budget'
+    token = _prefetching.set(True)
+    _active += 1
+    try:
+        res = await modules.url(source, songId, quality)
+    finally:
+        _active -= 1
+        _prefetching.reset(token)
+    return 'success' if res.get('code') == 0 else 'failed'
+
+
+def defer_download(source, songId, quality, result_quality):
+    """预取且不预下载音频时记录下来并返回 True，由调用方跳过下载"""
+    if not _prefetching.get() or _settings().get('download'):
+        return False
+    _deferred[(source, songId, quality)] = result_quality
+    while len(_deferred) > int(_settings().get('max_pending', 100)) * 10:
+        _deferred.popitem(last=False)
+    return True
+
+
+def take_deferred(source, songId, quality):
+    """客户端请求了预取时推迟下载的歌曲，返回需要下载的音质，否则返回 None"""
+    if not _deferred or _prefetching.get():
+        return None
+    return _deferred.pop((source, songId, quality), None)
+
+
+def predict(source, songId, top=1, min_count=1):
+    """根据学习到的转移次数返回最可能的下一首 [(source, songId), ...]"""
+    successors = _transitions.get((source, str(songId)))
+    if not successors:
+        return []
+    ranked = sorted(successors.items(), key=lambda item: item[1], reverse=True)
+    return [song for song, count in ranked[:top] if count >= min_count]
+
+
+def observe(client, source, songId, quality):
+    """记录客户端请求的歌曲，学习连续播放的顺序，并预取当前歌曲最可能的下一首"""
+    if not enabled():
+        return
+    learn = _settings().get('learn') or {}
+    if not learn.get('enable'):
+        return
+    song = (source, str(songId))
+    now = time.time()
+    max_songs = max(1, int(learn.get('max_songs', 10000)))
+    prev = _last_played.pop(client, None)
+    _last_played[client] = (song, now)
+    while len(_last_played) > max_songs:
+        _last_played.popitem(last=False)
+    if prev and prev[0] != song and now - prev[1] <= float(learn.get('window', 600)):
+        successors = _transitions.pop(prev[0], None) or {}
+        _transitions[prev[0]] = successors
+        successors[song] = successors.get(song, 0) + 1
+        if len(successors) > MAX_SUCCESSORS:
+            del successors[min(successors, key=successors.get)]
+        while len(_transitions) > max_songs:
+            _transitions.popitem(last=False)
+    for next_source, next_id in predict(source, songId, int(learn.get('top', 1)), int(learn.get('min_count', 2))):
+        enqueue(next_source, next_id, quality)
+
+
+metrics.register_collector('prefetch', lambda: {
+    'queued': len(_queued),
+    'active': _active,
+    'deferred_downloads': len(_deferred),
+    'learned_songs': len(_transitions),
+})
@@ -13,8 +13,14 @@ from common.exceptions import FailedException
 from common.utils import createBase64Decode
 from common import variable
 from common import qdes
+import collections
 import re
 
+_WORD_TIME_EXP = re.compile(r'\(\d+,\d+\)')
+_WORD_TIME_SPLIT_EXP = re.compile(r'\((\d+),(\d+)\)')
+_INTV_SPLIT_EXP = re.compile(r':|\.')
+_UNSET = object()
+
 class ParseTools:
     def __init__(self):
         self.rxps = {
@@ -39,40 +45,35 @@ class ParseTools:
         lrc = lrc.strip().replace('\r', '')
         if not lrc:
             return {'lyric': '', 'lxlyric': ''}
-        # print(lrc)
-        
-        lines = lrc.split('\n')
+
+        lineTime = self.rxps['lineTime']
+        lineTime2 = self.rxps['lineTime2']
         lxlrcLines = []
         lrcLines = []
 
-        for line in lines:
+        for line in lrc.split('\n'):
             line = line.strip()
-            result = self.rxps['lineTime'].match(line)
+            result = lineTime.match(line)
             if not result:
                 if line.startswith('[offset'):
                     lxlrcLines.append(line)
                     lrcLines.append(line)
-                if self.rxps['lineTime2'].match(line):
+                if lineTime2.match(line):
                     lrcLines.append(line)
                 continue
 
             startMsTime = int(result.group(1))
             startTimeStr = self.msFormat(startMsTime)
-            if not startTimeStr:
-                continue
-
-            words = re.sub(self.rxps['lineTime'], '', line)
 
-            lrcLines.append(f'{startTimeStr}{re.sub(self.rxps["wordTimeAll"], "", words)}')
-
-            times = re.findall(self.rxps['wordTimeAll'], words)
-            if not times:
-                continue
-            _rxp = r"\((\d+),(\d+)\)"
-            times = [f'''<{max(int(re.search(_rxp, time).group(1)) - startMsTime, 0)},{re.search(_rxp, time).group(2)}>''' for time in times]
-            wordArr = re.split(self.rxps['wordTime'], words)
-            newWords = ''.join([f'{time}{wordArr[index]}' for index, time in enumerate(times)])
-            lxlrcLines.append(f'{startTimeStr}{newWords}')
+            # 逐字时间标签在对应文字之后: 文字(开始,时长)
+            # split 的结果为 [文字, 开始, 时长, 文字, 开始, 时长, ..., 末尾文字]，一次切分同时生成普通歌词与逐字歌词
+            parts = _WORD_TIME_SPLIT_EXP.split(line[result.end():])
+            lrcLines.append(startTimeStr + ''.join(parts[::3]))
+            if len(parts) > 1:
+                lxlrcLines.append(startTimeStr + ''.join([
+                    f'<{max(int(start) - startMsTime, 0)},{duration}>{word}'
+                    for word, start, duration in zip(parts[0:-1:3], parts[1::3], parts[2::3])
+                ]))
 
         return {
             'lyric': '\n'.join(lrcLines),
@@ -84,95 +85,78 @@ class ParseTools:
         if not lrc:
             return {'lyric': '', 'lxlyric': ''}
 
-        lines = lrc.split('\n')
+        lineTime = self.rxps['lineTime']
         lrcLines = []
 
-        for line in lines:
+        for line in lrc.split('\n'):
             line = line.strip()
-            result = self.rxps['lineTime'].match(line)
+            result = lineTime.match(line)
             if not result:
                 continue
-
-            startMsTime = int(result.group(1))
-            startTimeStr = self.msFormat(startMsTime)
-            if not startTimeStr:
-                continue
-
-            words = re.sub(self.rxps['lineTime'], '', line)
-            lrcLines.append(f'{startTimeStr}{re.sub(self.rxps["wordTimeAll"], "", words)}')
+            lrcLines.append(self.msFormat(int(result.group(1))) + _WORD_TIME_EXP.sub('', line[result.end():]))
 
         return '\n'.join(lrcLines)
 
     def removeTag(self, string):
-        return re.sub(r'^[\S\s]*?LyricContent="', '', string).replace('"\/>[\S\s]*?$', '')
+        index = string.find('LyricContent="')
+        if index != -1:
+            string = string[index + len('LyricContent="'):]
+        return string.replace(r'"\/>[\S\s]*?$', '')
 
     def getIntv(self, interval):
         if not interval:
             return 0
         if '.' not in interval:
             interval += '.0'
-        arr = re.split(r':|\.', interval)
+        arr = _INTV_SPLIT_EXP.split(interval)
         while len(arr) < 3:
             arr.insert(0, '0')
         m, s, ms = arr
         return int(m) * 3600000 + int(s) * 1000 + int(ms)
 
-    def fixRlrcTimeTag(self, rlrc, lrc):
-        rlrcLines = rlrc.split('\n')
-        lrcLines = lrc.split('\n')
-        newLrc = []
-
-        for line in rlrcLines:
-            result = self.rxps['lineTime2'].match(line)
-            if not result:
-                continue
-            words = re.sub(self.rxps['lineTime2'], '', line)
-            if not words.strip():
-                continue
-            t1 = self.getIntv(result.group(1))
-
-            while lrcLines:
-                lrcLine = lrcLines.pop(0)
-                lrcLineResult = self.rxps['lineTime2'].match(lrcLine)
-                if not lrcLineResult:
-                    continue
-                t2 = self.getIntv(lrcLineResult.group(1))
-                if abs(t1 - t2) < 100:
-                    newLrc.append(re.sub(self.rxps['lineTime2'], lrcLineResult.group(0), line))
-                    break
-
-        return '\n'.join(newLrc)
-
-    def fixTlrcTimeTag(self, tlrc, lrc):
-        tlrcLines = tlrc.split('\n')
-        lrcLines = lrc.split('\n')
+    def _alignTimeTag(self, lines, lrcLines, lrcTimes, padMs):
+        """
+        按顺序为每一行在歌词中找到时间相差 100ms 以内的行，并换成该行的时间标签
+        歌词行只向前移动（双指针），跳过的行不会再被匹配；lrcTimes 为歌词行的 (时间标签, 时间)，按需计算后保存
+        """
+        lineTime2 = self.rxps['lineTime2']
         newLrc = []
+        j = 0
+        count = len(lrcLines)
 
-        for line in tlrcLines:
-            result = self.rxps['lineTime2'].match(line)
+        for line in lines:
+            result = lineTime2.match(line)
             if not result:
                 continue
-            words = re.sub(self.rxps['lineTime2'], '', line)
-            if not words.strip():
+            if not line[result.end():].strip():
                 continue
             time = result.group(1)
-            if '.' in time:
+            if padMs and '.' in time:
                 time += '0' * (3 - len(time.split('.')[1]))
-
             t1 = self.getIntv(time)
 
-            while lrcLines:
-                lrcLine = lrcLines.pop(0)
-                lrcLineResult = self.rxps['lineTime2'].match(lrcLine)
-                if not lrcLineResult:
+            while j < count:
+                lrcTime = lrcTimes[j]
+                if lrcTime is _UNSET:
+                    lrcLineResult = lineTime2.match(lrcLines[j])
+                    lrcTime = lrcTimes[j] = (lrcLineResult.group(0), self.getIntv(lrcLineResult.group(1))) if lrcLineResult else None
+                j += 1
+                if lrcTime is None:
                     continue
-                t2 = self.getIntv(lrcLineResult.group(1))
-                if abs(t1 - t2) < 100:
-                    newLrc.append(re.sub(self.rxps['lineTime2'], lrcLineResult.group(0), line))
+                if abs(t1 - lrcTime[1]) < 100:
+                    newLrc.append(lrcTime[0] + line[result.end():])
                     break
 
         return '\n'.join(newLrc)
 
+    def fixRlrcTimeTag(self, rlrc, lrc):
+        lrcLines = lrc.split('\n')
+        return self._alignTimeTag(rlrc.split('\n'), lrcLines, [_UNSET] * len(lrcLines), False)
+
+    def fixTlrcTimeTag(self, tlrc, lrc):
+        lrcLines = lrc.split('\n')
+        return self._alignTimeTag(tlrc.split('\n'), lrcLines, [_UNSET] * len(lrcLines), True)
+
     def parse(self, lrc, tlrc=None, rlrc=None):
         info = {
             'lyric': '',
@@ -186,11 +170,15 @@ class ParseTools:
             info['lyric'] = parsed_lrc['lyric']
             info['lxlyric'] = parsed_lrc['lxlyric']
 
+        # 翻译与罗马音共用歌词行的时间
+        lrcLines = info['lyric'].split('\n')
+        lrcTimes = [_UNSET] * len(lrcLines)
+
         if rlrc:
-            info['rlyric'] = self.fixRlrcTimeTag(self.parseRlyric(self.removeTag(rlrc)), info['lyric'])
+            info['rlyric'] = self._alignTimeTag(self.parseRlyric(self.removeTag(rlrc)).split('\n'), lrcLines, lrcTimes, False)
 
         if tlrc:
-            info['tlyric'] = self.fixTlrcTimeTag(tlrc, info['lyric'])
+            info['tlyric'] = self._alignTimeTag(tlrc.split('\n'), lrcLines, lrcTimes, True)
 
         return info
 
@@ -199,7 +187,23 @@ global_parser = ParseTools()
 def parseLyric(l, t = '', r = ''):
     return global_parser.parse(l, t, r)
 
+# 解析结果缓存: _lyric_cache[songId] = 解析结果
+_lyric_cache = collections.OrderedDict()
+_lyric_cache_size = 256
+
 async def getLyric(songId):
+    key = str(songId)
+    cached = _lyric_cache.get(key)
+    if cached is not None:
+        _lyric_cache.move_to_end(key)
+        return dict(cached)
+    result = await _getLyric(songId)
+    _lyric_cache[key] = result
+    while len(_lyric_cache) > _lyric_cache_size:
+        _lyric_cache.popitem(last=False)
+    return dict(result)
+
+async def _getLyric(songId):
     # mid and Numberid
     if (re.match("^[0-9]+$", str(songId))):
         songId = int(songId)
@@ -8,47 +8,105 @@
 # This file is part of the "lx-music-api-server" project.
 
 from common.exceptions import FailedException
-from common import config, utils, variable
+from common import config, utils, cookie_pool
 from .musicInfo import getMusicInfo
 from .utils import tools
 from .utils import signRequest
-import random
+import asyncio
 
 createObject = utils.CreateObject
 
+async def _getVkey(songmids, filenames):
+    async with cookie_pool.use('tx') as user_info:
+        requestBody = {
+            "req": {
+                "module": "music.vkey.GetVkey",
+                "method": "UrlGetVkey",
+                "param": {
+                    "filename": filenames,
+                    "guid": config.read_config("module.tx.vkeyserver.guid"),
+                    "songmid": songmids,
+                    "songtype": [0] * len(songmids),
+                    "uin": str(user_info["uin"]),
+                    "loginflag": 1,
+                    "platform": "20",
+                },
+            },
+            "comm": {
+                "qq": str(user_info["uin"]),
+                "authst": user_info["qqmusic_key"],
+                "ct": "26",
+                "cv": "2010101",
+                "v": "2010101"
+            },
+        }
+        req = await signRequest(requestBody)
+        body = createObject(req.json())
+        # 只有上游明确返回错误（登录失效、鉴权失败等）时才计入账号的失败次数；
+        # 歌曲没有链接（purl 为空）是歌曲本身的问题，由 url() 按与账号无关的原因处理，与批次大小无关
+        if (not body.req or body.req.code != 0 or not body.req.data):
+            raise FailedException('failed')
+        return body.req.data.midurlinfo or []
+
+# 等待合并的请求: [(songmid, filename, future)]
+_pending = []
+_flush_handle = None
+
+def _flush():
+    global _flush_handle
+    if (_flush_handle):
+        _flush_handle.cancel()
+        _flush_handle = None
+    batch = _pending[:]
+    _pending.clear()
+    if (batch):
+        asyncio.create_task(_sendBatch(batch))
+
+async def _sendBatch(batch):
+    try:
+        infos = await _getVkey([b[0] for b in batch], [b[1] for b in batch])
+        # 按 songmid 对应结果，上游可能去重、调整顺序或缺少部分歌曲；
+        # 同一首歌请求了多个音质时再按 filename 区分（返回的 filename 可能是降级后的音质）
+        results = {}
+        for info in infos:
+            results.setdefault(info.get('songmid'), []).append(info)
+        for songmid, filename, future in batch:
+            if (future.done()):
+                continue
+            candidates = results.get(songmid)
+            if (not candidates):
+                future.set_exception(FailedException('failed', reason='song_unavailable'))
+                continue
+            future.set_result(next((info for info in candidates if info.get('filename') == filename), candidates[0]))
+    except Exception as e:
+        for _, _, future in batch:
+            if (not future.done()):
+                future.set_exception(e)
+
+async def _getVkeyBatched(songmid, filename):
+    global _flush_handle
+    batch_config = config.read_config('module.tx.vkey_batch')
+    if (not batch_config.get('enable')):
+        infos = await _getVkey([songmid], [filename])
+        if (not infos):
+            raise FailedException('failed', reason='song_unavailable')
+        return infos[0]
+    future = asyncio.get_running_loop().create_future()
+    _pending.append((songmid, filename, future))
+    if (len(_pending) >= int(batch_config.get('max_size', 20))):
+        _flush()
+    elif (_flush_handle is None):
+        _flush_handle = asyncio.get_running_loop().call_later(float(batch_config.get('window', 0.02)), _flush)
+    return await future
+
 async def url(songId, quality):
     infoBody = await getMusicInfo(songId)
     strMediaMid = infoBody['track_info']['file']['media_mid']
-    user_info = config.read_config('module.tx.user') if (not variable.use_cookie_pool) else random.choice(config.read_config('module.cookiepool.tx'))
-    requestBody = {
-        "req": {
-            "module": "music.vkey.GetVkey",
-            "method": "UrlGetVkey",
-            "param": {
-                "filename": [f"{tools.fileInfo[quality]['h']}{strMediaMid}{tools.fileInfo[quality]['e']}"],
-                "guid": config.read_config("module.tx.vkeyserver.guid"),
-                "songmid": [songId],
-                "songtype": [0],
-                "uin": str(user_info["uin"]),
-                "loginflag": 1,
-                "platform": "20",
-            },
-        },
-        "comm": {
-            "qq": str(user_info["uin"]),
-            "authst": user_info["qqmusic_key"],
-            "ct": "26",
-            "cv": "2010101",
-            "v": "2010101"
-        },
-    }
-    req = await signRequest(requestBody)
-    body = createObject(req.json())
-    data = body.req.data.midurlinfo[0]
+    data = await _getVkeyBatched(songId, f"{tools.fileInfo[quality]['h']}{strMediaMid}{tools.fileInfo[quality]['e']}")
     url = data['purl']
 
     if (not url):
-        raise FailedException('failed')
+        raise FailedException('failed', reason='song_unavailable')
 
     resultQuality = data['filename'].split('.')[0][:4]
 
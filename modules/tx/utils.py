@@ -53,6 +53,11 @@ tools = createObject({
     "cdnaddr": config.read_config("module.tx.cdnaddr") if config.read_config("module.tx.cdnaddr") else 'http://ws.stream.qqmusic.qq.com/',
 })
 
+@config.subscribe
+def _reload_config():
+    tools.cdnaddr = config.read_config("module.tx.cdnaddr") if config.read_config("module.tx.cdnaddr") else 'http://ws.stream.qqmusic.qq.com/'
+    tools['cdnaddr'] = tools.cdnaddr
+
 async def signRequest(data, cache = False):
     data = json.dumps(data)
     s = sign(data)
@@ -7,8 +7,7 @@
 # ----------------------------------------
 # This file is part of the "lx-music-api-server" project.
 
-import random
-from common import Httpx, variable
+from common import Httpx, cookie_pool
 from common import config
 from common.exceptions import FailedException
 from .encrypt import eapiEncrypt
@@ -18,6 +17,14 @@ from . import refresh_login
 PROTO = config.read_config("module.wy.proto")
 API_URL = config.read_config("module.wy.ncmapi.api_url")
 
+
+@config.subscribe
+def _reload_config():
+    global PROTO, API_URL
+    PROTO = config.read_config("module.wy.proto")
+    API_URL = config.read_config("module.wy.ncmapi.api_url")
+
+
 tools = {
     'qualityMap': {
         '128k': 'standard',
@@ -60,63 +67,67 @@ async def url(songId, quality):
         }
         if (quality == "sky"):
             requestBody["immerseType"] = "c51"
-        req = await Httpx.AsyncRequest(requestUrl, {
-            'method': 'POST',
-            'headers': {
-                'Cookie': config.read_config('module.wy.user.cookie') if (not variable.use_cookie_pool) else random.choice(config.read_config('module.cookiepool.wy'))['cookie'],
-            },
-            'form': eapiEncrypt(path, json.dumps(requestBody))
-        })
-        body = req.json()
-        if (not body.get("data") or (not body.get("data")) or (not body.get("data")[0].get("url"))):
-            raise FailedException("失败")
+        async with cookie_pool.use('wy') as user_info:
+            req = await Httpx.AsyncRequest(requestUrl, {
+                'method': 'POST',
+                'headers': {
+                    'Cookie': user_info['cookie'],
+                },
+                'form': eapiEncrypt(path, json.dumps(requestBody))
+            })
+            body = req.json()
+            if (not body.get("data") or (not body.get("data")) or (not body.get("data")[0].get("url"))):
+                raise FailedException("失败")
 
-        data = body["data"][0]
+            data = body["data"][0]
         
-        # 修正：映射服务器返回的 level 为标准化值
-        data_level = data['level']
-        expected_level = tools["qualityMap"][quality]
+            # 修正：映射服务器返回的 level 为标准化值
+            data_level = data['level']
+            expected_level = tools["qualityMap"][quality]
     
-        # 检查客户端请求的 quality 与服务器返回的 level 是否匹配
-        if data_level != expected_level:
-            raise FailedException(
-                f"reject unmatched quality: expected={expected_level}, got={data_level}"
-            )
+            # 检查客户端请求的 quality 与服务器返回的 level 是否匹配
+            if data_level != expected_level:
+                raise FailedException(
+                    f"reject unmatched quality: expected={expected_level}, got={data_level}",
+                    reason="quality_mismatch",
+                )
         
-        return {
-            'url': data["url"].split("?")[0],
-            'quality': tools['qualityMapReverse'][data['level']]
-        }
+            return {
+                'url': data["url"].split("?")[0],
+                'quality': tools['qualityMapReverse'][data['level']]
+            }
     elif (PROTO == "ncmapi") and (API_URL):
         requestUrl = f"{API_URL}/song/url/v1"
-        requestBody = {
-            "ids": songId,
-            "level": tools["qualityMap"][quality],
-            "cookie": config.read_config('module.wy.user.cookie') if (not variable.use_cookie_pool) else random.choice(config.read_config('module.cookiepool.wy'))['cookie']
-        }
-        req = await Httpx.AsyncRequest(requestUrl, {
-            "method": "GET",
-            "params": requestBody
-        })
-        body = req.json()
-        if (body["code"] != 200) or (not body.get("data")):
-            raise FailedException("失败")
-        data = body["data"][0]
+        async with cookie_pool.use('wy') as user_info:
+            requestBody = {
+                "ids": songId,
+                "level": tools["qualityMap"][quality],
+                "cookie": user_info['cookie']
+            }
+            req = await Httpx.AsyncRequest(requestUrl, {
+                "method": "GET",
+                "params": requestBody
+            })
+            body = req.json()
+            if (body["code"] != 200) or (not body.get("data")):
+                raise FailedException("失败")
+            data = body["data"][0]
 
-        # 修正：映射服务器返回的 level 为标准化值
-        data_level = data['level']
-        expected_level = tools["qualityMap"][quality]
+            # 修正：映射服务器返回的 level 为标准化值
+            data_level = data['level']
+            expected_level = tools["qualityMap"][quality]
     
-        # 检查客户端请求的 quality 与服务器返回的 level 是否匹配
-        if data_level != expected_level:
-            raise FailedException(
-                f"reject unmatched quality: expected={expected_level}, got={data_level}"
-            )
+            # 检查客户端请求的 quality 与服务器返回的 level 是否匹配
+            if data_level != expected_level:
+                raise FailedException(
+                    f"reject unmatched quality: expected={expected_level}, got={data_level}",
+                    reason="quality_mismatch",
+                )
     
-        return {
-            'url': data["url"].split("?")[0],
-            'quality': quality
-        }
+            return {
+                'url': data["url"].split("?")[0],
+                'quality': quality
+            }
 
 # ========================
 # TODO: Lyrics API placeholder
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线的模拟上游服务器
+按 test/fixtures/upstream 中记录的响应模板回放各平台取链接口（tx musics.fcg、kg v5/url、kw bd-api、
+wy eapi、mg 播放信息），同时提供音频下载与 WebDAV 目录列表，可设置延迟与错误率。
+
+将服务器指向模拟上游（config.yml）:
+    common:
+      upstream_override:
+        u.y.qq.com: "http://127.0.0.1:9800"
+        gateway.kugou.com: "http://127.0.0.1:9800"
+        ...            # 完整的主机列表见 HOSTS
+    module:
+      tx:
+        cdnaddr: "http://127.0.0.1:9800/"
+
+用法（在项目根目录执行）:
+    python test/mock_upstream.py --port 9800 --latency 0.05 --error-rate 0.01
+"""
+
+import os
+import re
+import sys
+import json
+import random
+import asyncio
+import argparse
+import binascii
+from urllib.parse import quote
+
+from aiohttp import web
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'upstream')
+
+# 由模拟上游接管的主机，未记录的接口返回 404，保证压测期间不会访问真实的上游
+HOSTS = (
+    'u.y.qq.com', 'c.y.qq.com', 'y.qq.com', 'y.gtimg.cn', 'ws.stream.qqmusic.qq.com',
+    'gateway.kugou.com', 'lyrics.kugou.com', 'mobilecdnbj.kugou.com', 'expendablekmrcdn.kugou.com',
+    'www.kugou.com', 'm.kugou.com', 'songsearch.kugou.com', 'mips.kugou.com', 'login.user.kugou.com',
+    'bd-api.kuwo.cn', 'nmobi.kuwo.cn',
+    'interface.music.163.com', 'music.163.com',
+    'app.c.nf.migu.cn', 'm.music.migu.cn',
+)
+
+# 与 modules.mg.tools 一致: type -> formatId
+MG_FORMAT = {'1': '000009', '2': '020010', '3': '011002', '4': '011005'}
+WY_EAPI_KEY = b'e82ckenh8dichen8'
+# 最小的 MPEG 帧，足够让下载与缓存流程跑通
+AUDIO = b'\xff\xfb\x90\x64' + b'\x00' * 413
+
+
+def load_fixtures(path=FIXTURES):
+    fixtures = {}
+    for fname in sorted(os.listdir(path)):
+        if fname.endswith('.json'):
+            with open(os.path.join(path, fname), encoding='utf-8') as f:
+                fixtures[fname[:-5]] = json.load(f)
+    return fixtures
+
+
+def render(template, values):
+    """用 values 填充模板中的 {name}，整个字符串只有一个占位符时保留值的类型"""
+    if isinstance(template, dict):
+        return {k: render(v, values) for k, v in template.items()}
+    if isinstance(template, list):
+        return [render(v, values) for v in template]
+    if isinstance(template, str):
+        whole = re.fullmatch(r'\{(\w+)\}', template)
+        if whole and whole.group(1) in values:
+            return values[whole.group(1)]
+        return re.sub(r'\{(\w+)\}', lambda m: str(values.get(m.group(1), m.group(0))), template)
+    return template
+
+
+def decrypt_eapi(params):
+    """解密 eapi 请求的 params，返回其中的 JSON 内容"""
+    from Crypto.Cipher import AES
+    data = AES.new(WY_EAPI_KEY, AES.MODE_ECB).decrypt(binascii.unhexlify(params))
+    data = data[:-data[-1]].decode('utf-8')
+    return json.loads(data.split('-36cd479b6b5-')[1])
+
+
+class MockUpstream:
+    '''
+    模拟上游服务器
+    - latency / jitter: 每个请求固定延迟与额外的随机延迟（秒）
+    - error_rate: 返回 502 的概率
+    - dav_files: WebDAV 目录中的文件 {目录: [文件名, ...]}
+    '''
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 dav_files=None, fixtures=FIXTURES):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.dav_files = dav_files or {}
+        self.fixtures = load_fixtures(fixtures)
+        self.stats = {}
+        self.runner = None
+
+    @property
+    def base(self):
+        return f'http://{self.host}:{self.port}'
+
+    def overrides(self):
+        '''common.upstream_override 的配置值'''
+        return {host: self.base for host in HOSTS}
+
+    async def start(self):
+        app = web.Application(client_max_size=1024 ** 2)
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None, handler_cancellation=True)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def handle(self, request):
+        route = self.route(request)
+        self.stats[route] = self.stats.get(route, 0) + 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if route != 'not_found' and self.error_rate and random.random() < self.error_rate:
+            self.stats['errors'] = self.stats.get('errors', 0) + 1
+            return web.json_response({'code': -1, 'msg': 'mock upstream error'}, status=502)
+        return await getattr(self, 'handle_' + route)(request)
+
+    def route(self, request):
+        path = request.path
+        if request.method == 'PROPFIND':
+            return 'propfind'
+        if path.startswith(('/audio/', '/dav/')):
+            return 'audio'
+        if path == '/cgi-bin/musics.fcg':
+            return 'tx'
+        if path == '/v3/album_audio/audio':
+            return 'kg_info'
+        if path == '/v5/url':
+            return 'kg_url'
+        if path.startswith('/api/service/music/downloadInfo/'):
+            return 'kw'
+        if path == '/eapi/song/enhance/player/url/v1':
+            return 'wy'
+        if path == '/MIGUM2.0/v1.0/content/resourceinfo.do':
+            return 'mg_info'
+        if path == '/migumusic/h5/play/auth/getSongPlayInfo':
+            return 'mg_url'
+        return 'not_found'
+
+    def reply(self, name, **values):
+        values.setdefault('base', self.base)
+        return web.json_response(render(self.fixtures[name], values))
+
+    async def handle_not_found(self, request):
+        return web.json_response({'code': 404, 'msg': 'not recorded'}, status=404)
+
+    async def handle_audio(self, request):
+        return web.Response(body=AUDIO, content_type='audio/mpeg')
+
+    async def handle_propfind(self, request):
+        path = request.path[len('/dav'):].strip('/') if request.path.startswith('/dav') else request.path.strip('/')
+        responses = [f'<D:response><D:href>/dav/{quote(path)}/</D:href><D:propstat><D:prop>'
+                     '<D:resourcetype><D:collection/></D:resourcetype></D:prop></D:propstat></D:response>']
+        for name in self.dav_files.get(path, []):
+            responses.append(f'<D:response><D:href>/dav/{quote(path)}/{quote(name)}</D:href><D:propstat><D:prop>'
+                             f'<D:getcontentlength>{len(AUDIO)}</D:getcontentlength><D:resourcetype/>'
+                             '</D:prop></D:propstat></D:response>')
+        body = '<?xml version="1.0" encoding="utf-8"?><D:multistatus xmlns:D="DAV:">' + ''.join(responses) + '</D:multistatus>'
+        return web.Response(status=207, text=body, content_type='application/xml')
+
+    async def handle_tx(self, request):
+        body = json.loads(await request.text())
+        req = body.get('req', {})
+        param = req.get('param', {})
+        if req.get('module') == 'music.pf_song_detail_svr':
+            return self.reply('tx_song_detail', songId=param.get('song_mid'))
+        if req.get('module') == 'music.vkey.GetVkey':
+            template = self.fixtures['tx_vkey']
+            item = template['req']['data']['midurlinfo'][0]
+            infos = []
+            for songmid, filename in zip(param.get('songmid', []), param.get('filename', [])):
+                infos.append(render(item, {'songId': songmid, 'filename': filename}))
+            data = render(template, {})
+            data['req']['data']['midurlinfo'] = infos
+            return web.json_response(data)
+        return web.json_response({'code': 0, 'req': {'code': -1}})
+
+    async def handle_kg_info(self, request):
+        body = json.loads(await request.text())
+        return self.reply('kg_audio_info', hash=body['data'][0]['hash'].lower())
+
+    async def handle_kg_url(self, request):
+        return self.reply('kg_url', hash=request.query.get('hash', ''))
+
+    async def handle_kw(self, request):
+        song_id = request.path.rsplit('/', 1)[1]
+        br = request.query.get('br', '128kmp3')
+        bitrate = int(re.match(r'\d+', br).group(0))
+        return self.reply('kw_download_info', songId=song_id, bitrate=bitrate,
+                          format=request.query.get('format', 'mp3'))
+
+    async def handle_wy(self, request):
+        form = await request.post()
+        params = decrypt_eapi(form['params'])
+        song_id = json.loads(params['ids'])[0]
+        return self.reply('wy_player_url', songId=song_id, level=params['level'])
+
+    async def handle_mg_info(self, request):
+        return self.reply('mg_resource_info', songId=request.query.get('copyrightId', ''))
+
+    async def handle_mg_url(self, request):
+        format_id = MG_FORMAT.get(request.query.get('type'), MG_FORMAT['1'])
+        return self.reply('mg_play_info', songId=request.query.get('copyrightId', ''), formatId=format_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟上游服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9800)
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='额外的随机延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 502 的概率')
+    args = parser.parse_args()
+
+    async def run():
+        mock = await MockUpstream(args.host, args.port, args.latency, args.jitter, args.error_rate).start()
+        sys.stdout.write(f'模拟上游已启动: {mock.base}\n')
+        sys.stdout.write(json.dumps({'upstream_override': mock.overrides()}, indent=2) + '\n')
+        sys.stdout.flush()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await mock.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试上游熔断器
+验证连续失败后熔断、恢复时间后只放行探测请求，以及探测请求被取消时归还探测名额
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入 common.config 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    from common import Httpx, variable, circuit_breaker
+    from common.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+finally:
+    os.chdir(_cwd)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    # 跳过恢复时间
+    breaker.opened_at = time.time() - breaker.recovery_time
+
+
+def test_open_and_recover():
+    breaker = CircuitBreaker('example.com', failure_threshold=3, recovery_time=30)
+    open_breaker(breaker)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # 探测请求进行中时不放行其他请求
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker('example.com', failure_threshold=3, recovery_time=30)
+    open_breaker(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+class HangingSession:
+    '''请求一直挂起，直到被取消'''
+    def get(self, url, **options):
+        return asyncio.sleep(3600)
+
+
+def test_cancelled_probe_releases_slot():
+    breaker = CircuitBreaker('upstream.example.com', failure_threshold=3, recovery_time=30)
+    open_breaker(breaker)
+    circuit_breaker._breakers[breaker.name] = breaker
+    old_session = variable.aioSession
+    variable.aioSession = HangingSession()
+
+    async def probe():
+        task = asyncio.ensure_future(Httpx.AsyncRequest('https://upstream.example.com/api', {'headers': {}}))
+        await asyncio.sleep(0.05)
+        assert breaker.half_open_calls == 1
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        asyncio.run(probe())
+    finally:
+        variable.aioSession = old_session
+        circuit_breaker._breakers.pop(breaker.name, None)
+    # 被取消的探测请求不计入失败，下一个请求可以继续探测
+    assert breaker.state == HALF_OPEN
+    assert breaker.half_open_calls == 0
+    assert breaker.allow()
+
+
+if __name__ == '__main__':
+    test_open_and_recover()
+    test_failed_probe_reopens()
+    test_cancelled_probe_releases_slot()
+    print('熔断器测试通过')
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试响应压缩中间件
+验证 Accept-Encoding 协商、最小压缩大小、音频与文件响应不压缩，以及歌词/信息响应的压缩结果缓存
+"""
+
+import os
+import sys
+import gzip
+import asyncio
+import tempfile
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer, TestClient
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入 common.config 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+_tmpdir = tempfile.mkdtemp()
+os.chdir(_tmpdir)
+try:
+    from common import compression
+finally:
+    os.chdir(_cwd)
+
+LYRIC = ('{"code":0,"msg":"success","data":{"lyric":"' + '[00:01.00]歌词 lyric line\\n' * 200 + '"}}').encode('utf-8')
+
+
+class MockConfig:
+    def __init__(self, **settings):
+        self.settings = {'enable': True, 'min_size': 1024, 'gzip_level': 6, 'brotli': True,
+                         'brotli_level': 5, 'cache_size': 4}
+        self.settings.update(settings)
+
+    def read_config(self, key):
+        return self.settings if key == 'common.compression' else None
+
+
+async def handle_method(request):
+    return web.Response(body=LYRIC, content_type='application/json')
+
+
+async def handle_small(request):
+    return web.Response(body=b'{"code":0}', content_type='application/json')
+
+
+async def handle_audio(request):
+    return web.Response(body=b'\x00' * 4096, content_type='audio/mpeg')
+
+
+async def handle_file(request):
+    path = os.path.join(_tmpdir, 'file.json')
+    with open(path, 'wb') as f:
+        f.write(LYRIC)
+    return web.FileResponse(path)
+
+
+def make_app():
+    app = web.Application(middlewares=[compression.handle_compression])
+    app.router.add_get('/small', handle_small)
+    app.router.add_get('/audio', handle_audio)
+    app.router.add_get('/file', handle_file)
+    app.router.add_get('/{method}/{source}/{songId}', handle_method)
+    return app
+
+
+def run(coro_func, **settings):
+    compression.config = MockConfig(**settings)
+    compression._cache.clear()
+
+    async def runner():
+        client = TestClient(TestServer(make_app()))
+        await client.start_server()
+        try:
+            return await coro_func(client)
+        finally:
+            await client.close()
+
+    return asyncio.run(runner())
+
+
+async def raw_get(client, path, accept):
+    resp = await client.get(path, headers={'Accept-Encoding': accept}, auto_decompress=False)
+    return resp, await resp.read()
+
+
+def test_parse_accept_encoding():
+    assert compression.parse_accept_encoding('gzip, deflate, br') == {'gzip', 'deflate', 'br'}
+    assert compression.parse_accept_encoding('gzip;q=0, br;q=0.5') == {'br'}
+    assert compression.parse_accept_encoding('') == set()
+    settings = MockConfig().settings
+    assert compression.negotiate('gzip;q=0', settings) is None
+    assert compression.negotiate('gzip', settings) == 'gzip'
+    if compression.brotli is None:
+        assert compression.negotiate('br', settings) is None
+    else:
+        assert compression.negotiate('gzip, br', settings) == 'br'
+
+
+def test_gzip_negotiation():
+    async def check(client):
+        resp, body = await raw_get(client, '/info/tx/1', 'gzip')
+        assert resp.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in resp.headers['Vary']
+        assert gzip.decompress(body) == LYRIC
+        assert len(body) < len(LYRIC)
+
+        resp, body = await raw_get(client, '/info/tx/1', 'identity')
+        assert 'Content-Encoding' not in resp.headers
+        assert body == LYRIC
+        # aiohttp 客户端默认自动解压
+        resp = await client.get('/lyric/tx/1', headers={'Accept-Encoding': 'gzip'})
+        assert await resp.read() == LYRIC
+
+    run(check, brotli=False)
+
+
+def test_skip_small_audio_and_files():
+    async def check(client):
+        for path in ('/small', '/audio', '/file'):
+            resp, body = await raw_get(client, path, 'gzip')
+            assert 'Content-Encoding' not in resp.headers, path
+        resp, body = await raw_get(client, '/file', 'gzip')
+        assert body == LYRIC
+
+    run(check)
+
+
+def test_disabled():
+    async def check(client):
+        resp, body = await raw_get(client, '/lyric/tx/1', 'gzip')
+        assert 'Content-Encoding' not in resp.headers
+        assert body == LYRIC
+
+    run(check, enable=False)
+
+
+def test_cached_methods():
+    calls = []
+    original = compression.compress
+
+    def counting_compress(body, encoding, settings):
+        calls.append(encoding)
+        return original(body, encoding, settings)
+
+    async def check(client):
+        for _ in range(3):
+            resp, body = await raw_get(client, '/lyric/tx/1', 'gzip')
+            assert gzip.decompress(body) == LYRIC
+        await raw_get(client, '/url/tx/1', 'gzip')
+        await raw_get(client, '/url/tx/1', 'gzip')
+
+    compression.compress = counting_compress
+    try:
+        run(check, brotli=False)
+    finally:
+        compression.compress = original
+    # 歌词只压缩一次，其他接口每次压缩
+    assert calls == ['gzip', 'gzip', 'gzip']
+
+
+if __name__ == '__main__':
+    test_parse_accept_encoding()
+    test_gzip_negotiation()
+    test_skip_small_audio_and_files()
+    test_disabled()
+    test_cached_methods()
+    print('响应压缩测试通过')
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 cookie 池账号选择
+验证失败账号按指数退避暂停使用、按健康程度加权选择、每秒使用次数限制，
+use() 对与账号无关的失败原因不计数，以及 tx 取链失败时区分账号失效与歌曲本身的问题
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+from collections import Counter
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入 common.config 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    from common import cookie_pool, variable, config
+    from common.exceptions import FailedException
+    from modules.tx import player as tx_player
+finally:
+    os.chdir(_cwd)
+
+POOL = [{'userid': '1', 'token': 'a'}, {'userid': '2', 'token': 'b'}, {'userid': '3', 'token': 'c'}]
+TX_POOL = [{'uin': '10001', 'qqmusic_key': 'a'}]
+
+
+class MockConfig:
+    def __init__(self, qps=0):
+        self.config_data = {
+            'module.cookiepool.kg': POOL,
+            'module.kg.user': {'userid': '0', 'token': ''},
+            'module.cookiepool.tx': TX_POOL,
+            'module.tx.vkeyserver.guid': '0',
+            'common.cookiepool_policy': {
+                'failure_threshold': 3,
+                'quarantine_time': 60,
+                'max_quarantine_time': 200,
+                'qps': qps,
+            },
+        }
+
+    def read_config(self, key):
+        return self.config_data.get(key)
+
+
+def reset_pool(qps=0):
+    cookie_pool.config = MockConfig(qps)
+    cookie_pool._accounts.clear()
+    variable.use_cookie_pool = True
+
+
+def test_quarantine_backoff():
+    reset_pool()
+    bad = POOL[0]
+    for _ in range(2):
+        cookie_pool.report('kg', bad, False, 0.1, 'expired')
+    state = cookie_pool._state('kg', bad)
+    assert not state.quarantined_until
+    cookie_pool.report('kg', bad, False, 0.1, 'expired')
+    first = state.quarantined_until - state.last_error_time
+    assert abs(first - 60) < 1
+    assert all(cookie_pool.choose('kg') is not bad for _ in range(200))
+
+    # 暂停结束后再失败一次即重新暂停，时间翻倍，直到上限
+    state.quarantined_until = 0
+    cookie_pool.report('kg', bad, False, 0.1, 'expired')
+    assert abs(state.quarantined_until - state.last_error_time - 120) < 1
+    state.quarantined_until = 0
+    cookie_pool.report('kg', bad, False, 0.1, 'expired')
+    assert abs(state.quarantined_until - state.last_error_time - 200) < 1
+
+    # 成功后恢复
+    state.quarantined_until = 0
+    cookie_pool.report('kg', bad, True, 0.1)
+    assert state.consecutive_failures == 0 and state.quarantine_level == 0
+    stats = cookie_pool.stats()['kg']['1']
+    assert stats['failures'] == 5 and stats['successes'] == 1
+    assert stats['last_error'] == 'expired'
+
+
+def test_all_quarantined_still_chooses():
+    reset_pool()
+    for user in POOL:
+        for _ in range(3):
+            cookie_pool.report('kg', user, False, 0.1, 'expired')
+    cookie_pool._state('kg', POOL[1]).quarantined_until -= 30
+    assert cookie_pool.choose('kg') is POOL[1]
+
+
+def test_weighted_by_health():
+    reset_pool()
+    for _ in range(10):
+        cookie_pool.report('kg', POOL[0], True, 0.05)
+        cookie_pool.report('kg', POOL[1], True, 0.05)
+        cookie_pool.report('kg', POOL[2], True, 0.05)
+    # 成功率降低但未被暂停的账号被选中的次数更少
+    for _ in range(5):
+        cookie_pool.report('kg', POOL[2], False, 0.05, 'error')
+        cookie_pool.report('kg', POOL[2], True, 0.05)
+    counts = Counter(cookie_pool.choose('kg')['userid'] for _ in range(3000))
+    assert counts['3'] < counts['1'] * 0.8
+    assert counts['3'] < counts['2'] * 0.8
+
+
+def test_qps_budget():
+    reset_pool(qps=2)
+    chosen = Counter(cookie_pool.choose('kg')['userid'] for _ in range(6))
+    assert chosen == Counter({'1': 2, '2': 2, '3': 2})
+    # 超出后仍然返回账号
+    assert cookie_pool.choose('kg') in POOL
+
+
+def test_use_context():
+    reset_pool()
+
+    async def run():
+        async with cookie_pool.use('kg') as user:
+            pass
+        for _ in range(5):
+            try:
+                async with cookie_pool.use('kg') as user:
+                    raise FailedException('没有版权', reason='no_copyright')
+            except FailedException:
+                pass
+        try:
+            async with cookie_pool.use('kg') as user:
+                raise FailedException('链接获取失败')
+        except FailedException:
+            pass
+
+    asyncio.run(run())
+    stats = cookie_pool.stats()['kg']
+    assert sum(s['successes'] for s in stats.values()) == 1
+    assert sum(s['failures'] for s in stats.values()) == 1
+
+    variable.use_cookie_pool = False
+    try:
+        async def single():
+            async with cookie_pool.use('kg') as user:
+                return user
+        assert asyncio.run(single()) == {'userid': '0', 'token': ''}
+    finally:
+        variable.use_cookie_pool = True
+
+
+class VkeyResponse:
+    def __init__(self, purls, code=0):
+        self.purls = purls
+        self.code = code
+
+    def json(self):
+        return {'code': 0, 'req': {'code': self.code, 'data': {'midurlinfo': [
+            {'songmid': str(i), 'filename': str(i), 'purl': purl} for i, purl in enumerate(self.purls)]}}}
+
+
+def test_tx_vkey_failures():
+    reset_pool()
+    old_sign = tx_player.signRequest
+    response = None
+
+    async def sign_request(body):
+        return response
+
+    async def get_vkey(count):
+        try:
+            return await tx_player._getVkey([str(i) for i in range(count)], [str(i) for i in range(count)])
+        except FailedException as e:
+            return e
+
+    tx_player.signRequest = sign_request
+    try:
+        # 上游返回错误码（登录失效等）时计入账号的失败次数
+        response = VkeyResponse([''], code=1000)
+        assert isinstance(asyncio.run(get_vkey(1)), FailedException)
+        # 歌曲没有链接时无论批次大小都不影响账号，由 url() 按歌曲不可用处理
+        response = VkeyResponse([''])
+        assert asyncio.run(get_vkey(1))[0]['purl'] == ''
+        response = VkeyResponse(['a.m4a', ''])
+        assert len(asyncio.run(get_vkey(2))) == 2
+    finally:
+        tx_player.signRequest = old_sign
+    stats = cookie_pool.stats()['tx']['10001']
+    assert stats['failures'] == 1 and stats['successes'] == 2
+
+
+def test_wy_cookie_not_exposed():
+    assert cookie_pool.account_id('wy', {'cookie': 'MUSIC_U=secret'}).startswith('cookie_')
+    assert 'secret' not in cookie_pool.account_id('wy', {'cookie': 'MUSIC_U=secret'})
+
+
+def teardown_module():
+    variable.use_cookie_pool = False
+    cookie_pool.config = config
+    cookie_pool._accounts.clear()
+
+
+if __name__ == '__main__':
+    test_quarantine_backoff()
+    test_all_quarantined_still_chooses()
+    test_weighted_by_health()
+    test_qps_budget()
+    test_use_context()
+    test_tx_vkey_failures()
+    test_wy_cookie_not_exposed()
+    print('cookie 池测试通过')
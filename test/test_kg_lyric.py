@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试酷狗 KRC 歌词解码与解析
+与原来的实现（保留在本文件中作为参考）比对 test/fixtures/kg 下的 KRC 文件的解析结果，
+并检查歌词按 id 与 accesskey 缓存
+"""
+
+import os
+import re
+import sys
+import zlib
+import base64
+import asyncio
+import tempfile
+import importlib
+import ujson as json
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+FIXTURES = os.path.join(project_root, 'test', 'fixtures', 'kg')
+
+# 导入 modules 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    # modules.kg 中的 lyric 是同名函数，需要按模块路径导入
+    kg_lyric = importlib.import_module('modules.kg.lyric')
+finally:
+    os.chdir(_cwd)
+
+
+# —— 原实现 ——
+class ReferenceParseTools:
+    def __init__(self):
+        self.head_exp = r'^.*\[id:\$\w+\]\n'
+
+    def parse(self, string):
+        string = string.replace('\r', '')
+        if re.match(self.head_exp, string):
+            string = re.sub(self.head_exp, '', string)
+        trans = re.search(r'\[language:([\w=\\/+]+)\]', string)
+        rlyric = None
+        tlyric = None
+        if trans:
+            string = re.sub(r'\[language:[\w=\\/+]+\]\n', '', string)
+            trans_json = json.loads(base64.b64decode(trans.group(1)).decode('utf-8'))
+            for item in trans_json['content']:
+                if item['type'] == 0:
+                    rlyric = item['lyricContent']
+                elif item['type'] == 1:
+                    tlyric = item['lyricContent']
+        self.i = 0
+        lxlyric = re.sub(r'\[((\d+),\d+)\].*', lambda x: self.process_lyric_match(x, rlyric, tlyric, self.i), string)
+        rlyric = '\n'.join(rlyric) if rlyric else ''
+        tlyric = '\n'.join(tlyric) if tlyric else ''
+        lxlyric = re.sub(r'<(\d+,\d+),\d+>', r'<\1>', lxlyric)
+        lyric = re.sub(r'<\d+,\d+>', '', lxlyric)
+        return {'lyric': lyric, 'tlyric': tlyric, 'rlyric': rlyric, 'lxlyric': lxlyric}
+
+    def process_lyric_match(self, match, rlyric, tlyric, i):
+        result = re.match(r'\[((\d+),\d+)\].*', match.group(0))
+        time = int(result.group(2))
+        ms = time % 1000
+        time /= 1000
+        m = str(int(time / 60)).zfill(2)
+        time %= 60
+        s = str(int(time)).zfill(2)
+        time_string = f'{m}:{s}.{ms}'
+        transformed_t = ''
+        if (tlyric):
+            for t in tlyric[i]:
+                transformed_t += t
+            tlyric[i] = transformed_t
+        if (rlyric):
+            nr = []
+            for r in rlyric[i]:
+                nr.append(r)
+            _tnr = ''.join(nr)
+            if (' ' in _tnr):
+                rlyric[i] = _tnr
+            else:
+                nr = []
+                for r in rlyric[i]:
+                    nr.append(r.strip())
+                rlyric[i] = ' '.join(nr)
+        if rlyric:
+            rlyric[i] = f'[{time_string}]{rlyric[i] if rlyric[i] else ""}'.replace('  ', ' ')
+        if tlyric:
+            tlyric[i] = f'[{time_string}]{tlyric[i] if tlyric[i] else ""}'
+        self.i += 1
+        return re.sub(result.group(1), time_string, match.group(0))
+
+
+def reference_krc_decode(a):
+    encrypt_key = (64, 71, 97, 119, 94, 50, 116, 71, 81, 54, 49, 45, 206, 210, 110, 105)
+    content = a[4:]
+    compress_content = bytes(content[i] ^ encrypt_key[i % len(encrypt_key)] for i in range(len(content)))
+    return zlib.decompress(bytes(compress_content)).decode('utf-8')
+
+
+def load_fixtures():
+    fixtures = {}
+    for name in sorted(os.listdir(FIXTURES)):
+        if name.endswith('.krc'):
+            with open(os.path.join(FIXTURES, name), 'rb') as f:
+                fixtures[name] = f.read()
+    return fixtures
+
+
+def test_decode():
+    fixtures = load_fixtures()
+    assert fixtures
+    for name, data in fixtures.items():
+        assert kg_lyric.krcDecode(data) == reference_krc_decode(data), name
+
+
+def test_parse_matches_reference():
+    for name, data in load_fixtures().items():
+        text = reference_krc_decode(data)
+        assert kg_lyric.global_parser.parse(text) == ReferenceParseTools().parse(text), name
+
+
+def test_parse_edge_cases():
+    samples = [
+        '',
+        '[ar:x]\n[ti:y]\n',
+        '[id:$00000000]\n[0,0]<0,0,0>a\n[59999,1]<0,1,0>b\n[3600000,10]<0,10,0>c',
+        'no head\n[12345,678]<0,100,0>x<100,200,0>y\n text [5,5] after\n<1,2,3,4><1,2>',
+        '[1000,200]<1000,200,0>same tag twice',
+    ]
+    for text in samples:
+        assert kg_lyric.global_parser.parse(text) == ReferenceParseTools().parse(text), text
+
+
+def test_get_lyric_cached():
+    data = load_fixtures()['zh_trans.krc']
+    calls = []
+
+    class FakeResponse:
+        def json(self):
+            return {'status': 200, 'error_code': 0, 'content': base64.b64encode(data).decode()}
+
+    async def fake_request(url, options):
+        calls.append(url)
+        return FakeResponse()
+
+    original = kg_lyric.Httpx.AsyncRequest
+    kg_lyric.Httpx.AsyncRequest = fake_request
+    kg_lyric._lyric_cache.clear()
+    try:
+        first = asyncio.run(kg_lyric.getLyric(1, 'key'))
+        first['lyric'] = 'changed'
+        second = asyncio.run(kg_lyric.getLyric(1, 'key'))
+        asyncio.run(kg_lyric.getLyric(1, 'other'))
+    finally:
+        kg_lyric.Httpx.AsyncRequest = original
+    assert len(calls) == 2
+    assert second == ReferenceParseTools().parse(reference_krc_decode(data))
+
+
+if __name__ == '__main__':
+    test_decode()
+    test_parse_matches_reference()
+    test_parse_edge_cases()
+    test_get_lyric_cached()
+    print('酷狗歌词解析测试通过')
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 KuwoDES 查表实现
+与原来逐位置换的实现（保留在本文件中作为参考）逐字节比对，
+并检查固定的测试向量与 numpy 批量模式
+"""
+
+import os
+import sys
+import base64
+import random
+import importlib.util
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 直接加载 encrypt.py，不导入 modules 包（会初始化配置与数据库）
+_spec = importlib.util.spec_from_file_location('kw_encrypt', os.path.join(project_root, 'modules', 'kw', 'encrypt.py'))
+kw_encrypt = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(kw_encrypt)
+
+# 由原实现生成
+VECTORS = [
+    ('', 'amNIiFPkHdE='),
+    ('a', 'Gm3y+RY0NdU='),
+    ('12345678', 'Njw+DTAxpGxqY0iIU+Qd0Q=='),
+    ('中文参数=值&x=1', 'IaH6oWp1aAi3sErAlGkKaPSDZ46KfM53'),
+    ('corp=kuwo&p2p=1&type=convert_url2&sig=0&format=mp3&rid=123456&br=320kmp3',
+     'NI8S5evAnmGldi4g47EsqtfDbGsJckckbTQQd2LAgmDPITUWSd51OvflVdsd4+2q5z496GsY4forptNPZR8oJGvXMJ7s8+/DamNIiFPkHdE='),
+    ('user=0&android_id=0&prod=kwplayer_ar_9.3.1.3&corp=kuwo&newver=3&vipver=9.3.1.3&source=kwplayer_ar_9.3.1.3_qq.apk'
+     '&p2p=1&notrace=0&type=convert_url2&format=flac|mp3|aac&sig=0&rid=228908&priority=bitrate&loginUid=0&network=WIFI'
+     '&loginSid=0&mode=download',
+     'QTTCEVWADWjGHNKyqOt6peSJECe9IlwYOThEXM42tOPVu6boc62uWnhTsSmlQDn46NvDv+yKU0JVRFu8k+uReJLGA0BF5mBYu2iIKCWTWoSRAcRv'
+     'UqhAdgBiZRX9VKg7RH9HNl+ysrqQlCTCcM05ysIhldsvO4SwlU0Im684N1508N6jXVwtmzIoSAi5h4W0lMKrFJSszAeaeLsQXvNM0N5lI1uC+zXy'
+     'UG8H47dJM4s00qDLP3SVUSq+DAXJMu+eyGNf4jh2vGLM2lyEIDdPOJWgXw4N1n7LCg5NQkddT43YfZXoDcpjXywy7DaUoiMfU0odyQufaPRhUoXB'
+     'mcL6+g=='),
+]
+
+
+# —— 原实现 ——
+def reference_des64(longs, l):
+    bit_transform = kw_encrypt.bit_transform
+    pR = [0] * 8
+    pSource = [0, 0]
+    out = bit_transform(kw_encrypt.arrayIP, 64, l)
+    pSource[0] = 0xFFFFFFFF & out
+    pSource[1] = (-4294967296 & out) >> 32
+    for i in range(16):
+        R = pSource[1]
+        R = bit_transform(kw_encrypt.arrayE, 64, R)
+        R ^= longs[i]
+        for j in range(8):
+            pR[j] = 255 & R >> j * 8
+        SOut = 0
+        for sbi in range(7, -1, -1):
+            SOut <<= 4
+            SOut |= kw_encrypt.matrixNSBox[sbi][pR[sbi]]
+        R = bit_transform(kw_encrypt.arrayP, 32, SOut)
+        L = pSource[0]
+        pSource[0] = pSource[1]
+        pSource[1] = L ^ R
+    pSource = pSource[::-1]
+    out = -4294967296 & pSource[1] << 32 | 0xFFFFFFFF & pSource[0]
+    return bit_transform(kw_encrypt.arrayIP_1, 64, out)
+
+
+def reference_encrypt(msg, key=kw_encrypt.SECRET_KEY):
+    if isinstance(msg, str):
+        msg = msg.encode()
+    l = 0
+    for i in range(8):
+        l = l | key[i] << i * 8
+    j = len(msg) // 8
+    arrLong1 = [0] * 16
+    kw_encrypt.sub_keys(l, arrLong1, 0)
+    arrLong2 = [0] * j
+    for m in range(j):
+        for n in range(8):
+            arrLong2[m] |= msg[n + m * 8] << n * 8
+    arrLong3 = [0] * ((1 + 8 * (j + 1)) // 8)
+    for i1 in range(j):
+        arrLong3[i1] = reference_des64(arrLong1, arrLong2[i1])
+    l2 = 0
+    for i1 in range(len(msg) % 8):
+        l2 |= msg[j * 8 + i1] << i1 * 8
+    arrLong3[j] = reference_des64(arrLong1, l2)
+    arrByte2 = []
+    for l3 in arrLong3:
+        for i6 in range(8):
+            arrByte2.append(255 & l3 >> i6 * 8)
+    return arrByte2
+
+
+def reference_base64_encrypt(msg):
+    return base64.encodebytes(bytearray(reference_encrypt(msg))).replace(b'\n', b'').decode()
+
+
+def random_messages(count, seed=20241019):
+    rng = random.Random(seed)
+    return [bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 200))) for _ in range(count)]
+
+
+def test_vectors():
+    for msg, expected in VECTORS:
+        assert kw_encrypt.base64_encrypt(msg) == expected, msg
+        assert reference_base64_encrypt(msg) == expected, msg
+
+
+def test_matches_reference():
+    for msg in random_messages(300):
+        assert kw_encrypt.encrypt(msg) == reference_encrypt(msg), msg
+    # 含最高位的数据块，原实现在这里会出现负数
+    for block in (b'\xff' * 8, b'\x00' * 7 + b'\x80', b'\x80' * 16):
+        assert kw_encrypt.encrypt(block) == reference_encrypt(block)
+
+
+def test_key_schedule_cached():
+    assert kw_encrypt.key_schedule() is kw_encrypt.key_schedule()
+    other = b'abcdefgh'
+    assert kw_encrypt.encrypt('kuwo', other) == reference_encrypt('kuwo', other)
+
+
+def test_batch():
+    msgs = [m for m, _ in VECTORS] + random_messages(200, seed=1)
+    expected = [reference_base64_encrypt(m) for m in msgs]
+    assert kw_encrypt.base64_encrypt_many(msgs) == expected
+    assert kw_encrypt.base64_encrypt_many([]) == []
+    # 未安装 numpy 时的逐个加密
+    np = kw_encrypt.np
+    kw_encrypt.np = None
+    try:
+        assert kw_encrypt.base64_encrypt_many(msgs) == expected
+    finally:
+        kw_encrypt.np = np
+
+
+if __name__ == '__main__':
+    test_vectors()
+    test_matches_reference()
+    test_key_schedule_cached()
+    test_batch()
+    print('KuwoDES 测试通过' + ('' if kw_encrypt.np is not None else '（未安装 numpy，批量模式使用逐个加密）'))
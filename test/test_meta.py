@@ -1,9 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试音频元数据写入
+在临时目录生成音频文件，验证 _embed_metadata 写入的标题、歌手、专辑与歌词可以被 mutagen 读取
+
+查看已缓存文件的标签（在项目根目录执行）:
+    python test/test_meta.py cache_audio/wy_2054047081_flac.flac
+"""
+
+import os
+import sys
+import tempfile
+
 from mutagen import File
 
-# 缓存文件的绝对或相对路径
-path = r'../cache_audio/wy_2054047081_flac.flac'
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 导入 modules 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+_tmpdir = tempfile.mkdtemp()
+os.chdir(_tmpdir)
+try:
+    import modules
+finally:
+    os.chdir(_cwd)
+
+from mock_upstream import AUDIO
+
+INFO = {'name': '测试歌曲', 'singer': '测试歌手', 'album': '测试专辑'}
+LYRIC = '[00:01.00]第一行歌词\n[00:02.00]第二行歌词'
+
+
+def print_tags(path):
+    audio = File(path)
+    print('== Tags ==')
+    for k, v in audio.tags.items():
+        print(k, v)
+
+
+def test_embed_mp3():
+    path = os.path.join(_tmpdir, 'tx_meta_128k.mp3')
+    with open(path, 'wb') as f:
+        f.write(AUDIO * 4)
+    modules._embed_metadata(path, INFO, None, LYRIC)
+
+    tags = File(path).tags
+    assert str(tags['TIT2']) == INFO['name']
+    assert str(tags['TPE1']) == INFO['singer']
+    assert str(tags['TALB']) == INFO['album']
+    assert tags.getall('USLT')[0].text == LYRIC
+    # 写入后音频数据保持不变
+    with open(path, 'rb') as f:
+        assert f.read().endswith(AUDIO * 4)
+
+
+def test_embed_skips_missing_and_empty():
+    missing = os.path.join(_tmpdir, 'tx_missing_128k.mp3')
+    modules._embed_metadata(missing, INFO, None, LYRIC)
+    assert not os.path.exists(missing)
+
+    empty = os.path.join(_tmpdir, 'tx_empty_128k.mp3')
+    open(empty, 'wb').close()
+    modules._embed_metadata(empty, INFO, None, LYRIC)
+    assert os.path.getsize(empty) == 0
+
 
-audio = File(path)
-print('== Tags ==')
-for k, v in audio.tags.items():
-    print(k, v)
\ No newline at end of file
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        print_tags(sys.argv[1])
+    else:
+        test_embed_mp3()
+        test_embed_skips_missing_and_empty()
+        print('元数据写入测试通过')
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试模拟上游
+验证 common.upstream_override 的主机替换，各平台取链流程对模拟上游的完整调用，
+模拟上游的错误率，以及 WebDAV 缓存索引对模拟 WebDAV 目录的扫描
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+import importlib
+
+import aiohttp
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 导入 modules 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    import modules
+    from common import config, variable, Httpx, webdav_cache
+    tx_utils = importlib.import_module('modules.tx.utils')
+finally:
+    os.chdir(_cwd)
+
+from mock_upstream import MockUpstream, render
+
+
+class UpstreamConfig:
+    '''指向模拟上游，其余配置与缓存读写使用真实的 config 模块'''
+    def __init__(self, overrides, **settings):
+        self.settings = {
+            'common.upstream_override': overrides,
+            'common.remote_cache.enable': False,
+        }
+        self.settings.update(settings)
+
+    def read_config(self, key):
+        if key in self.settings:
+            return self.settings[key]
+        return config.read_config(key)
+
+    def __getattr__(self, name):
+        return getattr(config, name)
+
+
+def run_with_mock(coro_func, **mock_options):
+    cdnaddr = tx_utils.tools.cdnaddr
+
+    async def runner():
+        mock = await MockUpstream(**mock_options).start()
+        patched = UpstreamConfig(mock.overrides())
+        Httpx.config = modules.config = patched
+        tx_utils.tools.cdnaddr = mock.base + '/'
+        variable.aioSession = aiohttp.ClientSession()
+        try:
+            return await coro_func(mock)
+        finally:
+            await variable.aioSession.close()
+            variable.aioSession = None
+            await mock.stop()
+
+    try:
+        return asyncio.run(runner())
+    finally:
+        Httpx.config = modules.config = config
+        tx_utils.tools.cdnaddr = cdnaddr
+
+
+def test_override_upstream():
+    Httpx.config = UpstreamConfig({'u.y.qq.com': 'http://127.0.0.1:9800/'})
+    try:
+        headers = {}
+        assert Httpx.override_upstream('https://u.y.qq.com/cgi-bin/musics.fcg?sign=1', headers) == \
+            'http://127.0.0.1:9800/cgi-bin/musics.fcg?sign=1'
+        assert headers == {'X-Upstream-Host': 'u.y.qq.com'}
+        headers = {}
+        assert Httpx.override_upstream('https://bd-api.kuwo.cn/api', headers) == 'https://bd-api.kuwo.cn/api'
+        assert headers == {}
+    finally:
+        Httpx.config = config
+
+
+def test_render():
+    template = {'id': '{songId}', 'url': '{base}/audio/{songId}.mp3', 'list': ['{n}'], 'keep': '{unknown}'}
+    assert render(template, {'songId': 'a', 'base': 'http://x', 'n': 3}) == \
+        {'id': 'a', 'url': 'http://x/audio/a.mp3', 'list': [3], 'keep': '{unknown}'}
+
+
+def test_url_from_mock():
+    songs = [
+        ('tx', '003mockSong', '320k'),
+        ('kg', 'ABCDEF0123456789ABCDEF0123456789', '128k'),
+        ('kw', '1234567', '320k'),
+        ('wy', '2054047081', 'flac'),
+        ('mg', '60084600554', '128k'),
+    ]
+
+    async def check(mock):
+        for source, song_id, quality in songs:
+            res = await modules.url(source, song_id, quality)
+            assert res['code'] == 0, (source, res)
+            assert res['data'].startswith(mock.base + '/audio/'), res['data']
+            assert res['extra']['quality']['result'] == quality, (source, res)
+        # 第二次请求命中链接缓存
+        res = await modules.url('kw', '1234567', '320k')
+        assert res['extra']['cache'] is True
+        return dict(mock.stats)
+
+    stats = run_with_mock(check)
+    # 歌曲信息也会在后台请求，只检查取链接口的次数
+    assert stats['kg_url'] == 1 and stats['kw'] == 1 and stats['wy'] == 1 and stats['mg_url'] == 1
+    assert stats['tx'] >= 2 and stats['kg_info'] >= 1 and stats['mg_info'] >= 1
+
+
+def test_error_rate():
+    async def check(mock):
+        res = await modules.url('kw', 'error1', '128k')
+        assert res['code'] != 0
+        return dict(mock.stats)
+
+    stats = run_with_mock(check, error_rate=1.0)
+    assert stats['errors'] >= 1
+
+
+def test_webdav_index():
+    files = {'cache_audio': ['tx_003webdav_320k.mp3', 'readme.txt'], 'audio': ['song.flac']}
+
+    async def check(mock):
+        webdav_cache.config = UpstreamConfig({}, **{
+            'common.webdav_cache.enable': True,
+            'common.webdav_cache': {'enable': True, 'url': mock.base + '/dav',
+                                    'paths': {'audio': '/cache_audio', 'local': '/audio'}},
+        })
+        try:
+            await webdav_cache.init_webdav_index()
+            assert webdav_cache.find_webdav_cached_file('tx', '003webdav', '320k') == \
+                mock.base + '/dav/cache_audio/tx_003webdav_320k.mp3'
+            assert webdav_cache.find_webdav_local_file('song.flac') == mock.base + '/dav/audio/song.flac'
+        finally:
+            webdav_cache.config = config
+        return dict(mock.stats)
+
+    stats = run_with_mock(check, dav_files=files)
+    assert stats['propfind'] == 2
+
+
+if __name__ == '__main__':
+    test_override_upstream()
+    test_render()
+    test_url_from_mock()
+    test_error_rate()
+    test_webdav_index()
+    print('模拟上游测试通过')
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试节点间音频缓存共享
+在不同端口启动两个服务实例（各自使用独立的工作目录与配置），
+验证 /peer/has、/peer/cache 的密钥验证，本地缺失的缓存文件从其他节点转发并缓存到本地，以及未命中的文件名短时间内不再查询节点
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import tempfile
+import subprocess
+import urllib.request
+import urllib.error
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PEER_KEY = 'test-peer-key'
+AUDIO = os.urandom(300 * 1024)
+FILENAME = 'kw_123456_320k.mp3'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def write_config(workdir, port, peer_port):
+    os.makedirs(os.path.join(workdir, 'config'))
+    with open(os.path.join(workdir, 'config', 'config.yml'), 'w', encoding='utf-8') as f:
+        f.write(f"""\
+common:
+  hosts:
+    - 127.0.0.1
+  ports:
+    - {port}
+  log_file: false
+  remote_cache:
+    path: ./cache_audio
+  peer_cache:
+    enable: true
+    key: {PEER_KEY}
+    peers:
+      - http://127.0.0.1:{peer_port}
+    hedge_timeout: 2
+""")
+
+
+def start(workdir):
+    return subprocess.Popen(
+        [sys.executable, os.path.join(project_root, 'main.py')],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f'端口 {port} 上的实例未能启动')
+
+
+def get(url, key=None):
+    req = urllib.request.Request(url, headers={'X-Peer-Key': key} if key else {})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_peer_cache():
+    tmpdir = tempfile.mkdtemp()
+    port_a, port_b = free_port(), free_port()
+    dir_a, dir_b = os.path.join(tmpdir, 'a'), os.path.join(tmpdir, 'b')
+    write_config(dir_a, port_a, port_b)
+    write_config(dir_b, port_b, port_a)
+    # 只有节点 A 持有音频文件
+    os.makedirs(os.path.join(dir_a, 'cache_audio'))
+    with open(os.path.join(dir_a, 'cache_audio', FILENAME), 'wb') as f:
+        f.write(AUDIO)
+
+    procs = [start(dir_a), start(dir_b)]
+    try:
+        wait_ready(port_a)
+        wait_ready(port_b)
+        a, b = f'http://127.0.0.1:{port_a}', f'http://127.0.0.1:{port_b}'
+
+        # 密钥验证
+        assert get(f'{a}/peer/has?filename={FILENAME}')[0] == 403
+        assert get(f'{a}/peer/has?filename={FILENAME}', 'wrong-key')[0] == 403
+        assert get(f'{a}/peer/cache/{FILENAME}', 'wrong-key')[0] == 403
+
+        # 按文件名与按歌曲查询
+        status, body = get(f'{a}/peer/has?filename={FILENAME}', PEER_KEY)
+        assert status == 200
+        assert json.loads(body)['data'] == {'filename': FILENAME, 'size': len(AUDIO)}
+        status, body = get(f'{a}/peer/has?source=kw&id=123456&quality=320k', PEER_KEY)
+        assert json.loads(body)['data']['filename'] == FILENAME
+        status, body = get(f'{a}/peer/has?source=kw&id=123456&quality=flac', PEER_KEY)
+        assert json.loads(body)['data'] is None
+        status, body = get(f'{b}/peer/has?filename={FILENAME}', PEER_KEY)
+        assert json.loads(body)['data'] is None
+
+        # 节点 B 没有该文件，从节点 A 转发并缓存到本地
+        status, body = get(f'{b}/cache/{FILENAME}')
+        assert status == 200
+        assert body == AUDIO
+        cached = os.path.join(dir_b, 'cache_audio', FILENAME)
+        deadline = time.time() + 5
+        while not os.path.exists(cached) and time.time() < deadline:
+            time.sleep(0.1)
+        with open(cached, 'rb') as f:
+            assert f.read() == AUDIO
+        status, body = get(f'{b}/peer/has?filename={FILENAME}', PEER_KEY)
+        assert json.loads(body)['data']['size'] == len(AUDIO)
+
+        # 两个节点都没有的文件
+        assert get(f'{b}/cache/kw_999_320k.mp3')[0] == 404
+        # 未命中的文件名在 miss_ttl 内不再查询节点，之后节点 A 才有该文件时仍返回 404
+        with open(os.path.join(dir_a, 'cache_audio', 'kw_999_320k.mp3'), 'wb') as f:
+            f.write(AUDIO)
+        assert get(f'{b}/cache/kw_999_320k.mp3')[0] == 404
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_peer_cache()
+    print('节点间缓存共享测试通过')
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试歌曲预取
+验证预取队列去重、已缓存歌曲跳过、忙碌时等待、每分钟额度、推迟下载，
+以及根据请求记录学习下一首并自动预取
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+import importlib
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入 modules 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    import modules
+    from common import config
+    prefetch = importlib.import_module('modules.prefetch')
+finally:
+    os.chdir(_cwd)
+
+
+class PrefetchConfig:
+    '''覆盖 common.prefetch，其余配置与缓存读写使用真实的 config 模块'''
+    def __init__(self, **settings):
+        self.settings = {
+            'enable': True,
+            'download': False,
+            'max_items': 10,
+            'max_pending': 100,
+            'concurrency': 1,
+            'budget': 0,
+            'busy_threshold': 4,
+            'learn': {'enable': True, 'window': 600, 'min_count': 2, 'top': 1, 'max_songs': 100},
+        }
+        self.settings.update(settings)
+
+    def read_config(self, key):
+        if key == 'common.prefetch':
+            return self.settings
+        if key.startswith('common.prefetch.'):
+            return self.settings.get(key.split('.', 2)[2])
+        return config.read_config(key)
+
+    def __getattr__(self, name):
+        return getattr(config, name)
+
+
+def reset(**settings):
+    prefetch.config = PrefetchConfig(**settings)
+    prefetch._queue = None
+    prefetch._workers.clear()
+    prefetch._queued.clear()
+    prefetch._deferred.clear()
+    prefetch._last_played.clear()
+    prefetch._transitions.clear()
+    prefetch._budget = prefetch.MemoryBackend(max_keys=1)
+    modules._inflight_urls.clear()
+
+
+def run_with_fake_url(coro_func, code=0):
+    calls = []
+    original = modules.url
+
+    async def fake_url(source, songId, quality, query={}):
+        calls.append((source, songId, quality, prefetch._prefetching.get()))
+        return {'code': code, 'msg': 'success', 'data': 'http://example.com/a.mp3'}
+
+    async def runner():
+        try:
+            await coro_func()
+            if prefetch._queue is not None:
+                await prefetch._queue.join()
+        finally:
+            for w in prefetch._workers:
+                w.cancel()
+
+    modules.url = fake_url
+    try:
+        asyncio.run(runner())
+    finally:
+        modules.url = original
+    return calls
+
+
+def test_enqueue_dedup_and_resolve():
+    reset()
+
+    async def submit():
+        assert prefetch.enqueue('tx', '001', '320k')
+        assert not prefetch.enqueue('tx', '001', '320k')
+        assert prefetch.enqueue('kg', 'ABC', '320k')
+
+    calls = run_with_fake_url(submit)
+    assert calls == [('tx', '001', '320k', True), ('kg', 'abc', '320k', True)]
+    assert not prefetch._queued
+
+
+def test_cached_url_skips_upstream():
+    reset()
+
+    async def submit():
+        await config.updateCacheAsync('urls', 'wy_cached_128k', {'expire': False, 'time': 0, 'url': 'http://x/a.mp3'})
+        prefetch.enqueue('wy', 'cached', '128k')
+
+    assert run_with_fake_url(submit) == []
+
+
+def test_budget():
+    reset(budget=1)
+
+    async def submit():
+        for i in range(3):
+            prefetch.enqueue('tx', f'b{i}', '128k')
+
+    assert len(run_with_fake_url(submit)) == 1
+
+
+def test_waits_while_busy():
+    reset(busy_threshold=2)
+    order = []
+
+    async def submit():
+        modules._inflight_urls[('tx', 'x', '128k')] = None
+        modules._inflight_urls[('tx', 'y', '128k')] = None
+        prefetch.enqueue('tx', 'low', '128k')
+        await asyncio.sleep(0.3)
+        order.append('foreground done')
+        modules._inflight_urls.clear()
+
+    calls = run_with_fake_url(submit)
+    assert order == ['foreground done']
+    assert [c[1] for c in calls] == ['low']
+
+
+def test_defer_download():
+    reset(download=False)
+    assert not prefetch.defer_download('tx', '1', '320k', '320k')
+    token = prefetch._prefetching.set(True)
+    try:
+        assert prefetch.defer_download('tx', '1', 'flac', '320k')
+        # 预取过程中不会取走
+        assert prefetch.take_deferred('tx', '1', 'flac') is None
+    finally:
+        prefetch._prefetching.reset(token)
+    assert prefetch.take_deferred('tx', '1', 'flac') == '320k'
+    assert prefetch.take_deferred('tx', '1', 'flac') is None
+
+    reset(download=True)
+    token = prefetch._prefetching.set(True)
+    try:
+        assert not prefetch.defer_download('tx', '1', 'flac', '320k')
+    finally:
+        prefetch._prefetching.reset(token)
+
+
+def test_learn_next_song():
+    reset()
+
+    async def play():
+        # 两个客户端都按 a -> b -> c 的顺序播放
+        for client in ('1.1.1.1', '2.2.2.2'):
+            for song in ('a', 'b', 'c'):
+                prefetch.observe(client, 'tx', song, '320k')
+        assert prefetch.predict('tx', 'a', min_count=2) == [('tx', 'b')]
+        # 第三个客户端播放 a 时预取 b
+        prefetch.observe('3.3.3.3', 'tx', 'a', 'flac')
+
+    calls = run_with_fake_url(play)
+    assert ('tx', 'b', 'flac', True) in calls
+    assert all(c[1] != 'a' for c in calls)
+
+
+if __name__ == '__main__':
+    test_enqueue_dedup_and_resolve()
+    test_cached_url_skips_upstream()
+    test_budget()
+    test_waits_while_busy()
+    test_defer_download()
+    test_learn_next_song()
+    print('预取测试通过')
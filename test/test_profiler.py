@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试性能分析
+验证采样结果的折叠格式、采样接口、慢请求的调用栈记录，以及事件循环阻塞时记录阻塞位置
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import threading
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer, TestClient
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入 common.config 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    from common import profiler, config
+finally:
+    os.chdir(_cwd)
+
+
+class ProfilerConfig:
+    '''覆盖 common.profiler，其余配置使用真实的 config 模块'''
+    def __init__(self, **settings):
+        self.settings = {
+            'max_seconds': 2,
+            'interval': 0.002,
+            'keep': 3,
+            'slow_request': {'enable': True, 'threshold': 0.1, 'exclude': ['/admin/profile']},
+            'loop_lag': {'enable': True, 'threshold': 50, 'interval': 0.02},
+        }
+        self.settings.update(settings)
+
+    def read_config(self, key):
+        return self.settings if key == 'common.profiler' else config.read_config(key)
+
+    def __getattr__(self, name):
+        return getattr(config, name)
+
+
+def reset(**settings):
+    profiler.config = ProfilerConfig(**settings)
+    profiler._slow_requests.clear()
+    profiler._loop_stalls.clear()
+
+
+def busy_loop(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        sum(range(1000))
+
+
+def test_sample_collapsed():
+    thread = threading.Thread(target=busy_loop, args=(0.5,))
+    thread.start()
+    try:
+        counts = profiler.sample(0.2, 0.002, {thread.ident})
+    finally:
+        thread.join()
+    assert counts
+    stack, count = counts.most_common(1)[0]
+    assert f'busy_loop (test/test_profiler.py:' in stack.replace(os.sep, '/')
+    # 从外到内，最外层是线程入口
+    assert stack.startswith('_bootstrap (threading.py:')
+    lines = profiler.format_collapsed(counts).splitlines()
+    assert lines[0] == f'{stack} {count}'
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+
+async def handle_sleep(request):
+    await asyncio.sleep(float(request.query.get('seconds', 0.3)))
+    return web.json_response({'code': 0})
+
+
+async def handle_block(request):
+    time.sleep(0.2)
+    return web.json_response({'code': 0})
+
+
+async def handle_result(app, handler):
+    # 与 main.handle_before_request 一样将 (dict, status) 转换为 JSON 响应
+    async def handle_request(request):
+        resp = await handler(request)
+        if isinstance(resp, tuple):
+            return web.json_response(resp[0], status=resp[1])
+        if isinstance(resp, dict):
+            return web.json_response(resp)
+        return resp
+    return handle_request
+
+
+def run(coro_func):
+    async def runner():
+        app = web.Application(middlewares=[profiler.handle_slow_requests, handle_result])
+        app.router.add_get('/admin/profile', profiler.handle_profile)
+        app.router.add_get('/admin/profile/slow', profiler.handle_slow)
+        app.router.add_get('/sleep', handle_sleep)
+        app.router.add_get('/block', handle_block)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        try:
+            return await coro_func(client)
+        finally:
+            await client.close()
+
+    return asyncio.run(runner())
+
+
+def test_profile_endpoint():
+    reset()
+
+    async def check(client):
+        profile = asyncio.ensure_future(client.get('/admin/profile', params={'seconds': '0.5'}))
+        await asyncio.sleep(0.1)
+        # 同一时间只允许一个采样
+        resp = await client.get('/admin/profile', params={'seconds': '0.1'})
+        assert resp.status == 409
+        await client.get('/block')
+        resp = await profile
+        assert resp.status == 200
+        text = await resp.text()
+        assert 'handle_block (test/test_profiler.py:' in text.replace(os.sep, '/')
+        assert (await client.get('/admin/profile', params={'seconds': 'x'})).status == 400
+
+    run(check)
+
+
+def test_slow_request_stack():
+    reset()
+
+    async def check(client):
+        await client.get('/sleep', params={'seconds': '0.3'})
+        await client.get('/sleep', params={'seconds': '0.01'})
+        # 采样接口本身不记录
+        await client.get('/admin/profile', params={'seconds': '0.2'})
+        resp = await client.get('/admin/profile/slow')
+        return (await resp.json())['data']
+
+    data = run(check)
+    assert len(data['slow_requests']) == 1
+    record = data['slow_requests'][0]
+    assert record['path'] == '/sleep'
+    assert record['elapsed'] >= 0.1
+    # 调用栈停在请求处理函数中的 await 处
+    assert 'in handle_sleep' in record['stack']
+    assert 'await asyncio.sleep' in record['stack']
+
+
+def test_keep_limit():
+    reset()
+    for i in range(5):
+        profiler._keep(profiler._slow_requests, {'path': str(i)})
+    assert [r['path'] for r in profiler._slow_requests] == ['2', '3', '4']
+
+
+def test_loop_lag_watchdog():
+    reset()
+    old_thread = profiler._loop_thread
+
+    async def check():
+        profiler._loop_thread = None
+        profiler.start_loop_monitor()
+        await asyncio.sleep(0.1)
+        busy_loop(0.3)
+        await asyncio.sleep(0.1)
+
+    try:
+        asyncio.run(check())
+    finally:
+        profiler._loop_thread = old_thread
+    assert len(profiler._loop_stalls) == 1
+    stall = profiler._loop_stalls[0]
+    assert stall['blocked_ms'] >= 50
+    # 记录的是阻塞事件循环的位置
+    assert 'in busy_loop' in stall['stack']
+
+
+def teardown_module():
+    profiler.config = config
+
+
+if __name__ == '__main__':
+    test_sample_collapsed()
+    test_profile_endpoint()
+    test_slow_request_stack()
+    test_keep_limit()
+    test_loop_lag_watchdog()
+    print('性能分析测试通过')
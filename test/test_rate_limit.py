@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试令牌桶限速
+验证突发容量、按速率补充令牌、旧配置的换算、被 IP 桶拒绝的请求不消耗全局令牌，以及 redis 不可用时回退到内存后端
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入 common.config 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    from common import config, rate_limit
+finally:
+    os.chdir(_cwd)
+
+
+class RateLimitConfig:
+    '''覆盖 security.rate_limit，其余配置使用真实的 config 模块'''
+    def __init__(self, buckets=None, **legacy):
+        self.settings = {'global': 0, 'ip': 0, 'backend': 'memory', 'max_keys': 100, 'buckets': buckets or {}}
+        self.settings.update(legacy)
+
+    def read_config(self, key):
+        if key == 'security.rate_limit':
+            return self.settings
+        if key.startswith('security.rate_limit.'):
+            value = self.settings
+            for k in key.split('.')[2:]:
+                value = (value or {}).get(k)
+            return value
+        return config.read_config(key)
+
+    def __getattr__(self, name):
+        return getattr(config, name)
+
+
+def reset(buckets=None, **legacy):
+    rate_limit.config = RateLimitConfig(buckets, **legacy)
+    rate_limit._backend = None
+
+
+def check(*args, **kwargs):
+    return asyncio.run(rate_limit.check(*args, **kwargs))
+
+
+def test_burst_and_refill():
+    backend = rate_limit.MemoryBackend()
+    assert asyncio.run(backend.acquire('k', 10, 2)) == (True, 0)
+    assert asyncio.run(backend.acquire('k', 10, 2)) == (True, 0)
+    allowed, retry_after = asyncio.run(backend.acquire('k', 10, 2))
+    assert not allowed
+    assert 0 < retry_after <= 0.1
+    time.sleep(0.12)
+    assert asyncio.run(backend.acquire('k', 10, 2))[0]
+
+
+def test_max_keys():
+    backend = rate_limit.MemoryBackend(max_keys=2)
+    for key in ('a', 'b', 'c'):
+        asyncio.run(backend.acquire(key, 1, 1))
+    assert len(backend) == 2
+    # 最久未访问的 a 被淘汰，重新获得完整的突发容量
+    assert asyncio.run(backend.acquire('a', 1, 1))[0]
+
+
+def test_legacy_interval():
+    reset(ip=10)
+    assert check('10.0.0.1') is None
+    bucket, retry_after = check('10.0.0.1')
+    assert bucket == 'ip'
+    assert 9 < retry_after <= 10
+    assert check('10.0.0.2') is None
+
+
+def test_rejected_request_keeps_global_tokens():
+    reset({'global': {'rate': 0.001, 'burst': 3}, 'ip': {'rate': 0.001, 'burst': 1}})
+    assert check('10.0.0.1') is None
+    # 已超出 IP 限额的客户端持续请求，不会耗尽全局令牌
+    for _ in range(10):
+        assert check('10.0.0.1')[0] == 'ip'
+    assert check('10.0.0.2') is None
+    assert check('10.0.0.3') is None
+    assert check('10.0.0.4')[0] == 'global'
+
+
+class BrokenRedisBackend(rate_limit.RedisBackend):
+    def __init__(self):
+        pass
+
+    async def acquire(self, key, rate, burst):
+        raise ConnectionError('redis is down')
+
+
+def test_redis_error_falls_back_to_memory():
+    reset({'ip': {'rate': 0.001, 'burst': 1}}, backend='redis')
+    rate_limit._backend = BrokenRedisBackend()
+    rate_limit._fallback = None
+    assert check('10.0.0.1') is None
+    # 回退后仍然按内存后端限速
+    assert check('10.0.0.1')[0] == 'ip'
+
+
+def teardown_module():
+    rate_limit.config = config
+    rate_limit._backend = None
+    rate_limit._fallback = None
+
+
+if __name__ == '__main__':
+    test_burst_and_refill()
+    test_max_keys()
+    test_legacy_interval()
+    test_rejected_request_keeps_global_tokens()
+    test_redis_error_falls_back_to_memory()
+    teardown_module()
+    print('限速测试通过')
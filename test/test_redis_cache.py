@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 redis 缓存适配器的配置重载
+验证无关配置重载时保留适配器，连接配置变化时等待进行中的请求完成后再关闭旧适配器（不需要 redis 服务器）
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入 common.config 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    from common import config, redis_cache
+finally:
+    os.chdir(_cwd)
+
+
+class RedisConfig:
+    '''覆盖 common.cache.redis，其余配置使用真实的 config 模块'''
+    def __init__(self, **settings):
+        self.settings = dict(config.read_config('common.cache.redis'), **settings)
+
+    def read_config(self, key):
+        if key == 'common.cache.redis':
+            return self.settings
+        if key.startswith('common.cache.redis.'):
+            return self.settings.get(key.split('.', 3)[3])
+        return config.read_config(key)
+
+    def __getattr__(self, name):
+        return getattr(config, name)
+
+
+class SlowPipeline:
+    '''不连接服务器，每个 pipeline 耗时 delay 秒'''
+    def __init__(self, delay, log):
+        self.delay = delay
+        self.log = log
+        self.commands = []
+
+    def execute_command(self, *args):
+        self.commands.append(args)
+
+    async def execute(self, raise_on_error=True):
+        await asyncio.sleep(self.delay)
+        self.log.append('executed')
+        return [b'value'] * len(self.commands)
+
+
+class FakeClient:
+    def __init__(self, delay, log):
+        self.delay = delay
+        self.log = log
+
+    def pipeline(self, transaction=True):
+        return SlowPipeline(self.delay, self.log)
+
+    async def aclose(self):
+        self.log.append('closed')
+
+
+def test_reload_keeps_adapter_when_unchanged():
+    redis_cache.config = RedisConfig()
+
+    async def run():
+        adapter = redis_cache.get_adapter()
+        redis_cache._reload_config()
+        assert redis_cache.get_adapter() is adapter
+        redis_cache.config = RedisConfig(db=1)
+        redis_cache._reload_config()
+        assert redis_cache.get_adapter() is not adapter
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+
+def test_close_waits_for_inflight():
+    redis_cache.config = RedisConfig()
+    log = []
+
+    async def run():
+        adapter = redis_cache.AsyncRedisCache()
+        adapter.client = FakeClient(0.1, log)
+        get = asyncio.ensure_future(adapter.get('info', 'a'))
+        await asyncio.sleep(0.01)
+        # 进行中的请求完成后才关闭连接
+        await adapter.close()
+        assert log == ['executed', 'closed']
+        assert await get == b'value'
+
+    asyncio.run(run())
+
+
+def teardown_module():
+    redis_cache.config = config
+    redis_cache._adapter = None
+    redis_cache._adapter_loop = None
+
+
+if __name__ == '__main__':
+    test_reload_keeps_adapter_when_unchanged()
+    test_close_waits_for_inflight()
+    teardown_module()
+    print('redis 缓存适配器测试通过')
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试定时任务调度器
+验证慢任务不阻塞其他任务、同一任务不重叠执行、超时、并发上限，以及最近执行时间的保存与恢复
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入 common.config 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    from common import config, scheduler
+finally:
+    os.chdir(_cwd)
+
+
+class NoJitterConfig:
+    '''关闭随机抖动，其余配置与数据库读写使用真实的 config 模块'''
+    def read_config(self, key):
+        if key == 'common.scheduler.jitter':
+            return 0
+        return config.read_config(key)
+
+    def __getattr__(self, name):
+        return getattr(config, name)
+
+
+scheduler.config = NoJitterConfig()
+
+def reset():
+    scheduler.tasks.clear()
+    scheduler._heap.clear()
+    scheduler._running.clear()
+    scheduler._started = False
+    scheduler.running_event = asyncio.Event()
+    scheduler._wakeup = asyncio.Event()
+
+
+async def stop(runner):
+    scheduler.running_event.set()
+    scheduler._wakeup.set()
+    await runner
+    for job in list(scheduler._running):
+        job.cancel()
+
+
+def test_slow_task_does_not_block():
+    calls = {'slow': 0, 'fast': 0, 'active': 0, 'overlap': False}
+
+    async def slow():
+        calls['slow'] += 1
+        calls['active'] += 1
+        if calls['active'] > 1:
+            calls['overlap'] = True
+        await asyncio.sleep(0.6)
+        calls['active'] -= 1
+
+    async def fast():
+        calls['fast'] += 1
+
+    async def run():
+        reset()
+        scheduler.append('slow', slow, 0.05)
+        scheduler.append('fast', fast, 0.1)
+        runner = await scheduler.run()
+        await asyncio.sleep(0.55)
+        await stop(runner)
+
+    asyncio.run(run())
+    assert calls['slow'] == 1
+    assert calls['fast'] >= 3
+    assert not calls['overlap']
+
+
+def test_timeout_and_failure_status():
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def broken():
+        raise ValueError('boom')
+
+    async def run():
+        reset()
+        scheduler.append('hang', hang, 100, timeout=0.1)
+        scheduler.append('broken', broken, 100)
+        runner = await scheduler.run()
+        await asyncio.sleep(0.3)
+        await stop(runner)
+
+    asyncio.run(run())
+    status = {t['name']: t for t in scheduler.status()}
+    assert status['hang']['timeout_count'] == 1
+    assert status['hang']['last_error'].startswith('timeout')
+    assert status['broken']['fail_count'] == 1
+    assert status['broken']['last_error'] == 'ValueError: boom'
+    assert status['broken']['run_count'] == 1
+    assert status['broken']['next_execute'] >= status['broken']['latest_execute'] + 100
+
+
+def test_max_concurrency():
+    state = {'active': 0, 'peak': 0}
+
+    async def job():
+        state['active'] += 1
+        state['peak'] = max(state['peak'], state['active'])
+        await asyncio.sleep(0.1)
+        state['active'] -= 1
+
+    async def run():
+        reset()
+        for i in range(4):
+            scheduler.append(f'job_{i}', job, 100)
+        runner = await scheduler.run()
+        scheduler._semaphore = asyncio.Semaphore(2)
+        await asyncio.sleep(0.35)
+        await stop(runner)
+
+    asyncio.run(run())
+    assert state['peak'] == 2
+    assert all(t.run_count == 1 for t in scheduler.tasks)
+
+
+def test_persist_last_run():
+    async def noop():
+        pass
+
+    async def run_once():
+        reset()
+        scheduler.append('persisted', noop, 3600)
+        scheduler.append('local_state', noop, 3600, every_worker=True)
+        runner = await scheduler.run()
+        await asyncio.sleep(0.1)
+        await stop(runner)
+
+    asyncio.run(run_once())
+    saved = config.load_data()[scheduler.PERSIST_KEY]
+    assert set(saved) == {'persisted'}
+    assert abs(saved['persisted'] - time.time()) < 5
+
+    # 重启后不会立即执行，而是在上次执行时间 + 间隔后执行；every_worker 任务照常立即执行
+    asyncio.run(run_once())
+    status = {t['name']: t for t in scheduler.status()}
+    assert status['persisted']['run_count'] == 0
+    assert status['persisted']['next_execute'] >= saved['persisted'] + 3600
+    assert status['local_state']['run_count'] == 1
+
+
+if __name__ == '__main__':
+    test_slow_task_does_not_block()
+    test_timeout_and_failure_status()
+    test_max_concurrency()
+    test_persist_last_run()
+    print('定时任务调度测试通过')
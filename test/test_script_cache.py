@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 /script 生成结果的缓存
+验证按 (host, scheme, key) 缓存、模板修改后重新生成、ETag / If-None-Match 与 gzip 压缩，
+以及 checkUpdate 使用缓存的 MD5 应答
+"""
+
+import os
+import sys
+import gzip
+import asyncio
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'test'))
+
+from test_script_generation import MockConfig, MockLogger
+
+TEMPLATE = "const API_URL = '{{API_URL}}'\nconst API_KEY = '{{API_KEY}}'\n// {{MUSIC_SOURCE_NAME}} {{SCRIPT_MD5}}\n"
+
+
+class MockRequest:
+    def __init__(self, host='localhost:9763', query=None, headers=None):
+        self.host = host
+        self.query = query or {}
+        self.headers = headers or {}
+
+
+def test_script_cache():
+    from common import lx_script
+    lx_script.config = MockConfig()
+    lx_script.logger = MockLogger()
+    lx_script._rendered.clear()
+
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())
+    try:
+        with open('lx-music-source.js.template', 'w', encoding='utf-8') as f:
+            f.write(TEMPLATE)
+
+        async def run():
+            gen = lx_script.generate_script_response
+            resp = await gen(MockRequest('a.com', {'key': 'test_key'}))
+            assert "const API_URL = 'http://a.com'" in resp.text
+            assert "const API_KEY = 'test_key'" in resp.text
+            etag = resp.headers['ETag']
+            rendered = lx_script._rendered[next(reversed(lx_script._rendered))]
+            assert rendered.md5 in resp.text
+
+            # 同一组合使用缓存，不同 host 单独生成
+            await gen(MockRequest('a.com', {'key': 'test_key'}))
+            assert len(lx_script._rendered) == 1
+            other = await gen(MockRequest('b.com', {'key': 'test_key'}))
+            assert "const API_URL = 'http://b.com'" in other.text
+            assert other.headers['ETag'] != etag
+            assert len(lx_script._rendered) == 2
+
+            # ETag / If-None-Match
+            resp = await gen(MockRequest('a.com', {'key': 'test_key'}, {'If-None-Match': etag}))
+            assert resp.status == 304
+            resp = await gen(MockRequest('a.com', {'key': 'test_key'}, {'If-None-Match': '"other"'}))
+            assert resp.status == 200
+
+            # gzip
+            resp = await gen(MockRequest('a.com', {'key': 'test_key'}, {'Accept-Encoding': 'gzip, deflate'}))
+            assert resp.headers['Content-Encoding'] == 'gzip'
+            assert gzip.decompress(resp.body) == rendered.body
+            # 两种编码的响应体不同，ETag 也不同；If-None-Match 接受任一种以及弱 ETag
+            gzip_etag = resp.headers['ETag']
+            assert gzip_etag != etag
+            for tag in (etag, gzip_etag, 'W/' + etag, 'W/' + gzip_etag):
+                resp = await gen(MockRequest('a.com', {'key': 'test_key'}, {'If-None-Match': tag, 'Accept-Encoding': 'gzip'}))
+                assert resp.status == 304
+                assert resp.headers['ETag'] == gzip_etag
+            resp = await gen(MockRequest('a.com', {'key': 'test_key'}, {'Accept-Encoding': 'gzip;q=0, deflate'}))
+            assert 'Content-Encoding' not in resp.headers
+            assert resp.body == rendered.body
+
+            # checkUpdate
+            assert await gen(MockRequest('a.com', {'key': 'test_key', 'checkUpdate': rendered.md5})) == \
+                ({'code': 0, 'msg': 'success', 'data': None}, 200)
+            result, status = await gen(MockRequest('a.com', {'key': 'test_key', 'checkUpdate': 'old'}))
+            assert result['data']['updateUrl'] == 'http://a.com/script?key=test_key'
+
+            # 模板修改后重新生成
+            with open('lx-music-source.js.template', 'w', encoding='utf-8') as f:
+                f.write(TEMPLATE + '// changed\n')
+            st = os.stat('lx-music-source.js.template')
+            os.utime('lx-music-source.js.template', ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+            resp = await gen(MockRequest('a.com', {'key': 'test_key'}))
+            assert '// changed' in resp.text
+            assert resp.headers['ETag'] != etag
+
+        asyncio.run(run())
+    finally:
+        os.chdir(cwd)
+        lx_script._rendered.clear()
+
+
+if __name__ == '__main__':
+    test_script_cache()
+    print('脚本缓存测试通过')
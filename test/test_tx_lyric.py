@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 QQ 音乐 QRC 歌词解析
+与原来的实现（保留在本文件中作为参考）比对随机生成的 QRC、翻译、罗马音歌词与边界情况的解析结果，
+并检查歌词按 songID 缓存
+"""
+
+import os
+import re
+import sys
+import base64
+import random
+import asyncio
+import tempfile
+import importlib
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入 modules 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    tx_lyric = importlib.import_module('modules.tx.lyric')
+finally:
+    os.chdir(_cwd)
+
+
+# —— 原实现 ——
+class ReferenceParseTools:
+    def __init__(self):
+        self.rxps = {
+            'info': re.compile(r'^{"/'),
+            'lineTime': re.compile(r'^\[(\d+),\d+\]'),
+            'lineTime2': re.compile(r'^\[([\d:.]+)\]'),
+            'wordTime': re.compile(r'\(\d+,\d+\)'),
+            'wordTimeAll': re.compile(r'(\(\d+,\d+\))'),
+            'timeLabelFixRxp': re.compile(r'(?:\.0+|0+)$'),
+        }
+
+    def msFormat(self, timeMs):
+        if isinstance(timeMs, float) and timeMs.is_nan():
+            return ''
+        ms = timeMs % 1000
+        timeMs //= 1000
+        m = str(int(timeMs // 60)).zfill(2)
+        s = str(int(timeMs % 60)).zfill(2)
+        return f'[{m}:{s}.{str(ms).zfill(3)}]'
+
+    def parseLyric(self, lrc):
+        lrc = lrc.strip().replace('\r', '')
+        if not lrc:
+            return {'lyric': '', 'lxlyric': ''}
+        lines = lrc.split('\n')
+        lxlrcLines = []
+        lrcLines = []
+
+        for line in lines:
+            line = line.strip()
+            result = self.rxps['lineTime'].match(line)
+            if not result:
+                if line.startswith('[offset'):
+                    lxlrcLines.append(line)
+                    lrcLines.append(line)
+                if self.rxps['lineTime2'].match(line):
+                    lrcLines.append(line)
+                continue
+
+            startMsTime = int(result.group(1))
+            startTimeStr = self.msFormat(startMsTime)
+            if not startTimeStr:
+                continue
+
+            words = re.sub(self.rxps['lineTime'], '', line)
+
+            lrcLines.append(f'{startTimeStr}{re.sub(self.rxps["wordTimeAll"], "", words)}')
+
+            times = re.findall(self.rxps['wordTimeAll'], words)
+            if not times:
+                continue
+            _rxp = r"\((\d+),(\d+)\)"
+            times = [f'''<{max(int(re.search(_rxp, time).group(1)) - startMsTime, 0)},{re.search(_rxp, time).group(2)}>''' for time in times]
+            wordArr = re.split(self.rxps['wordTime'], words)
+            newWords = ''.join([f'{time}{wordArr[index]}' for index, time in enumerate(times)])
+            lxlrcLines.append(f'{startTimeStr}{newWords}')
+
+        return {
+            'lyric': '\n'.join(lrcLines),
+            'lxlyric': '\n'.join(lxlrcLines),
+        }
+
+    def parseRlyric(self, lrc):
+        lrc = lrc.strip().replace('\r', '')
+        if not lrc:
+            return {'lyric': '', 'lxlyric': ''}
+
+        lines = lrc.split('\n')
+        lrcLines = []
+
+        for line in lines:
+            line = line.strip()
+            result = self.rxps['lineTime'].match(line)
+            if not result:
+                continue
+
+            startMsTime = int(result.group(1))
+            startTimeStr = self.msFormat(startMsTime)
+            if not startTimeStr:
+                continue
+
+            words = re.sub(self.rxps['lineTime'], '', line)
+            lrcLines.append(f'{startTimeStr}{re.sub(self.rxps["wordTimeAll"], "", words)}')
+
+        return '\n'.join(lrcLines)
+
+    def removeTag(self, string):
+        return re.sub(r'^[\S\s]*?LyricContent="', '', string).replace(r'"\/>[\S\s]*?$', '')
+
+    def getIntv(self, interval):
+        if not interval:
+            return 0
+        if '.' not in interval:
+            interval += '.0'
+        arr = re.split(r':|\.', interval)
+        while len(arr) < 3:
+            arr.insert(0, '0')
+        m, s, ms = arr
+        return int(m) * 3600000 + int(s) * 1000 + int(ms)
+
+    def fixRlrcTimeTag(self, rlrc, lrc):
+        rlrcLines = rlrc.split('\n')
+        lrcLines = lrc.split('\n')
+        newLrc = []
+
+        for line in rlrcLines:
+            result = self.rxps['lineTime2'].match(line)
+            if not result:
+                continue
+            words = re.sub(self.rxps['lineTime2'], '', line)
+            if not words.strip():
+                continue
+            t1 = self.getIntv(result.group(1))
+
+            while lrcLines:
+                lrcLine = lrcLines.pop(0)
+                lrcLineResult = self.rxps['lineTime2'].match(lrcLine)
+                if not lrcLineResult:
+                    continue
+                t2 = self.getIntv(lrcLineResult.group(1))
+                if abs(t1 - t2) < 100:
+                    newLrc.append(re.sub(self.rxps['lineTime2'], lrcLineResult.group(0), line))
+                    break
+
+        return '\n'.join(newLrc)
+
+    def fixTlrcTimeTag(self, tlrc, lrc):
+        tlrcLines = tlrc.split('\n')
+        lrcLines = lrc.split('\n')
+        newLrc = []
+
+        for line in tlrcLines:
+            result = self.rxps['lineTime2'].match(line)
+            if not result:
+                continue
+            words = re.sub(self.rxps['lineTime2'], '', line)
+            if not words.strip():
+                continue
+            time = result.group(1)
+            if '.' in time:
+                time += '0' * (3 - len(time.split('.')[1]))
+
+            t1 = self.getIntv(time)
+
+            while lrcLines:
+                lrcLine = lrcLines.pop(0)
+                lrcLineResult = self.rxps['lineTime2'].match(lrcLine)
+                if not lrcLineResult:
+                    continue
+                t2 = self.getIntv(lrcLineResult.group(1))
+                if abs(t1 - t2) < 100:
+                    newLrc.append(re.sub(self.rxps['lineTime2'], lrcLineResult.group(0), line))
+                    break
+
+        return '\n'.join(newLrc)
+
+    def parse(self, lrc, tlrc=None, rlrc=None):
+        info = {
+            'lyric': '',
+            'tlyric': '',
+            'rlyric': '',
+            'lxlyric': '',
+        }
+
+        if lrc:
+            parsed_lrc = self.parseLyric(self.removeTag(lrc))
+            info['lyric'] = parsed_lrc['lyric']
+            info['lxlyric'] = parsed_lrc['lxlyric']
+
+        if rlrc:
+            info['rlyric'] = self.fixRlrcTimeTag(self.parseRlyric(self.removeTag(rlrc)), info['lyric'])
+
+        if tlrc:
+            info['tlyric'] = self.fixTlrcTimeTag(tlrc, info['lyric'])
+
+        return info
+
+
+HAN = [chr(c) for c in range(0x4e00, 0x4e00 + 2000)]
+ROMA = ['ka ', 'shi ', 'tsu ', 'no ', 'mi ', 'ra ', 'i ', 'yo ', 'ne ', 'to ']
+
+
+def lrc_time(ms, digits=2):
+    fraction = str(ms % 1000).zfill(3)[:digits]
+    return f'[{str(ms // 60000).zfill(2)}:{str(ms // 1000 % 60).zfill(2)}.{fraction}]'
+
+
+def qrc_xml(content):
+    return ('<?xml version="1.0" encoding="utf-8"?>\n<QrcInfos>\n<QrcHeadInfo SaveTime="1700000000" Version="100"/>\n'
+            f'<LyricInfo LyricCount="1">\n<Lyric_1 LyricType="1" LyricContent="{content}\n"/>\n</LyricInfo>\n</QrcInfos>')
+
+
+def make_song(rng, count):
+    """生成 (qrc, 翻译, 罗马音)，部分行没有翻译、翻译时间有偏差或为空行"""
+    lrc = ['[ti:歌名]', '[ar:歌手]', '[al:专辑]', '[by:]', '[offset:0]']
+    roma = list(lrc)
+    trans = ['[ti:歌名]', '[ar:歌手]', '[offset:0]']
+    t = rng.randint(0, 5000)
+    for _ in range(count):
+        n = rng.randint(1, 12)
+        words, romaWords, off = [], [], 0
+        for _ in range(n):
+            d = rng.randint(50, 800)
+            words.append(f'{rng.choice(HAN)}({t + off},{d})')
+            romaWords.append(f'{rng.choice(ROMA)}({t + off},{d})')
+            off += d
+        lrc.append(f'[{t},{off}]' + ''.join(words))
+        roma.append(f'[{t},{off}]' + ''.join(romaWords))
+        r = rng.random()
+        if r < 0.1:
+            trans.append(lrc_time(t) + '//')
+        elif r < 0.15:
+            trans.append(lrc_time(t))
+        elif r < 0.2:
+            trans.append(lrc_time(t + 150) + '偏差')
+        elif r < 0.9:
+            trans.append(lrc_time(t, rng.choice([1, 2, 3])) + ''.join(rng.choice(HAN) for _ in range(rng.randint(1, 10))))
+        t += off + rng.randint(0, 4000)
+    return qrc_xml('\n'.join(lrc)), '\n'.join(trans), qrc_xml('\n'.join(roma))
+
+
+def corpus(seed=43, songs=20, lines=60):
+    rng = random.Random(seed)
+    return [make_song(rng, rng.randint(1, lines)) for _ in range(songs)]
+
+
+def test_matches_reference():
+    for l, t, r in corpus():
+        assert tx_lyric.global_parser.parse(l, t, r) == ReferenceParseTools().parse(l, t, r)
+        assert tx_lyric.global_parser.parse(l, t) == ReferenceParseTools().parse(l, t)
+        assert tx_lyric.global_parser.parse(l) == ReferenceParseTools().parse(l)
+
+
+def test_edge_cases():
+    samples = [
+        ('', '', ''),
+        (qrc_xml('[offset:0]\n[00:01.00]普通歌词\n[1000,500]没有逐字时间'), '[00:01.00]翻译\r\n[00:01.00]重复', ''),
+        (qrc_xml('[0,100]前(0,50)后(50,50)尾巴\n[200,0](200,0)\n[300,100]字(100,50)'), '[00:00.3]时间\n[00:00]无毫秒', ''),
+        ('没有标签的内容\n[5000,100]a(5000,100)', '[00:05]x\n[00:05.000]y', qrc_xml('[5000,100]ro (5000,100)')),
+    ]
+    for l, t, r in samples:
+        assert tx_lyric.global_parser.parse(l, t, r) == ReferenceParseTools().parse(l, t, r), (l, t, r)
+
+
+def test_get_lyric_cached():
+    calls = []
+    lrc = '[00:01.00]歌词'
+    trans = '[00:01.00]翻译'
+
+    class FakeResponse:
+        def json(self):
+            return {'code': 0, 'req': {'code': 0, 'data': {
+                'lyric': base64.b64encode(lrc.encode()).decode(),
+                'trans': base64.b64encode(trans.encode()).decode(),
+                'roma': '',
+            }}}
+
+    async def fake_sign_request(data, *args, **kwargs):
+        calls.append(data['req']['param']['songID'])
+        return FakeResponse()
+
+    original = tx_lyric.signRequest
+    loaded = tx_lyric.variable.qdes_lib_loaded
+    tx_lyric.signRequest = fake_sign_request
+    tx_lyric.variable.qdes_lib_loaded = False
+    tx_lyric._lyric_cache.clear()
+    try:
+        first = asyncio.run(tx_lyric.getLyric('123'))
+        first['lyric'] = 'changed'
+        second = asyncio.run(tx_lyric.getLyric('123'))
+        asyncio.run(tx_lyric.getLyric('456'))
+    finally:
+        tx_lyric.signRequest = original
+        tx_lyric.variable.qdes_lib_loaded = loaded
+    assert calls == [123, 456]
+    assert second['lyric'] == lrc and second['tlyric'] == trans
+
+
+if __name__ == '__main__':
+    test_matches_reference()
+    test_edge_cases()
+    test_get_lyric_cached()
+    print('QQ 音乐歌词解析测试通过')
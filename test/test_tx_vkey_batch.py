@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 tx 取链请求合并
+验证合并请求的结果按 songmid / filename 对应到各个请求，上游调整顺序、去重或缺少歌曲时不会拿到其他歌曲的链接
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入 modules 时会在当前目录初始化配置与数据库，在临时目录中进行
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    from common.exceptions import FailedException
+    from modules.tx import player
+finally:
+    os.chdir(_cwd)
+
+
+def info(songmid, filename):
+    return {'songmid': songmid, 'filename': filename, 'purl': f'{filename}?vkey={songmid}'}
+
+
+def send_batch(requests, infos):
+    old_get_vkey = player._getVkey
+
+    async def get_vkey(songmids, filenames):
+        return infos
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        batch = [(songmid, filename, loop.create_future()) for songmid, filename in requests]
+        await player._sendBatch(batch)
+        return [f.result() if f.exception() is None else f.exception() for _, _, f in batch]
+
+    player._getVkey = get_vkey
+    try:
+        return asyncio.run(run())
+    finally:
+        player._getVkey = old_get_vkey
+
+
+def test_reordered_and_missing():
+    results = send_batch(
+        [('a', 'M500a.mp3'), ('b', 'M500b.mp3'), ('c', 'M500c.mp3')],
+        [info('c', 'M500c.mp3'), info('a', 'M500a.mp3')],
+    )
+    assert results[0]['songmid'] == 'a'
+    assert isinstance(results[1], FailedException)
+    assert results[2]['songmid'] == 'c'
+
+
+def test_same_song_in_batch():
+    # 同一首歌的两个音质按 filename 区分，重复的请求使用同一个结果
+    results = send_batch(
+        [('a', 'F000a.flac'), ('a', 'M800a.mp3'), ('a', 'M800a.mp3')],
+        [info('a', 'M800a.mp3'), info('a', 'F000a.flac')],
+    )
+    assert [r['filename'] for r in results] == ['F000a.flac', 'M800a.mp3', 'M800a.mp3']
+
+
+if __name__ == '__main__':
+    test_reordered_and_missing()
+    test_same_song_in_batch()
+    print('tx 取链请求合并测试通过')